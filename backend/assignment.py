@@ -0,0 +1,233 @@
+"""Batch tanker-to-village assignment.
+
+Every stressed village is split into delivery slots sized by its population
+demand and the fleet's tanker capacities. Each slot may only be served by
+tankers within the dispatch radius (sparse candidate lists from the spatial
+index), and the slot/tanker matching that maximises priority-weighted delivered
+water minus travel cost is found with Bertsekas' auction algorithm.
+"""
+import math
+
+import numpy as np
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from backend import cache, crud, live, models, positions, regions, spatial
+from backend.config import settings
+
+# Drinking + cooking water per person per day during tanker supply
+LITERS_PER_PERSON = 20.0
+MAX_TANKERS_PER_VILLAGE = 5
+# Candidate tankers considered per slot; keeps the cost matrix sparse
+CANDIDATES_PER_SLOT = 4
+# Priority points lost per km travelled
+DISTANCE_COST_PER_KM = 0.01
+# Delivered water is valued in units of a standard 10,000 L tanker load
+REFERENCE_LOAD_LITERS = 10000.0
+
+
+class AssignmentConflict(Exception):
+    """Raised when a planned tanker was reserved by someone else before commit."""
+
+
+def _auction(candidates, values, demand, n_objects, eps):
+    """Maximum-value sparse assignment of objects to multi-unit persons.
+
+    candidates[p] / values[p] are parallel lists of the objects person p may
+    take and what each is worth; person p takes at most demand[p] objects and
+    may leave any unit unfilled at value 0. A person bids for all of its
+    missing units at once (the auction for "similar persons"), which avoids
+    the long price wars identical single-unit bidders would fight. The result
+    is within sum(demand) * eps of the optimum. Returns the set of objects
+    held by each person.
+    """
+    prices = [0.0] * n_objects
+    owner = [-1] * n_objects
+    held = [set() for _ in candidates]
+    queue = [p for p in range(len(candidates)) if candidates[p] and demand[p] > 0]
+    while queue:
+        p = queue.pop()
+        need = demand[p] - len(held[p])
+        nets = sorted(
+            ((value - prices[obj], obj) for obj, value in zip(candidates[p], values[p]) if obj not in held[p]),
+            reverse=True,
+        )
+        # Price each won object so p is indifferent to its best losing option
+        # (or to leaving the unit unfilled at 0)
+        threshold = max(nets[need][0], 0.0) if len(nets) > need else 0.0
+        for net, obj in nets[:need]:
+            if net <= 0:
+                break
+            prices[obj] += net - threshold + eps
+            previous = owner[obj]
+            if previous >= 0:
+                held[previous].discard(obj)
+                queue.append(previous)
+            owner[obj] = p
+            held[p].add(obj)
+    return held
+
+
+def plan_assignments(
+    villages,
+    tanker_ids,
+    tanker_capacity,
+    index: spatial.TankerIndex,
+    radius_km: float = 500.0,
+    liters_per_person: float = LITERS_PER_PERSON,
+    max_tankers_per_village: int = MAX_TANKERS_PER_VILLAGE,
+    eps: float = 0.05,
+):
+    """Assign available tankers to villages.
+
+    villages is a list of dicts with village_id, latitude, longitude,
+    population and priority_score. tanker_ids / tanker_capacity describe the
+    tankers that may be used. eps bounds the loss per dispatched tanker; the
+    default 0.05 priority points equals ~5 km of extra travel. Returns
+    {village_id: [(tanker_id, distance_km)]}.
+    """
+    if not villages or len(tanker_ids) == 0:
+        return {}
+    tanker_ids = np.asarray(tanker_ids, dtype=np.int64)
+    capacity = np.asarray(tanker_capacity, dtype=float)
+    position = {int(t): i for i, t in enumerate(tanker_ids)}
+    mean_capacity = float(capacity.mean())
+
+    populations = np.array([v["population"] or 0 for v in villages], dtype=float)
+    demand = populations * liters_per_person
+    slots = np.clip(np.ceil(demand / mean_capacity), 1, max_tankers_per_village).astype(int)
+    slot_demand = demand / slots
+
+    all_candidates, all_values, all_distances = [], [], []
+    for i, village in enumerate(villages):
+        ids, dists = index.nearest(
+            village["latitude"], village["longitude"],
+            k=int(slots[i]) * CANDIDATES_PER_SLOT, radius_km=radius_km,
+        )
+        keep = [j for j, t in enumerate(ids) if int(t) in position]
+        cands = np.array([position[int(ids[j])] for j in keep], dtype=np.int64)
+        dists = np.asarray(dists)[keep]
+        delivered = np.minimum(capacity[cands], slot_demand[i])
+        vals = village["priority_score"] * delivered / REFERENCE_LOAD_LITERS - DISTANCE_COST_PER_KM * dists
+        all_candidates.append(cands.tolist())
+        all_values.append(vals.tolist())
+        all_distances.append(dict(zip(cands.tolist(), dists.tolist())))
+
+    held = _auction(all_candidates, all_values, slots.tolist(), len(tanker_ids), eps)
+
+    plan = {}
+    for i, objects in enumerate(held):
+        if objects:
+            plan[villages[i]["village_id"]] = [(int(tanker_ids[obj]), all_distances[i][obj]) for obj in objects]
+    return plan
+
+
+def reserve_tankers(db: Session, tanker_ids, village_ids=None):
+    """Mark every tanker unavailable in one transaction, or none of them.
+
+    village_ids, parallel to tanker_ids, records the village each tanker is
+    assigned to. Raises AssignmentConflict if any tanker was already taken.
+    """
+    tanker_ids = list(tanker_ids)
+    reserved = 0
+    try:
+        # Chunked to stay under database bound-parameter limits
+        for start in range(0, len(tanker_ids), 500):
+            chunk = tanker_ids[start:start + 500]
+            result = db.execute(
+                update(models.Tanker)
+                .where(models.Tanker.id.in_(chunk), models.Tanker.is_available == True)
+                .values(is_available=False, version=models.Tanker.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            reserved += result.rowcount
+        if reserved != len(tanker_ids):
+            raise AssignmentConflict(f"{len(tanker_ids) - reserved} planned tankers were dispatched elsewhere")
+        if village_ids is not None and tanker_ids:
+            tankers = models.Tanker.__table__
+            db.execute(
+                update(tankers).where(tankers.c.id == bindparam("b_id")).values(assigned_village_id=bindparam("b_village")),
+                [{"b_id": t, "b_village": v} for t, v in zip(tanker_ids, village_ids)],
+            )
+        regions.tankers_changed(db, tanker_ids, False, village_ids)
+        cache.bump_version(db)
+        live.queue_event(db, "tankers", {"unavailable": tanker_ids, "available": crud.count_available_tankers(db)})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    spatial.tanker_index.set_available(tanker_ids, False)
+
+
+def stressed_villages(db: Session, threshold: float):
+    """Villages above the stress threshold as the dicts the planners take."""
+    return [
+        {
+            "village_id": row.village_id,
+            "village_name": row.village_name,
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+            "population": row.population,
+            "stress_index": row.stress_index,
+            "priority_score": row.priority_score,
+        }
+        for row in crud.get_stressed_villages(db, threshold=threshold)
+    ]
+
+
+def dispatch_batch(db: Session, threshold: float = 7.0, radius_km: float = 500.0, dry_run: bool = False):
+    """Plan and reserve tankers for every village above the stress threshold."""
+    villages = stressed_villages(db, threshold)
+
+    fleet = db.query(
+        models.Tanker.id, models.Tanker.license_plate, models.Tanker.capacity_liters,
+        models.Tanker.current_latitude, models.Tanker.current_longitude,
+    ).filter(models.Tanker.is_available == True).all()
+    plates = {t_id: plate for t_id, plate, _, _, _ in fleet}
+    capacities = {t_id: cap or 0 for t_id, _, cap, _, _ in fleet}
+    ids = [t_id for t_id, _, _, _, _ in fleet]
+
+    if settings.tanker_index_enabled:
+        index = spatial.get_tanker_index(db)
+    else:
+        # Positions as committed now (plus this worker's unflushed pings), not as the shared index last saw them
+        lats, lons = positions.store.overlay(ids, [t[3] for t in fleet], [t[4] for t in fleet])
+        index = spatial.TankerIndex()
+        index.load((t_id, lat, lon, True) for t_id, lat, lon in zip(ids, lats.tolist(), lons.tolist()))
+
+    plan = plan_assignments(
+        villages,
+        ids,
+        [capacities[t_id] for t_id in ids],
+        index,
+        radius_km=radius_km,
+    )
+    if not dry_run:
+        reserved = [(t_id, village_id) for village_id, trips in plan.items() for t_id, _ in trips]
+        reserve_tankers(db, [t_id for t_id, _ in reserved], [village_id for _, village_id in reserved])
+
+    assignments, unserved = [], []
+    for v in villages:
+        trips = sorted(plan.get(v["village_id"], []), key=lambda trip: trip[1])
+        if not trips:
+            unserved.append(v["village_id"])
+            continue
+        assignments.append({
+            "village_id": v["village_id"],
+            "village_name": v["village_name"],
+            "priority_score": v["priority_score"],
+            "demand_liters": round((v["population"] or 0) * LITERS_PER_PERSON),
+            "delivered_liters": sum(capacities[t_id] for t_id, _ in trips),
+            "tankers": [
+                {"license_plate": plates[t_id], "capacity_liters": capacities[t_id], "distance_km": round(dist, 1)}
+                for t_id, dist in trips
+            ],
+        })
+    return {
+        "dry_run": dry_run,
+        "villages_considered": len(villages),
+        "villages_served": len(assignments),
+        "tankers_dispatched": sum(len(a["tankers"]) for a in assignments),
+        "unserved_village_ids": unserved,
+        "assignments": assignments,
+    }
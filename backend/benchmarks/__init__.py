@@ -0,0 +1 @@
+"""Offline benchmarks for the drought engine (run with ``python -m backend.benchmarks.<name>``)."""
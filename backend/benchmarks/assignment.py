@@ -0,0 +1,50 @@
+"""Batch assignment planning at state-wide scale.
+
+    python -m backend.benchmarks.assignment --villages 5000 --tankers 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend import assignment, spatial
+from backend.benchmarks.dispatch import LAT_RANGE, LON_RANGE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--villages", type=int, default=5000)
+    parser.add_argument("--tankers", type=int, default=20000)
+    parser.add_argument("--radius-km", type=float, default=500.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    tanker_ids = np.arange(1, args.tankers + 1)
+    capacity = rng.choice([8000, 10000, 12000, 15000], args.tankers)
+    index = spatial.TankerIndex()
+    index.load(zip(
+        tanker_ids.tolist(),
+        rng.uniform(*LAT_RANGE, args.tankers).tolist(),
+        rng.uniform(*LON_RANGE, args.tankers).tolist(),
+        [True] * args.tankers,
+    ))
+    villages = [
+        {"village_id": i, "latitude": lat, "longitude": lon, "population": int(pop), "priority_score": score}
+        for i, (lat, lon, pop, score) in enumerate(zip(
+            rng.uniform(*LAT_RANGE, args.villages),
+            rng.uniform(*LON_RANGE, args.villages),
+            rng.lognormal(8, 1.5, args.villages),
+            rng.uniform(1, 60, args.villages),
+        ))
+    ]
+
+    start = time.perf_counter()
+    plan = assignment.plan_assignments(villages, tanker_ids, capacity, index, radius_km=args.radius_km)
+    elapsed = time.perf_counter() - start
+    print(f"{args.villages} villages x {args.tankers} tankers, radius {args.radius_km:.0f} km")
+    print(f"planned {sum(len(t) for t in plan.values())} tankers to {len(plan)} villages in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Map cluster pyramid: build time, viewport queries and incremental updates.
+
+    python -m backend.benchmarks.clusters --points 1000000
+
+Points are generated in memory (no database) across India's bounding box
+and served through a ClusterPyramid exactly as the village layer is.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend import clusters
+from backend.benchmarks.dispatch import LAT_RANGE, LON_RANGE
+
+# A 1920x1080 px map viewport: degrees of longitude across at each zoom
+VIEWPORT_PX = (1920, 1080)
+ZOOMS = (4, 6, 8, 10, 12, 14)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    n = args.points
+    state = {
+        "lat": rng.uniform(*LAT_RANGE, n),
+        "lon": rng.uniform(*LON_RANGE, n),
+        "population": rng.lognormal(8, 1.2, n),
+        "stress": rng.uniform(0, 10, n),
+    }
+
+    def read(db, ids):
+        rows = np.arange(n) if ids is None else np.asarray(ids) - 1
+        stress = state["stress"][rows]
+        return rows + 1, state["lat"][rows], state["lon"][rows], {
+            "population": state["population"][rows],
+            "critical": (stress >= 8).astype(float),
+            "warning": ((stress >= 5) & (stress < 8)).astype(float),
+            "max_stress": stress,
+        }
+
+    pyramid = clusters.ClusterPyramid(read, ("population", "critical", "warning"), ("max_stress",), "village_id")
+    start = time.perf_counter()
+    pyramid.query(None, 0)
+    print(f"built {clusters.MAX_ZOOM + 1} levels over {n:,} points in {time.perf_counter() - start:.2f} s")
+
+    for zoom in ZOOMS:
+        width = VIEWPORT_PX[0] / 256 * 360 / 2 ** zoom
+        height = width * VIEWPORT_PX[1] / VIEWPORT_PX[0]  # close enough at India's latitudes
+        timings, sizes = [], []
+        for _ in range(args.queries):
+            lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+            bbox = (lon - width / 2, lat - height / 2, lon + width / 2, lat + height / 2)
+            started = time.perf_counter()
+            sizes.append(len(pyramid.query(None, zoom, bbox)))
+            timings.append(time.perf_counter() - started)
+        print(f"zoom {zoom:>2}: {np.mean(sizes):6.0f} clusters (max {max(sizes)}), "
+              f"p50 {np.median(timings) * 1000:6.2f} ms, p95 {np.percentile(timings, 95) * 1000:6.2f} ms")
+
+    # Stress changes (half of them drops, which dirty cell maxima) and moves
+    ids = rng.choice(n, args.updates, replace=False)
+    state["stress"][ids] = rng.uniform(0, 10, args.updates)
+    state["lat"][ids[: args.updates // 10]] += rng.normal(0, 0.5, args.updates // 10)
+    pyramid.mark((ids + 1).tolist())
+    started = time.perf_counter()
+    pyramid.query(None, 6, (75.0, 15.0, 85.0, 21.0))
+    print(f"applied {args.updates} changed points and re-queried in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Nearest-tanker search: legacy Python loop vs SQL bounding box vs in-process index.
+
+    python -m backend.benchmarks.dispatch --tankers 20000 --queries 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, spatial
+
+# Rough bounding box of mainland India
+LAT_RANGE = (8.0, 33.0)
+LON_RANGE = (69.0, 92.0)
+
+
+def legacy_nearest(db, latitude, longitude, radius_km):
+    """The original dispatch search: hydrate every available tanker and loop."""
+    nearest_id, nearest_distance = None, float("inf")
+    for tanker in db.query(models.Tanker).filter(models.Tanker.is_available == True).all():
+        if tanker.current_latitude is None or tanker.current_longitude is None:
+            continue
+        dist = crud.haversine_km(latitude, longitude, tanker.current_latitude, tanker.current_longitude)
+        if dist < nearest_distance and dist <= radius_km:
+            nearest_id, nearest_distance = tanker.id, dist
+    return nearest_id, nearest_distance
+
+
+def build_fleet(db, n_tankers, seed):
+    rng = random.Random(seed)
+    db.execute(insert(models.Tanker), [
+        {
+            "license_plate": f"MH-{i // 10000:02d}-BM-{i % 10000:04d}",
+            "capacity_liters": rng.choice([8000, 10000, 12000, 15000]),
+            "is_available": rng.random() < 0.8,
+            "current_latitude": rng.uniform(*LAT_RANGE),
+            "current_longitude": rng.uniform(*LON_RANGE),
+        }
+        for i in range(n_tankers)
+    ])
+    db.commit()
+
+
+def _time(label, fn, points):
+    start = time.perf_counter()
+    results = [fn(lat, lon) for lat, lon in points]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed / len(points) * 1000:9.3f} ms/query")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tankers", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius-km", type=float, default=500.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        models.create_schema(engine)
+        db = sessionmaker(bind=engine)()
+        build_fleet(db, args.tankers, args.seed)
+
+        rng = random.Random(args.seed + 1)
+        points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.queries)]
+        print(f"{args.tankers} tankers, {args.queries} queries, radius {args.radius_km:.0f} km")
+
+        legacy = _time("legacy loop", lambda lat, lon: legacy_nearest(db, lat, lon, args.radius_km), points)
+
+        def sql_bbox(lat, lon):
+            found = crud.find_nearby_tankers(db, lat, lon, args.radius_km)
+            return found[0] if found else (None, float("inf"))
+        bbox = _time("sql bbox + numpy", sql_bbox, points)
+
+        spatial.tanker_index.reset()
+        start = time.perf_counter()
+        index = spatial.get_tanker_index(db)
+        index.nearest(0.0, 0.0)  # force the lazy cell sort
+        print(f"{'index build':<22} {(time.perf_counter() - start) * 1000:9.3f} ms")
+
+        def indexed(lat, lon):
+            ids, dists = index.nearest(lat, lon, k=1, radius_km=args.radius_km)
+            return (int(ids[0]), float(dists[0])) if len(ids) else (None, float("inf"))
+        fast = _time("in-process index", indexed, points)
+
+        mismatches = sum(
+            1 for a, b, c in zip(legacy, bbox, fast)
+            if not (a[0] == b[0] == c[0]) and abs(a[1] - c[1]) > 1e-6
+        )
+        print(f"mismatched answers: {mismatches}")
+        db.close()
+        spatial.tanker_index.reset()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Concurrent dispatch stress test: no tanker may ever be claimed twice.
+
+    python -m backend.benchmarks.dispatch_concurrency --requests 500 --concurrency 1 8 32 128
+
+For each concurrency level a fresh SQLite database is built and hundreds of
+dispatches for nearby villages run in parallel threads, each with its own
+session, against a fleet smaller than the number of requests, so most
+tankers are contested. Two phases are checked:
+
+  claim   every successful dispatch got a distinct tanker, and the tankers
+          marked unavailable are exactly those (with the right village)
+  cycle   workers dispatch then release; no tanker may be handed to a
+          worker while another still holds it, and each tanker's version
+          must equal two per successful dispatch, which only holds if no
+          claim was lost
+
+In both, the district/state summaries must match a recount afterwards.
+Any violation is listed and the exit status is 1.
+
+SQLite admits one writer at a time, so throughput here shows contention
+handling rather than the parallelism PostgreSQL row locks allow.
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, regions, spatial
+
+# A district-sized area, so every request competes for the same tankers
+CENTER = (18.5, 73.8)
+SPREAD_DEG = 0.5
+
+
+def build(path, villages, tankers, seed):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+    models.create_schema(engine)
+    rng = random.Random(seed)
+    with sessionmaker(bind=engine)() as db:
+        db.execute(insert(models.Village), [
+            {"id": i, "name": f"V{i}", "district": "Bench", "population": 5000,
+             "latitude": CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+             "longitude": CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)}
+            for i in range(1, villages + 1)
+        ])
+        db.execute(insert(models.Tanker), [
+            {"id": i, "license_plate": f"MH-12-ST-{i:04d}", "capacity_liters": 10000, "is_available": True,
+             "current_latitude": CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+             "current_longitude": CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), "version": 0}
+            for i in range(1, tankers + 1)
+        ])
+        regions.rebuild(db)
+        db.commit()
+    return sessionmaker(bind=engine), engine
+
+
+def run(Session, requests, concurrency, villages, release):
+    held, lock, double_booked = set(), threading.Lock(), []
+
+    def one(village_id):
+        with Session() as db:
+            result = crud.dispatch_tanker(db, village_id)
+            if result["success"]:
+                with lock:
+                    if result["tanker_id"] in held:
+                        double_booked.append(f"tanker {result['tanker_id']} dispatched while still held")
+                    held.add(result["tanker_id"])
+            if release and result["success"]:
+                # Let go before the release commits, so the next claim of this tanker is legitimate
+                with lock:
+                    held.discard(result["tanker_id"])
+                # Back in service a little way off, like a tanker returning from a delivery
+                village = db.get(models.Village, village_id)
+                crud.release_tanker(db, result["tanker_id"], village.latitude, village.longitude)
+            return village_id, result
+
+    spatial.tanker_index.reset()
+    rng = random.Random(concurrency)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, [rng.randint(1, villages) for _ in range(requests)]))
+    return results, time.perf_counter() - started, double_booked
+
+
+def check_claims(Session, results):
+    claimed = [(r["tanker_id"], v) for v, r in results if r["success"]]
+    counts = collections.Counter(t for t, _ in claimed)
+    errors = [f"tanker {t} dispatched {n} times" for t, n in counts.items() if n > 1]
+    with Session() as db:
+        taken = {t.id: t.assigned_village_id for t in db.query(models.Tanker).filter(models.Tanker.is_available == False)}
+    if taken != dict(claimed):
+        errors.append(f"{len(taken)} tankers unavailable in the database, {len(claimed)} dispatches succeeded")
+    return len(claimed), errors
+
+
+def check_cycles(Session, results):
+    claims = collections.Counter(r["tanker_id"] for _, r in results if r["success"])
+    errors = []
+    with Session() as db:
+        for tanker in db.query(models.Tanker):
+            if not tanker.is_available:
+                errors.append(f"tanker {tanker.id} was never released")
+            if tanker.version != 2 * claims[tanker.id]:
+                errors.append(f"tanker {tanker.id}: version {tanker.version} after {claims[tanker.id]} dispatches")
+    return sum(claims.values()), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--tankers", type=int, default=200)
+    parser.add_argument("--villages", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for concurrency in args.concurrency:
+            for phase, release, check in (("claim", False, check_claims), ("cycle", True, check_cycles)):
+                Session, engine = build(os.path.join(tmp, f"{phase}-{concurrency}.sqlite"),
+                                        args.villages, args.tankers, args.seed)
+                results, elapsed, double_booked = run(Session, args.requests, concurrency, args.villages, release)
+                succeeded, errors = check(Session, results)
+                with Session() as db:
+                    errors = double_booked + errors + [f"summary differs: {d}" for d in regions.check(db)]
+                engine.dispose()
+                print(f"{phase:<6} concurrency {concurrency:>4}: {succeeded:>4}/{args.requests} dispatched, "
+                      f"{args.requests / elapsed:8.1f} req/s, {'OK' if not errors else 'FAILED'}")
+                for error in errors[:10]:
+                    print(f"    {error}")
+                failed = failed or bool(errors)
+    spatial.tanker_index.reset()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
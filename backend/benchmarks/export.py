@@ -0,0 +1,86 @@
+"""Village list export: streamed bodies and keyset pages against the hydrated path.
+
+    python -m backend.benchmarks.export --villages 1000000
+
+Builds a temporary SQLite database with backend.benchmarks.synthetic and
+drains GET /villages/ responses in-process (the endpoint function and its
+streamed body, without HTTP framing). Reports:
+
+  * a full export in one response, as a JSON array and as NDJSON, with the
+    peak traced memory of the NDJSON run
+  * a 1000-row page at the end of the table, by after= (keyset) and skip=
+  * for reference, --compare rows through the previous implementation:
+    ORM objects, response_model validation and jsonable_encoder + json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+async def drain(response):
+    size = 0
+    async for chunk in response.body_iterator:
+        size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--villages", type=int, default=1000000)
+    parser.add_argument("--compare", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'export.sqlite')}"
+        # Imported here so the app binds to the temporary database
+        from fastapi.encoders import jsonable_encoder
+
+        from backend import main as app, models, schemas
+        from backend.benchmarks import synthetic
+        from backend.database import SessionLocal, engine
+
+        models.create_schema(engine)
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            synthetic.generate(db, args.villages, 100, 1000, seed=args.seed)
+            print(f"generated {args.villages} villages in {time.perf_counter() - started:.1f}s")
+
+            def export(fmt, **params):
+                response = app.read_villages(**{"skip": 0, "limit": args.villages, "after": None, "format": fmt,
+                                                **params}, db=db)
+                return asyncio.run(drain(response))
+
+            for fmt in ("json", "ndjson"):
+                started = time.perf_counter()
+                size = export(fmt)
+                elapsed = time.perf_counter() - started
+                print(f"export {fmt:<7} {elapsed:7.2f} s  {args.villages / elapsed:>10,.0f} rows/s  {size / 2**20:7.1f} MiB")
+
+            tracemalloc.start()
+            export("ndjson")
+            print(f"export ndjson peak traced memory {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MiB")
+            tracemalloc.stop()
+
+            for label, params in (("after=", {"after": args.villages - 1000}), ("skip=", {"skip": args.villages - 1000})):
+                started = time.perf_counter()
+                export("json", limit=1000, **params)
+                print(f"last page by {label:<6} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+            started = time.perf_counter()
+            villages = db.query(models.Village).order_by(models.Village.id).limit(args.compare).all()
+            body = json.dumps(jsonable_encoder([schemas.VillageResponse.model_validate(v) for v in villages]),
+                              ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            elapsed = time.perf_counter() - started
+            print(f"hydrated {args.compare} rows {elapsed:7.2f} s  {args.compare / elapsed:>10,.0f} rows/s  "
+                  f"{len(body) / 2**20:7.1f} MiB (previous implementation, whole body in memory)")
+            db.expunge_all()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Cold-start import budget for the serverless entry point (api/index.py).
+
+    python -m backend.benchmarks.import_time --budget-ms 1000 --runs 5
+
+Imports api.index in fresh interpreters under `python -X importtime` and
+fails if the fastest run exceeds the budget, or if any module that main.py
+is meant to load lazily (NumPy, the planning code, the HTTP client) was
+pulled in at import time. FastAPI and SQLAlchemy alone cost roughly
+500 ms here, so the budget leaves headroom over that floor rather than
+over the app's own code.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must not be imported until a request needs them
+DEFERRED = ("numpy", "pandas", "httpx", "backend.crud", "backend.routing", "backend.clusters", "backend.forecast")
+
+
+def profile():
+    """Returns {module: cumulative microseconds} for one cold import of api.index."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api.index"],
+                         cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(f"import api.index failed:\n{out.stderr[-2000:]}")
+    times = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [profile() for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times["api.index"])
+    total_ms = best["api.index"] / 1000
+    print(f"import api.index: best {total_ms:.0f} ms of {args.runs} runs "
+          f"(median {sorted(r['api.index'] for r in runs)[len(runs) // 2] / 1000:.0f} ms), budget {args.budget_ms:.0f} ms")
+
+    # Direct children of the app's import tree are the useful breakdown
+    top = sorted(((t, name) for name, t in best.items() if name != "api.index" and ("." not in name or name.startswith("backend."))),
+                 reverse=True)[:args.top]
+    for t, name in top:
+        print(f"    {t / 1000:8.1f} ms  {name}")
+
+    errors = [f"{name} imported at startup" for name in DEFERRED if name in best]
+    if total_ms > args.budget_ms:
+        errors.append(f"{total_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    for error in errors:
+        print(f"FAILED: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
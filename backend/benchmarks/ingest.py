@@ -0,0 +1,69 @@
+"""Bulk water-reading ingestion throughput on SQLite.
+
+    python -m backend.benchmarks.ingest --rows 500000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import ingest, models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--villages", type=int, default=1000)
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = [
+        (rng.randint(1, args.villages), round(rng.uniform(-500, 500), 1), round(rng.uniform(0, 60), 1))
+        for _ in range(args.rows)
+    ]
+    if args.format == "csv":
+        lines = ["village_id,rainfall_deviation_mm,groundwater_level_m"] + [f"{v},{r},{g}" for v, r, g in rows]
+    else:
+        lines = [
+            json.dumps({"village_id": v, "rainfall_deviation_mm": r, "groundwater_level_m": g})
+            for v, r, g in rows
+        ]
+    body = ("\n".join(lines) + "\n").encode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        models.create_schema(engine)
+        db = sessionmaker(bind=engine)()
+        db.execute(insert(models.Village), [
+            {"id": i, "name": f"V{i}", "district": "Bench", "population": 5000, "latitude": 20.0, "longitude": 75.0}
+            for i in range(1, args.villages + 1)
+        ])
+        db.commit()
+
+        start = time.perf_counter()
+        ingestor = ingest.BulkIngestor(db, args.format)
+        buffer = b""
+        # Feed the body in network-sized pieces, as the endpoint does
+        for offset in range(0, len(body), 65536):
+            lines, buffer = ingest.split_lines(buffer + body[offset:offset + 65536])
+            if ingestor.feed_lines(lines):
+                ingestor.flush()
+        ingestor.feed_lines(ingest.split_lines(buffer, final=True)[0])
+        ingestor.finish()
+        elapsed = time.perf_counter() - start
+
+        report = ingestor.report()
+        print(f"{args.format}: {report['accepted']} rows accepted, {report['rejected']} rejected "
+              f"in {elapsed:.2f} s ({report['accepted'] / elapsed:,.0f} rows/s)")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Fan-out of live events to many idle SSE subscribers in one process.
+
+    python -m backend.benchmarks.live --subscribers 5000 --events 200
+
+Subscribers consume the broker's frame generator directly (no sockets), so
+this measures the broker's own per-subscriber cost: memory held while idle
+and the time from publish until every subscriber has the event. A handful
+of subscribers never read, to show they are cut over to history replay
+rather than growing without bound.
+"""
+import argparse
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from backend.live import Broker
+
+
+async def run(subscribers: int, events: int, stalled: int, queue_size: int):
+    broker = Broker(history_bytes=4 * 1024 * 1024, queue_size=queue_size)
+    received = [0] * subscribers
+    done = asyncio.Event()
+
+    async def consume(i):
+        async for frame in broker.stream():
+            if frame.startswith(b"id:"):
+                received[i] += 1
+                if received[i] == events and all(r == events for r in received):
+                    done.set()
+
+    async def stall():
+        stream = broker.stream()
+        await stream.__anext__()  # registered, then never reads again
+        await asyncio.sleep(3600)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tasks = [asyncio.create_task(consume(i)) for i in range(subscribers)]
+    tasks += [asyncio.create_task(stall()) for _ in range(stalled)]
+    while broker.subscriber_count < subscribers + stalled:
+        await asyncio.sleep(0.01)
+    idle = tracemalloc.take_snapshot().compare_to(before, "filename")
+    idle_bytes = sum(stat.size_diff for stat in idle)
+    tracemalloc.stop()
+
+    # Publish from a worker thread, as the sync endpoints do
+    started = time.perf_counter()
+    publisher = threading.Thread(target=lambda: [
+        broker.publish("readings", {"villages": [{"village_id": n, "stress_index": 7.5}], "bands": []})
+        for n in range(events)
+    ])
+    publisher.start()
+    await asyncio.wait_for(done.wait(), 120)
+    elapsed = time.perf_counter() - started
+    publisher.join()
+
+    print(f"{subscribers} subscribers (+{stalled} stalled): {idle_bytes / subscribers / 1024:.1f} KiB each while idle")
+    print(f"{events} events delivered to all in {elapsed:.2f} s "
+          f"({subscribers * events / elapsed:,.0f} deliveries/s)")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--stalled", type=int, default=10)
+    parser.add_argument("--queue-size", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.events, args.stalled, args.queue_size))
+
+
+if __name__ == "__main__":
+    main()
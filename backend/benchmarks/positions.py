@@ -0,0 +1,99 @@
+"""Tanker GPS ping throughput, store footprint and write-behind cost on synthetic data.
+
+    python -m backend.benchmarks.positions --tankers 5000 --pings 200000 --batch 500
+
+Builds a temporary SQLite database with backend.benchmarks.synthetic, feeds
+--pings random pings in batches of --batch into positions.PositionStore,
+checks that dispatch ranks tankers by them before anything is written, times
+the flush that writes them back and checks the database then holds each
+tanker's newest ping. A last pass adds the JSON decoding and validation that
+POST /tankers/positions does per batch.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, positions, schemas, spatial
+from backend.benchmarks import synthetic
+
+
+def batches(rng, tanker_ids, n, size, t0):
+    for start in range(0, n, size):
+        k = min(size, n - start)
+        yield (rng.choice(tanker_ids, k), rng.uniform(*synthetic.LAT_RANGE, k), rng.uniform(*synthetic.LON_RANGE, k),
+               t0 + start + np.arange(k, dtype=float))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--villages", type=int, default=1000)
+    parser.add_argument("--tankers", type=int, default=5000)
+    parser.add_argument("--pings", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'positions.sqlite')}")
+        models.create_schema(engine)
+        session_factory = sessionmaker(bind=engine)
+        with session_factory() as db:
+            synthetic.generate(db, args.villages, args.tankers, args.villages, seed=args.seed)
+            tanker_ids = np.arange(1, args.tankers + 1)
+            store = positions.get_store(db)
+            spatial.get_tanker_index(db)
+            t0 = time.time() - 10 * args.pings
+
+            started = time.perf_counter()
+            for ids, lats, lons, at in batches(rng, tanker_ids, args.pings, args.batch, t0):
+                store.ingest(db, ids, lats, lons, at)
+            elapsed = time.perf_counter() - started
+            footprint = sum(a.nbytes for a in (store._slot_of, store._ids, store._lat, store._lon, store._at, store._dirty))
+            print(f"store.ingest     {args.pings / elapsed:>12,.0f} pings/s  ({args.batch}-ping batches, "
+                  f"{len(store)} tankers, {footprint / 1024:.0f} KiB)")
+
+            # Dispatch must already rank by the pings: aim a village at one tanker's new position
+            tanker = db.query(models.Tanker).filter(models.Tanker.is_available == True).first()  # noqa: E712
+            lat, lon = store.current(tanker.id, None, None)
+            village = db.query(models.Village).first()
+            village.latitude, village.longitude = lat, lon
+            db.commit()
+            spatial.tanker_index.reset()
+            picked = crud.dispatch_tanker(db, village.id)
+            print(f"dispatch before flush picked the pinged tanker: {picked.get('tanker_id') == tanker.id}")
+
+            started = time.perf_counter()
+            written = store.flush(db)
+            print(f"flush            {written:>12,} rows in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+            stored = dict((i, (la, lo)) for i, la, lo in db.query(
+                models.Tanker.id, models.Tanker.current_latitude, models.Tanker.current_longitude))
+            mismatched = sum(1 for i in tanker_ids.tolist() if stored[i] != store.current(i, None, None))
+            print(f"database check:  {mismatched} tankers differ from their newest ping")
+
+            # What the endpoint adds per batch: decoding and validating the JSON body
+            adapter = TypeAdapter(List[schemas.TankerPing])
+            bodies = [json.dumps([
+                {"tanker_id": int(i), "latitude": float(a), "longitude": float(o)} for i, a, o in zip(ids, lats, lons)
+            ]) for ids, lats, lons, _ in batches(rng, tanker_ids, min(args.pings, 50000), args.batch, t0)]
+            started = time.perf_counter()
+            for body in bodies:
+                pings = adapter.validate_json(body)
+                store.ingest(db, [p.tanker_id for p in pings], [p.latitude for p in pings], [p.longitude for p in pings])
+            elapsed = time.perf_counter() - started
+            print(f"JSON + ingest    {sum(body.count('tanker_id') for body in bodies) / elapsed:>12,.0f} pings/s  "
+                  f"(request body decoding and validation included)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
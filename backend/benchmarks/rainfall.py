@@ -0,0 +1,84 @@
+"""Local rainfall archive: sync volume and read latency against the fake archive.
+
+    python -m backend.benchmarks.rainfall --locations 2000 --days 365
+
+Serves the synthetic archive in-process (backend.fake_archive) and syncs
+--locations points into a temporary on-disk store in three steps: a cold
+sync that stops a week short, the incremental sync that brings it up to
+today, and a sync with nothing left to fetch. It then times the reads the
+app makes from the mapped arrays (the 12-week chart for one village, annual
+totals for every village) next to a full-window refetch through the client,
+which is what each chart and seed used to cost.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+from backend import fake_archive, openmeteo, rainfall
+
+
+def client():
+    # No response cache, so every request reaches the archive
+    return openmeteo.RainfallClient(base_url="http://fake-archive/v1/archive", max_entries=1, ttl_s=0,
+                                    stale_s=0, transport=httpx.ASGITransport(app=fake_archive.app))
+
+
+async def timed_sync(store, points, start, end):
+    c = client()
+    requests, fetched = fake_archive.request_count, store.fetched_days
+    started = time.perf_counter()
+    failures = await store.sync(points, start, end, c, concurrency=32)
+    elapsed = time.perf_counter() - started
+    await c.aclose()
+    assert not failures, failures
+    return elapsed, fake_archive.request_count - requests, store.fetched_days - fetched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    points = [(rng.uniform(8, 34), rng.uniform(68, 97)) for _ in range(args.locations)]
+    end = date.today()
+    start = end - timedelta(days=args.days)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = rainfall.RainfallStore(tmp)
+        for label, window_end in (("cold", end - timedelta(days=7)), ("incremental", end), ("up to date", end)):
+            elapsed, requests, days = asyncio.run(timed_sync(store, points, start, window_end))
+            print(f"sync {label:<12} {elapsed * 1000:9.1f} ms  {requests:>6} requests  {days:>9} days fetched")
+
+        chart_start = end - timedelta(days=83)
+        sample = [rng.choice(points) for _ in range(args.reads)]
+        started = time.perf_counter()
+        for lat, lon in sample:
+            store.weekly(lat, lon, chart_start, weeks=12)
+        print(f"read 12-week chart    {(time.perf_counter() - started) / args.reads * 1e6:9.1f} us per village")
+
+        started = time.perf_counter()
+        totals = store.totals(points, start, end)
+        print(f"read annual totals    {(time.perf_counter() - started) * 1000:9.1f} ms for {len(totals)} villages")
+
+        async def refetch(n):
+            c = client()
+            started = time.perf_counter()
+            for lat, lon in sample[:n]:
+                await c.daily_precipitation(lat, lon, chart_start, end, timezone="auto")
+            await c.aclose()
+            return (time.perf_counter() - started) / n
+
+        print(f"refetch 12 weeks      {asyncio.run(refetch(50)) * 1e6:9.1f} us per village (in-process archive, no network)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""District/state summary read latency, per-write upkeep and recount cost at several scales.
+
+    python -m backend.benchmarks.regions --villages 10000 100000
+
+For each scale, builds a temporary SQLite database with
+backend.benchmarks.synthetic and times regions.summary (what
+GET /regions/summary serves) next to a full regions.recount, which is what
+every request cost before the summaries were maintained. It then times single
+readings through crud.add_water_data with the summaries folded in, and checks
+the stored summaries against a recount.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, regions, schemas
+from backend.benchmarks import synthetic
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--villages", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for villages in args.villages:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'regions.sqlite')}")
+            models.create_schema(engine)
+            with sessionmaker(bind=engine)() as db:
+                synthetic.generate(db, villages, max(100, villages // 100), villages, seed=args.seed)
+                summary_ms = timed(lambda: regions.summary(db), 20)
+                recount_ms = timed(lambda: regions.recount(db), 3)
+
+                started = time.perf_counter()
+                for _ in range(args.writes):
+                    crud.add_water_data(db, schemas.WaterDataCreate(
+                        village_id=rng.randint(1, villages),
+                        rainfall_deviation_mm=rng.uniform(-300, 50),
+                        groundwater_level_m=rng.uniform(0, 120),
+                    ))
+                write_ms = (time.perf_counter() - started) / args.writes * 1000
+                differences = len(regions.check(db))
+            engine.dispose()
+        print(f"{villages:>8} villages  summary {summary_ms:7.2f} ms  recount {recount_ms:8.1f} ms  "
+              f"add_water_data {write_ms:5.2f} ms  differences after writes {differences}")
+
+
+if __name__ == "__main__":
+    main()
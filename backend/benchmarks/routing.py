@@ -0,0 +1,66 @@
+"""Multi-stop route planning at district-cluster scale.
+
+    python -m backend.benchmarks.routing --villages 2000 --tankers 1500
+
+Villages are scattered around a few dozen district centres with a skewed
+population, so most are hamlets that should share trips. The plan is run
+twice: the second run reuses the cached distance matrix.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend import assignment, routing
+from backend.benchmarks.dispatch import LAT_RANGE, LON_RANGE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--villages", type=int, default=2000)
+    parser.add_argument("--tankers", type=int, default=1500)
+    parser.add_argument("--districts", type=int, default=40)
+    parser.add_argument("--radius-km", type=float, default=500.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centres = np.column_stack([rng.uniform(*LAT_RANGE, args.districts), rng.uniform(*LON_RANGE, args.districts)])
+    home = rng.integers(0, args.districts, args.villages)
+    lat = centres[home, 0] + rng.normal(0, 0.15, args.villages)
+    lon = centres[home, 1] + rng.normal(0, 0.15, args.villages)
+    villages = [
+        {"village_id": i + 1, "latitude": a, "longitude": o, "population": int(p), "priority_score": s}
+        for i, (a, o, p, s) in enumerate(zip(
+            lat, lon, np.maximum(100, rng.lognormal(5.5, 1.0, args.villages)), rng.uniform(1, 60, args.villages),
+        ))
+    ]
+    tankers = [
+        (i + 1, float(a), float(o), int(c))
+        for i, (a, o, c) in enumerate(zip(
+            rng.uniform(*LAT_RANGE, args.tankers),
+            rng.uniform(*LON_RANGE, args.tankers),
+            rng.choice([8000, 10000, 12000, 15000], args.tankers),
+        ))
+    ]
+    demand = sum(v["population"] for v in villages) * assignment.LITERS_PER_PERSON
+    print(f"{args.villages} villages ({demand / 1e6:.1f} ML demand) x {args.tankers} tankers")
+
+    routing.distance_cache.reset()
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        trips, capacity = routing.build_routes(villages, tankers, radius_km=args.radius_km)
+        elapsed = time.perf_counter() - start
+        stops = sum(len(t["stops"]) for t in trips)
+        delivered = sum(t["load_liters"] for t in trips)
+        print(f"{run}: {len(trips)} trips, {stops / len(trips):.2f} stops/trip, "
+              f"{delivered / (len(trips) * capacity):.0%} of route capacity used, "
+              f"{sum(t['distance_km'] for t in trips):,.0f} km in {elapsed:.2f} s")
+
+    # dispatch_batch sends whole tankers to each village, up to the per-village cap
+    whole = sum(min(max(1, -(-v["population"] * assignment.LITERS_PER_PERSON // capacity)),
+                    assignment.MAX_TANKERS_PER_VILLAGE) for v in villages)
+    print(f"whole tankers per village would need {whole:.0f} tankers for the same demand")
+
+if __name__ == "__main__":
+    main()
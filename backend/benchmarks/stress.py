@@ -0,0 +1,70 @@
+"""Stress model what-if latency and bulk recompute throughput on synthetic data.
+
+    python -m backend.benchmarks.stress --villages 100000 --readings 300000
+
+Builds a temporary SQLite database with backend.benchmarks.synthetic, times
+what-if scenarios over every village (the first call loads the latest
+readings, later ones reuse them until the data version moves), then
+recomputes the whole history with model version 1 (a switch away from the
+default) and checks that stored stress_index values match it exactly.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import live, models, stress
+from backend.benchmarks import synthetic
+
+SCENARIOS = [
+    ("current model", {}),
+    ("double rain weight", {"rain_factor": 0.1}),
+    ("cap groundwater at 2", {"groundwater_cap": 2.0}),
+    ("model v1", stress.MODELS[1].model_dump(exclude={"version"})),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--villages", type=int, default=100000)
+    parser.add_argument("--readings", type=int, default=300000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'stress.sqlite')}")
+        models.create_schema(engine)
+        with sessionmaker(bind=engine)() as db:
+            started = time.perf_counter()
+            synthetic.generate(db, args.villages, 100, args.readings, seed=args.seed)
+            print(f"generated {args.villages} villages, {args.readings} readings in {time.perf_counter() - started:.1f}s")
+
+            critical, warning = live.STRESS_BANDS[0][0], live.STRESS_BANDS[1][0]
+            for label, overrides in SCENARIOS:
+                model = stress.current_model().model_copy(update=overrides)
+                started = time.perf_counter()
+                result = stress.what_if(db, model, critical, warning)
+                counts = result["counts"]
+                print(f"what-if {label:<22} {(time.perf_counter() - started) * 1000:8.1f} ms  "
+                      f"critical {counts['critical']['current']:>6} -> {counts['critical']['scenario']:<6} "
+                      f"warning {counts['warning']['current']:>6} -> {counts['warning']['scenario']:<6} "
+                      f"rank correlation {result['triage']['rank_correlation']}")
+
+            summary = stress.recompute(db, model=stress.MODELS[1])
+            print(f"recompute with v1: {summary['readings_updated']} readings, {summary['villages']} villages "
+                  f"in {summary['elapsed_s']:.1f}s ({summary['readings_updated'] / summary['elapsed_s']:,.0f} readings/s)")
+
+            ids, rainfall, groundwater, stored = (np.array(c, dtype=float) for c in zip(*db.query(
+                models.WaterData.id, models.WaterData.rainfall_deviation_mm, models.WaterData.groundwater_level_m,
+                models.WaterData.stress_index)))
+            mismatched = int(np.sum(stress.MODELS[1].stress_array(rainfall, groundwater) != stored))
+            print(f"history check: {mismatched} readings differ from model v1, history version {stress.history_version(db)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Latency, throughput and memory of the crud engine and the API on synthetic data.
+
+    python -m backend.benchmarks.suite --scale 100k
+    python -m backend.benchmarks.suite --scale 100k --save baseline.json
+    python -m backend.benchmarks.suite --scale 100k --baseline baseline.json
+
+Runs offline on a temporary SQLite database (or --db, reused if it already
+holds data). Each case reports p50/p95/p99 latency and throughput over
+--iterations calls, plus the peak traced memory of a few extra calls made
+under tracemalloc (kept separate so tracing does not skew latency). With
+--baseline, cases whose p95 or peak memory grew by more than --tolerance
+are flagged and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+MEMORY_SAMPLES = 3
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn, iterations, setup=None):
+    """Time fn() `iterations` times (setup() runs untimed before each call)."""
+    timings = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    total = sum(timings)
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(MEMORY_SAMPLES):
+        if setup:
+            setup()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "ops_per_s": round(iterations / total, 1) if total else None,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def build_cases(db, client, rng, village_count):
+    """name -> (fn, setup); imports happen here, after DATABASE_URL is set."""
+    from backend import cache, crud, models, spatial
+
+    def restore_fleet():
+        # Dispatch consumes tankers; make them all available again (untimed)
+        db.query(models.Tanker).update({models.Tanker.is_available: True})
+        db.commit()
+        spatial.tanker_index.reset()
+        spatial.get_tanker_index(db).nearest(0.0, 0.0)
+
+    dispatched = [0]
+
+    def before_dispatch():
+        dispatched[0] += 1
+        if dispatched[0] % 50 == 1:
+            restore_fleet()
+
+    etag = [None]
+
+    def fetch_etag():
+        if etag[0] is None:
+            etag[0] = client.get("/crisis-dashboard/?threshold=0.0").headers["etag"]
+
+    def village():
+        return rng.randint(1, village_count)
+
+    return {
+        "crud.get_stressed_villages[limit=100]": (
+            lambda: crud.get_stressed_villages(db, threshold=6.0, limit=100), None),
+        "crud.get_stressed_villages[all]": (
+            lambda: crud.get_stressed_villages(db, threshold=6.0), None),
+        "crud.dispatch_tanker": (
+            lambda: crud.dispatch_tanker(db, village()), before_dispatch),
+        "GET /crisis-dashboard/ (changed)": (
+            lambda: client.get("/crisis-dashboard/?threshold=0.0"), cache.response_cache.clear),
+        "GET /crisis-dashboard/ (cached)": (
+            lambda: client.get("/crisis-dashboard/?threshold=0.0"), None),
+        "GET /crisis-dashboard/ (304)": (
+            lambda: client.get("/crisis-dashboard/?threshold=0.0", headers={"If-None-Match": etag[0]}), fetch_etag),
+        "GET /crisis-dashboard/?limit=50": (
+            lambda: client.get("/crisis-dashboard/?threshold=6.0&limit=50"), cache.response_cache.clear),
+        "GET /tankers/fleet (changed)": (
+            lambda: client.get("/tankers/fleet"), cache.response_cache.clear),
+        "GET /villages/?limit=1000 (deep keyset page)": (
+            lambda: client.get(f"/villages/?limit=1000&after={max(0, village_count - 1000)}"), None),
+        "GET /regions/summary (changed)": (
+            lambda: client.get("/regions/summary"), cache.response_cache.clear),
+        "GET /villages/{id}/history?granularity=month": (
+            lambda: client.get(f"/villages/{village()}/history?granularity=month"), None),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regression messages for cases slower or hungrier than the baseline."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("cases", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p95_ms", "peak_kib"):
+            # Ignore noise on tiny values
+            floor = 1.0 if metric == "p95_ms" else 64.0
+            if current[metric] > max(before[metric], floor) * tolerance:
+                regressions.append(f"{name}: {metric} {before[metric]} -> {current[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k", help="Dataset size: 1k, 10k, 100k or 1m water_data rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--db", help="SQLite file to use (generated if empty); default: a temporary file")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed growth factor before flagging")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.db is None:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, "bench.sqlite")
+    # The app builds its engine from settings at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+
+    from fastapi.testclient import TestClient
+    from backend import models
+    from backend.benchmarks.synthetic import SCALES, generate
+    from backend.database import SessionLocal, engine
+
+    if args.scale not in SCALES:
+        parser.error(f"--scale must be one of {', '.join(SCALES)}")
+    villages, tankers, readings = SCALES[args.scale]
+    models.create_schema(engine)
+    with SessionLocal() as db:
+        if db.query(models.Village.id).first() is None:
+            started = time.perf_counter()
+            generate(db, villages, tankers, readings, seed=args.seed)
+            print(f"Generated {args.scale} dataset in {time.perf_counter() - started:.1f} s")
+        village_count = db.query(models.Village).count()
+
+    from backend.main import app
+
+    results = {}
+    with SessionLocal() as db, TestClient(app) as client:
+        rng = random.Random(args.seed)
+        for name, (fn, setup) in build_cases(db, client, rng, village_count).items():
+            if args.filter and args.filter not in name:
+                continue
+            if setup:
+                setup()
+            fn()  # warm up (lazy indexes, prepared statements)
+            results[name] = measure(fn, args.iterations, setup)
+            r = results[name]
+            print(f"{name:<45} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  "
+                  f"{r['ops_per_s']:9.1f} ops/s  peak {r['peak_kib']:9.1f} KiB")
+
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "cases": results,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print(f"warning: baseline was recorded at scale {baseline.get('meta', {}).get('scale')}")
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if not regressions:
+            print(f"No regressions against {args.baseline} (tolerance x{args.tolerance})")
+        status = 1 if regressions else 0
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if tmp is not None:
+        tmp.cleanup()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
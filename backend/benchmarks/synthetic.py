@@ -0,0 +1,97 @@
+"""Deterministic synthetic datasets: villages, a tanker fleet and multi-year reading history.
+
+    python -m backend.benchmarks.synthetic --db bench.sqlite --scale 100k
+
+The same (scale, seed) always produces the same rows, so benchmark runs on
+different machines or commits measure identical data.
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, database, models, rollups
+from backend.benchmarks.dispatch import LAT_RANGE, LON_RANGE
+
+# name -> (villages, tankers, total water_data rows)
+SCALES = {
+    "1k": (200, 100, 1000),
+    "10k": (1000, 500, 10000),
+    "100k": (5000, 2000, 100000),
+    "1m": (20000, 10000, 1000000),
+}
+YEARS = 3
+END_DATE = datetime.datetime(2025, 12, 31)
+STATE_PREFIXES = ("MH", "RJ", "GJ", "KA", "MP", "UP", "TN", "AP", "TS", "HR")
+INSERT_CHUNK = 100000
+
+
+def generate(db, villages: int, tankers: int, readings: int, years: int = YEARS, seed: int = 42):
+    """Fill an empty database; returns the number of water_data rows written."""
+    rng = np.random.default_rng(seed)
+
+    lat = rng.uniform(*LAT_RANGE, villages)
+    lon = rng.uniform(*LON_RANGE, villages)
+    population = np.maximum(200, rng.lognormal(8.5, 1.2, villages)).astype(int)
+    database.bulk_insert(db, models.Village.__table__, ("id", "name", "district", "population", "latitude", "longitude"), [
+        (i + 1, f"Village {i + 1}", f"District {i % 400 + 1}", int(p), float(a), float(o))
+        for i, (p, a, o) in enumerate(zip(population, lat, lon))
+    ])
+
+    database.bulk_insert(db, models.Tanker.__table__,
+                         ("id", "license_plate", "capacity_liters", "is_available", "current_latitude", "current_longitude"), [
+        (i + 1, f"{STATE_PREFIXES[i % len(STATE_PREFIXES)]}-{i // 10000:02d}-SY-{i % 10000:04d}",
+         int(c), bool(a), float(x), float(y))
+        for i, (c, a, x, y) in enumerate(zip(
+            rng.choice([8000, 10000, 12000, 15000], tankers),
+            rng.random(tankers) < 0.8,
+            rng.uniform(*LAT_RANGE, tankers),
+            rng.uniform(*LON_RANGE, tankers),
+        ))
+    ])
+
+    # Readings are spread evenly across villages, spaced evenly over the period
+    span_s = years * 365 * 86400
+    start = END_DATE - datetime.timedelta(seconds=span_s)
+    village_ids = np.arange(readings) % villages + 1
+    offsets = np.sort(rng.uniform(0, span_s, readings))
+    moments = np.datetime64(start, "us") + (offsets * 1e6).astype("timedelta64[us]")
+    day_of_year = (moments.astype("datetime64[D]") - moments.astype("datetime64[Y]")).astype(int)
+    # Monsoon-shaped deficit with per-village bias, groundwater drifting deeper over time
+    season = np.sin((day_of_year - 150) / 365 * 2 * np.pi)
+    rainfall = np.round(season * 80 - 60 + rng.normal(0, 40, readings) + (village_ids % 7) * 10 - 30, 1)
+    groundwater = np.round(np.clip(10 + offsets / span_s * 15 + rng.normal(0, 5, readings) + village_ids % 20, 0, 60), 1)
+    stress = crud.calculate_stress_index_array(rainfall, groundwater)
+
+    for lo in range(0, readings, INSERT_CHUNK):
+        hi = min(lo + INSERT_CHUNK, readings)
+        database.bulk_insert(db, models.WaterData.__table__,
+                             ("village_id", "record_date", "rainfall_deviation_mm", "groundwater_level_m", "stress_index"),
+                             list(zip(village_ids[lo:hi].tolist(), moments[lo:hi].astype(object).tolist(),
+                                      rainfall[lo:hi].tolist(), groundwater[lo:hi].tolist(), stress[lo:hi].tolist())))
+    db.commit()
+    crud.rebuild_village_status(db)
+    rollups.backfill(db)
+    return readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="SQLite file to create")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    models.create_schema(engine)
+    started = time.perf_counter()
+    with sessionmaker(bind=engine)() as db:
+        rows = generate(db, *SCALES[args.scale], seed=args.seed)
+    print(f"Generated {args.scale} dataset ({rows} readings) in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
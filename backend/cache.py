@@ -0,0 +1,130 @@
+"""Data versioning and response caching for polled endpoints.
+
+Every write that changes what the API serves bumps a single counter row
+(data_version) in its own transaction. Polled GET endpoints read the counter
+first: a client whose If-None-Match still matches gets a 304 without any
+further work, and everyone else is served the serialized body from an
+in-process LRU cache keyed on (path, query), rebuilt only when the version
+has moved.
+
+The counter lives in the database, so writes made by other workers or by
+scripts such as backend.seed invalidate every process's cache.
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from backend import database, models, serialize
+from backend.config import settings
+
+
+def bump_version(db: Session):
+    """Advance the data version within the caller's transaction (caller commits)."""
+    stmt = database.upsert(db, models.DataVersion).values(id=1, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.DataVersion.id],
+        set_={"version": models.DataVersion.version + 1},
+    ))
+
+
+def bump_history_generation(db: Session):
+    """Record that water_data was replaced wholesale, voiding id watermarks (caller commits)."""
+    stmt = database.upsert(db, models.DataVersion).values(id=1, version=0, history_generation=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.DataVersion.id],
+        set_={"history_generation": models.DataVersion.history_generation + 1},
+    ))
+
+
+def current_history_generation(db: Session) -> int:
+    return db.query(models.DataVersion.history_generation).filter(models.DataVersion.id == 1).scalar() or 0
+
+
+def current_version(db: Session) -> int:
+    return db.query(models.DataVersion.version).filter(models.DataVersion.id == 1).scalar() or 0
+
+
+class ResponseCache:
+    """LRU of serialized responses bounded by total body size."""
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = settings.response_cache_max_bytes if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # key -> (version, body, headers)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """Return (body, headers) cached for key at exactly this version, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, body: bytes, headers: dict):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            # A newer version may already be cached by a concurrent request
+            if old is not None and old[0] > version:
+                self._entries[key] = old
+                self._size += len(old[1])
+                return
+            if len(body) > self.max_bytes:
+                return
+            self._entries[key] = (version, body, headers)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+response_cache = ResponseCache()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cached_json(request: Request, db: Session, build) -> Response:
+    """Serve build()'s JSON for this request, or 304 when the client's copy is current.
+
+    build() returns (content, headers) and is only called when the cache has
+    nothing for the current data version.
+    """
+    version = current_version(db)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    etag = f'"{version}-{zlib.crc32(repr(key).encode()):08x}"'
+    # no-cache: browsers may store the body but must revalidate every poll
+    validators = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=validators)
+
+    cached = response_cache.get(key, version)
+    if cached is None:
+        content, headers = build()
+        body = serialize.dumps(content)
+        response_cache.put(key, version, body, headers)
+    else:
+        body, headers = cached
+    return Response(content=body, media_type="application/json", headers={**headers, **validators})
@@ -0,0 +1,387 @@
+"""Zoom-level clustering of villages and tankers for the map.
+
+Points are aggregated into a quadtree pyramid of Web Mercator grid cells,
+one level per map zoom with CELLS_PER_TILE cells across each 256 px tile,
+so a viewport covers a few hundred cells at any zoom whatever the dataset
+size. Cells are identified by Morton (quadkey) codes: a cell's parent is
+its code shifted right by two bits, so one sort of the points orders every
+level and each level is reduced from the one below it. Each level keeps its
+non-empty cells sorted by code, with running sums (count, centroid,
+population, band counts, ...) and maxima (stress).
+
+The pyramid is built from the database on first use and then kept in step
+with committed writes: live events mark the villages or tankers they touch,
+and on the next query those rows are re-read and applied as deltas. A
+maximum that may have dropped marks its cell dirty, and a level's dirty
+cells are recomputed from the points when that level is next read. A reset
+event rebuilds from scratch. Like the tanker index, this is per process:
+live events only reach the worker that committed the write, so with
+several workers set CLUSTER_PYRAMID_ENABLED=false and query() builds each
+answer from the database instead (once per data version, as /map/clusters
+caches on it).
+"""
+import math
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend import live, models
+from backend.config import settings
+
+# Deeper zooms are served from this level (~600 m cells)
+MAX_ZOOM = 14
+# ~64 px cells on 256 px tiles
+CELLS_PER_TILE = 4
+_AXIS_BITS = MAX_ZOOM + 2  # log2(CELLS_PER_TILE) == 2
+MAX_LAT = 85.05112878
+# Viewports spanning more cells than this are answered by one scan of the level
+MAX_VIEWPORT_CELLS = 65536
+# Changed ids re-read per IN (...) query
+CHUNK = 900
+# Leading value columns of every layer, before its own sums and maxima
+_BASE = ("count", "lat", "lon", "id")
+
+
+def _spread(v):
+    """Interleave zeros between the low 16 bits of v."""
+    v = v & 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    return (v | (v << 1)) & 0x55555555
+
+
+def _compact_bits(v):
+    v = v & 0x55555555
+    v = (v | (v >> 1)) & 0x33333333
+    v = (v | (v >> 2)) & 0x0F0F0F0F
+    v = (v | (v >> 4)) & 0x00FF00FF
+    return (v | (v >> 8)) & 0xFFFF
+
+
+def _morton(x, y):
+    return (_spread(np.asarray(x, dtype=np.int64)) << 1) | _spread(np.asarray(y, dtype=np.int64))
+
+
+def _finest_codes(lats, lons):
+    """Cell code of each point at MAX_ZOOM (Web Mercator, y growing southwards)."""
+    n = 1 << _AXIS_BITS
+    x = (np.asarray(lons, dtype=float) + 180.0) / 360.0 * n
+    phi = np.radians(np.clip(np.asarray(lats, dtype=float), -MAX_LAT, MAX_LAT))
+    y = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / math.pi) / 2.0 * n
+    return _morton(np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64))
+
+
+def _shift(zoom: int) -> int:
+    return 2 * (MAX_ZOOM - zoom)
+
+
+class _Level:
+    __slots__ = ("codes", "sums", "maxes", "dirty")
+
+    def __init__(self, codes, sums, maxes):
+        self.codes = codes
+        self.sums = sums
+        self.maxes = maxes
+        self.dirty = np.zeros(len(codes), dtype=bool)
+
+
+class ClusterPyramid:
+    """Per-zoom grid aggregates of one point layer, safe to share across threads.
+
+    read(db, ids) returns (ids, lats, lons, {field: values}) for the given
+    ids, or every point when ids is None; sums and maxes name its fields.
+    """
+
+    def __init__(self, read, sums, maxes, id_key):
+        self._read = read
+        self.sum_fields = tuple(sums)
+        self.max_fields = tuple(maxes)
+        self.id_key = id_key
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = set()
+        self._rebuild = True
+        self._levels = []
+        self._clear_points()
+
+    def _clear_points(self):
+        self._slots = {}  # id -> slot
+        self._codes = np.empty(0, dtype=np.int64)  # finest cell of each slot
+        self._present = np.zeros(0, dtype=bool)
+        self._values = np.empty((0, len(_BASE) + len(self.sum_fields) + len(self.max_fields)))
+
+    def mark(self, ids):
+        """Re-read these points before the next query."""
+        with self._pending_lock:
+            self._pending.update(ids)
+
+    def reset(self):
+        """Rebuild everything before the next query."""
+        with self._pending_lock:
+            self._rebuild = True
+            self._pending.clear()
+
+    def query(self, db: Session, zoom: int, bbox=None):
+        """Non-empty cells at zoom within bbox (min_lon, min_lat, max_lon, max_lat).
+
+        Each is a dict with the centroid (lat, lng), count, the layer's sums
+        and maxima, and the point's id when the cell holds a single point.
+        """
+        zoom = min(max(int(zoom), 0), MAX_ZOOM)
+        with self._lock:
+            self._refresh(db)
+            level = self._levels[zoom]
+            rows = self._rows_in(level, zoom, bbox)
+            rows = rows[level.sums[rows, 0] > 0]
+            if len(self.max_fields) and level.dirty[rows].any():
+                self._recompute_maxes(zoom)
+            sums, maxes = level.sums[rows], level.maxes[rows]
+
+        n_base = len(_BASE)
+        clusters = []
+        for s, m in zip(sums.tolist(), maxes.tolist()):
+            count = round(s[0])
+            cluster = {"lat": s[1] / count, "lng": s[2] / count, "count": count}
+            if count == 1:
+                cluster[self.id_key] = round(s[3])
+            for name, value in zip(self.sum_fields, s[n_base:]):
+                cluster[name] = round(value)
+            for name, value in zip(self.max_fields, m):
+                cluster[name] = None if math.isnan(value) else round(value, 2)
+            clusters.append(cluster)
+        return clusters
+
+    # --- internals ---
+
+    def _refresh(self, db: Session):
+        with self._pending_lock:
+            rebuild, self._rebuild = self._rebuild, False
+            pending, self._pending = self._pending, set()
+        if rebuild:
+            self._build(db)
+        elif pending:
+            self._apply(db, sorted(pending))
+
+    def _rows(self, ids, lats, lons, fields):
+        """Value matrix (count, lat, lon, id, sums..., maxes...) for read() output."""
+        values = np.empty((len(ids), len(_BASE) + len(self.sum_fields) + len(self.max_fields)))
+        values[:, 0] = 1.0
+        values[:, 1] = lats
+        values[:, 2] = lons
+        values[:, 3] = ids
+        for i, name in enumerate(self.sum_fields + self.max_fields, start=len(_BASE)):
+            values[:, i] = fields[name]
+        return values
+
+    def _build(self, db: Session):
+        ids, lats, lons, fields = self._read(db, None)
+        self._clear_points()
+        n = len(ids)
+        self._slots = dict(zip(ids.tolist(), range(n)))
+        self._codes = _finest_codes(lats, lons)
+        self._present = np.ones(n, dtype=bool)
+        self._values = self._rows(ids, lats, lons, fields)
+
+        n_sum = len(_BASE) + len(self.sum_fields)
+        order = np.argsort(self._codes, kind="stable")
+        codes, values = self._codes[order], self._values[order]
+        sums, maxes = values[:, :n_sum], values[:, n_sum:]
+        levels = []
+        # Finest level from the points, then each level from the one below
+        for zoom in range(MAX_ZOOM, -1, -1):
+            if zoom < MAX_ZOOM:
+                codes = codes >> 2
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else codes
+            if len(codes):
+                sums = np.add.reduceat(sums, starts, axis=0)
+                maxes = np.fmax.reduceat(maxes, starts, axis=0)
+            codes = codes[starts]
+            levels.append(_Level(codes, sums, maxes))
+        self._levels = levels[::-1]
+
+    def _apply(self, db: Session, ids):
+        """Re-read the given points and move their contributions between cells."""
+        found_ids, found_lats, found_lons, found_fields = [], [], [], []
+        for start in range(0, len(ids), CHUNK):
+            chunk_ids, lats, lons, fields = self._read(db, ids[start:start + CHUNK])
+            found_ids.append(chunk_ids)
+            found_lats.append(lats)
+            found_lons.append(lons)
+            found_fields.append(fields)
+        found_ids = np.concatenate(found_ids)
+        new_values = self._rows(
+            found_ids, np.concatenate(found_lats), np.concatenate(found_lons),
+            {name: np.concatenate([f[name] for f in found_fields]) for name in self.sum_fields + self.max_fields},
+        )
+        new_codes = _finest_codes(new_values[:, 1], new_values[:, 2])
+
+        # Slots for every id; points that were not found are removed
+        for i in ids:
+            if i not in self._slots:
+                self._alloc(i)
+        slots = np.array([self._slots[i] for i in ids], dtype=np.int64)
+        new_slots = np.array([self._slots[i] for i in found_ids.tolist()], dtype=np.int64)
+        old_slots = slots[self._present[slots]]
+
+        n_sum = len(_BASE) + len(self.sum_fields)
+        old_codes, old_values = self._codes[old_slots], self._values[old_slots]
+        for zoom, level in enumerate(self._levels):
+            shift = _shift(zoom)
+            if len(old_slots):
+                rows = np.searchsorted(level.codes, old_codes >> shift)
+                np.subtract.at(level.sums, rows, old_values[:, :n_sum])
+                # The cell's maximum may have come from a point that is leaving
+                if len(self.max_fields):
+                    level.dirty[rows[(old_values[:, n_sum:] >= level.maxes[rows]).any(axis=1)]] = True
+            if len(new_slots):
+                codes = new_codes >> shift
+                self._insert_cells(level, np.unique(codes))
+                rows = np.searchsorted(level.codes, codes)
+                np.add.at(level.sums, rows, new_values[:, :n_sum])
+                np.fmax.at(level.maxes, rows, new_values[:, n_sum:])
+            self._drop_empty(level)
+
+        self._present[slots] = False
+        self._present[new_slots] = True
+        self._codes[new_slots] = new_codes
+        self._values[new_slots] = new_values
+
+    def _alloc(self, point_id: int):
+        slot = len(self._slots)
+        self._slots[point_id] = slot
+        if slot >= len(self._present):
+            grow = max(16, len(self._present))
+            self._codes = np.concatenate([self._codes, np.zeros(grow, dtype=np.int64)])
+            self._present = np.concatenate([self._present, np.zeros(grow, dtype=bool)])
+            self._values = np.concatenate([self._values, np.zeros((grow, self._values.shape[1]))])
+
+    @staticmethod
+    def _insert_cells(level: _Level, codes):
+        at = np.searchsorted(level.codes, codes)
+        exists = at < len(level.codes)
+        exists[exists] = level.codes[at[exists]] == codes[exists]
+        if exists.all():
+            return
+        at, missing = at[~exists], codes[~exists]
+        level.codes = np.insert(level.codes, at, missing)
+        level.sums = np.insert(level.sums, at, 0.0, axis=0)
+        level.maxes = np.insert(level.maxes, at, np.nan, axis=0)
+        level.dirty = np.insert(level.dirty, at, False)
+
+    @staticmethod
+    def _drop_empty(level: _Level):
+        # Cells emptied by moves are dropped once they make up half the level
+        empty = level.sums[:, 0] < 0.5
+        if empty.sum() * 2 > len(level.codes):
+            keep = ~empty
+            level.codes, level.sums = level.codes[keep], level.sums[keep]
+            level.maxes, level.dirty = level.maxes[keep], level.dirty[keep]
+
+    def _recompute_maxes(self, zoom: int):
+        level = self._levels[zoom]
+        n_sum = len(_BASE) + len(self.sum_fields)
+        present = np.flatnonzero(self._present)
+        rows = np.searchsorted(level.codes, self._codes[present] >> _shift(zoom))
+        members = level.dirty[rows]
+        level.maxes[level.dirty] = np.nan
+        np.fmax.at(level.maxes, rows[members], self._values[present[members], n_sum:])
+        level.dirty[:] = False
+
+    def _rows_in(self, level: _Level, zoom: int, bbox):
+        """Indices of the level's cells inside bbox (all cells when bbox is None)."""
+        if bbox is None:
+            return np.arange(len(level.codes))
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # Corner cells; y grows southwards, so the north edge gives the smallest y
+        corners = _finest_codes([max_lat, min_lat], [min_lon, max_lon]) >> _shift(zoom)
+        (x0, x1), (y0, y1) = (_compact_bits(corners >> 1)).tolist(), _compact_bits(corners).tolist()
+        n = (1 << zoom) * CELLS_PER_TILE
+        # A box crossing the antimeridian becomes two column ranges
+        spans = [(x0, x1)] if x0 <= x1 else [(x0, n - 1), (0, x1)]
+        if sum(hi - lo + 1 for lo, hi in spans) * (y1 - y0 + 1) > MAX_VIEWPORT_CELLS:
+            x, y = _compact_bits(level.codes >> 1), _compact_bits(level.codes)
+            inside = (y >= y0) & (y <= y1) & np.logical_or.reduce([(x >= lo) & (x <= hi) for lo, hi in spans])
+            return np.flatnonzero(inside)
+        xs = np.concatenate([np.arange(lo, hi + 1) for lo, hi in spans])
+        ys = np.arange(y0, y1 + 1)
+        wanted = _morton(np.repeat(xs, len(ys)), np.tile(ys, len(xs)))
+        rows = np.searchsorted(level.codes, wanted)
+        hit = rows < len(level.codes)
+        hit[hit] = level.codes[rows[hit]] == wanted[hit]
+        return rows[hit]
+
+
+# --- Layers ---
+
+def _read_villages(db: Session, ids):
+    status = models.VillageStatus
+    query = db.query(
+        models.Village.id, models.Village.latitude, models.Village.longitude,
+        models.Village.population, status.stress_index,
+    ).outerjoin(status, status.village_id == models.Village.id).filter(
+        models.Village.latitude.isnot(None), models.Village.longitude.isnot(None),
+    )
+    if ids is not None:
+        query = query.filter(models.Village.id.in_(ids))
+    rows = query.all()
+    village_ids, lats, lons, population, stress = (
+        np.array(col, dtype=float) for col in (zip(*rows) if rows else ([],) * 5)
+    )
+    critical, warning = live.STRESS_BANDS[0][0], live.STRESS_BANDS[1][0]
+    return village_ids.astype(np.int64), lats, lons, {
+        "population": np.nan_to_num(population),
+        # NaN (no readings yet) compares False, so such villages are in neither band
+        "critical": (stress >= critical).astype(float),
+        "warning": ((stress >= warning) & (stress < critical)).astype(float),
+        "max_stress": stress,
+    }
+
+
+def _read_tankers(db: Session, ids):
+    query = db.query(
+        models.Tanker.id, models.Tanker.current_latitude, models.Tanker.current_longitude,
+        models.Tanker.is_available, models.Tanker.capacity_liters,
+    ).filter(models.Tanker.current_latitude.isnot(None), models.Tanker.current_longitude.isnot(None))
+    if ids is not None:
+        query = query.filter(models.Tanker.id.in_(ids))
+    rows = query.all()
+    tanker_ids, lats, lons, available, capacity = (
+        np.array(col, dtype=float) for col in (zip(*rows) if rows else ([],) * 5)
+    )
+    return tanker_ids.astype(np.int64), lats, lons, {
+        "available": available,
+        "capacity_liters": np.nan_to_num(capacity),
+    }
+
+
+LAYER_ARGS = {
+    "villages": (_read_villages, ("population", "critical", "warning"), ("max_stress",), "village_id"),
+    "tankers": (_read_tankers, ("available", "capacity_liters"), (), "tanker_id"),
+}
+LAYERS = {name: ClusterPyramid(*args) for name, args in LAYER_ARGS.items()}
+
+
+def query(db: Session, layer: str, zoom: int, bbox=None):
+    """ClusterPyramid.query on the shared pyramid, or on one built from the database when it is disabled."""
+    if settings.cluster_pyramid_enabled:
+        return LAYERS[layer].query(db, zoom, bbox)
+    return ClusterPyramid(*LAYER_ARGS[layer]).query(db, zoom, bbox)
+
+
+def _on_event(event_type: str, data):
+    if event_type == "readings":
+        LAYERS["villages"].mark(v["village_id"] for v in data["villages"])
+    elif event_type == "villages":
+        LAYERS["villages"].mark(v["id"] for v in data["created"])
+    elif event_type == "tankers":
+        LAYERS["tankers"].mark(data.get("unavailable", []) + data.get("released", []))
+    elif event_type == "positions":
+        LAYERS["tankers"].mark(t["id"] for t in data["moved"])
+    elif event_type == "reset":
+        for layer in LAYERS.values():
+            layer.reset()
+
+
+live.add_listener(_on_event)
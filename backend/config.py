@@ -3,6 +3,47 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Using SQLite as fallback since Docker/PostgreSQL isn't natively installed on this system
     database_url: str = "sqlite:///./drought_db.sqlite"
+    # Serve dispatch from the in-process tanker index; disable when tankers are
+    # written by other processes so every dispatch reads positions from SQL
+    tanker_index_enabled: bool = True
+    # Likewise for the /map/clusters pyramid (backend.clusters): disable with several
+    # workers so clusters are built from SQL rather than this worker's live events
+    cluster_pyramid_enabled: bool = True
+    # GPS pings are held in memory and written back this often (backend.positions)
+    position_flush_interval_s: float = 5.0
+
+    # Open-Meteo historical archive and its response cache
+    open_meteo_archive_url: str = "https://archive-api.open-meteo.com/v1/archive"
+    rainfall_cache_ttl_s: float = 3600
+    rainfall_cache_stale_s: float = 86400  # served while refreshing in the background
+    rainfall_cache_size: int = 4096
+
+    # Local daily precipitation archive (backend.rainfall); empty keeps it in memory.
+    # Every worker may share it: writers serialize on a file lock in the directory,
+    # except where fcntl is unavailable (Windows), which needs one directory per process.
+    # Stored totals count as complete while they stop at most this many days short
+    rainfall_store_dir: str = "./rainfall_store"
+    rainfall_max_stale_days: int = 14
+
+    # Serialized responses of polled endpoints, keyed on the data version
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+
+    # Live updates (SSE): replay history kept for reconnects, per-client queue length
+    live_history_max_bytes: int = 16 * 1024 * 1024
+    live_queue_size: int = 256
+
+    # Request/SQL metrics at /metrics; the profiler samples this fraction of
+    # requests and keeps those slower than metrics_profile_slow_ms
+    metrics_enabled: bool = True
+    metrics_profile_sample_rate: float = 0.0
+    metrics_profile_slow_ms: float = 500
+
+    # backend.stress.MODELS entry used for every reading, seeded or ingested; run the recompute
+    # job after changing it
+    stress_model_version: int = 2
+
+    # Check the schema version at startup and migrate if it is behind (backend.migrate)
+    schema_check_on_startup: bool = True
     
     class Config:
         env_file = ".env"
@@ -1,6 +1,8 @@
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.orm import Session
-from backend import models, schemas
-import pandas as pd
+from backend import cache, database, live, models, positions, regions, rollups, schemas, spatial, stress
+from backend.config import settings
+import numpy as np
 import math
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -13,80 +15,375 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 def calculate_stress_index(rainfall_deviation: float, groundwater_level: float) -> float:
-    # Basic Heuristic calculation for stress
-    # Higher index (max 10) = Higher stress (more dangerous drought)
-    
-    # Rainfall deviation: negative means less rain. More negative -> higher stress.
-    rain_stress = max(0, -rainfall_deviation * 0.05) 
-    
-    # Groundwater level: deeper water (larger number) -> higher stress
-    groundwater_stress = max(0, groundwater_level * 0.1)
-    
-    total_stress = rain_stress + groundwater_stress
-    return min(10.0, round(total_stress, 2))
+    # Higher index (max 10) = Higher stress (more dangerous drought); see backend.stress
+    return stress.current_model().stress(rainfall_deviation, groundwater_level)
+
+def calculate_stress_index_array(rainfall_deviation: np.ndarray, groundwater_level: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_stress_index over arrays of readings."""
+    return stress.current_model().stress_array(rainfall_deviation, groundwater_level)
+
+def triage_score_array(stress_index: np.ndarray, population: np.ndarray) -> np.ndarray:
+    """Vectorized triage_score."""
+    return stress.current_model().priority_array(stress_index, population)
+
+def triage_score(stress_index: float, population: int) -> float:
+    # Triage Algorithm: Priority = Stress Index * Population scale factor
+    return stress.current_model().priority(stress_index, population)
 
 def create_village(db: Session, village: schemas.VillageCreate):
     db_village = models.Village(**village.model_dump())
     db.add(db_village)
+    db.flush()
+    regions.villages_added(db, [db_village.district], [db_village.population])
+    cache.bump_version(db)
+    live.queue_event(db, "villages", {"created": [{"id": db_village.id, **village.model_dump()}]})
     db.commit()
     db.refresh(db_village)
     return db_village
 
-def get_villages(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Village).offset(skip).limit(limit).all()
+VILLAGE_COLUMNS = (
+    models.Village.id, models.Village.name, models.Village.district, models.Village.population,
+    models.Village.latitude, models.Village.longitude,
+)
+
+def get_villages(db: Session, skip: int = 0, limit: int = 100, after: int = None, batch_size: int = 2000):
+    """Stream village rows as VILLAGE_COLUMNS tuples in id order; iterate the result's partitions().
+
+    `after` (the last id already seen) seeks on the primary key, so a deep
+    page costs what the first one does; `skip` still offsets past rows one by one.
+    """
+    query = select(*VILLAGE_COLUMNS).order_by(models.Village.id)
+    if after is not None:
+        query = query.where(models.Village.id > after)
+    if skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return db.execute(query.execution_options(yield_per=batch_size))
+
+def next_village_cursor(db: Session, skip: int = 0, limit: int = 100, after: int = None):
+    """The last village id of the page get_villages would return if more villages follow it, else None.
+
+    Walks only the primary key index, so it can be sent as a header before the page is streamed.
+    """
+    query = db.query(models.Village.id).order_by(models.Village.id)
+    if after is not None:
+        query = query.filter(models.Village.id > after)
+    ids = [row[0] for row in query.offset(skip + limit - 1).limit(2)]
+    return ids[0] if len(ids) == 2 else None
+
+def _upsert_village_status(db: Session, rows):
+    """Insert or refresh village_status rows, never replacing a newer reading with an older one.
+
+    Queues a live "readings" event with the rows that took effect and the
+    villages whose stress band changed.
+    """
+    if not rows:
+        return
+    village_ids = [row["village_id"] for row in rows]
+    previous = {}
+    for start in range(0, len(village_ids), 900):
+        previous.update((v, (d, s)) for v, d, s in db.query(
+            models.VillageStatus.village_id, models.VillageStatus.record_date, models.VillageStatus.stress_index,
+        ).filter(models.VillageStatus.village_id.in_(village_ids[start:start + 900])))
+
+    stmt = database.upsert(db, models.VillageStatus)
+    excluded = stmt.excluded
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.VillageStatus.village_id],
+        set_={
+            "record_date": excluded.record_date,
+            "stress_index": excluded.stress_index,
+            "predicted_stress_index": excluded.predicted_stress_index,
+            "priority_score": excluded.priority_score,
+            "rainfall_deviation_mm": excluded.rainfall_deviation_mm,
+            "groundwater_level_m": excluded.groundwater_level_m,
+        },
+        where=excluded.record_date >= models.VillageStatus.record_date,
+    ), rows)
+
+    updated, bands = [], []
+    for row in rows:
+        old_date, old_stress = previous.get(row["village_id"], (None, None))
+        if old_date is not None and row["record_date"] < old_date:
+            continue
+        band = live.stress_band(row["stress_index"])
+        updated.append({
+            "village_id": row["village_id"],
+            "stress_index": row["stress_index"],
+            "priority_score": row["priority_score"],
+            "record_date": row["record_date"],
+            "band": band,
+        })
+        old_band = live.stress_band(old_stress) if old_date is not None else None
+        if band != old_band:
+            bands.append({"village_id": row["village_id"], "from": old_band, "to": band})
+    regions.bands_changed(db, [(b["village_id"], b["from"], b["to"]) for b in bands])
+    live.queue_event(db, "readings", {"villages": updated, "bands": bands})
 
 def add_water_data(db: Session, data: schemas.WaterDataCreate):
-    stress = calculate_stress_index(data.rainfall_deviation_mm, data.groundwater_level_m)
+    stress_index = calculate_stress_index(data.rainfall_deviation_mm, data.groundwater_level_m)
     db_data = models.WaterData(
         village_id=data.village_id,
         rainfall_deviation_mm=data.rainfall_deviation_mm,
         groundwater_level_m=data.groundwater_level_m,
-        stress_index=stress
+        stress_index=stress_index
     )
     db.add(db_data)
+    db.flush()
+    population = db.query(models.Village.population).filter(models.Village.id == data.village_id).scalar()
+    _upsert_village_status(db, [{
+        "village_id": db_data.village_id,
+        "record_date": db_data.record_date,
+        "stress_index": stress_index,
+        "predicted_stress_index": db_data.predicted_stress_index,
+        "priority_score": triage_score(stress_index, population),
+        "rainfall_deviation_mm": db_data.rainfall_deviation_mm,
+        "groundwater_level_m": db_data.groundwater_level_m,
+    }])
+    rollups.add_readings(db, [db_data.village_id], [db_data.record_date], [stress_index],
+                         [db_data.rainfall_deviation_mm], [db_data.groundwater_level_m])
+    cache.bump_version(db)
     db.commit()
     db.refresh(db_data)
     return db_data
 
-def get_stressed_villages(db: Session, threshold: float = 7.0):
-    # Returns the latest water data where stress > threshold, joined with village data
-    
-    return db.query(models.Village, models.WaterData).join(models.WaterData).filter(
-        models.WaterData.stress_index >= threshold
-    ).order_by(models.WaterData.stress_index.desc()).all()
+def rebuild_village_status(db: Session):
+    """Recompute village_status, and the district summaries counted from it, from the full water_data history."""
+    latest = db.query(
+        models.WaterData.id,
+        func.row_number().over(
+            partition_by=models.WaterData.village_id,
+            order_by=(models.WaterData.record_date.desc(), models.WaterData.id.desc()),
+        ).label("rank"),
+    ).subquery()
+    rows = db.query(
+        models.WaterData.village_id, models.WaterData.record_date,
+        models.WaterData.stress_index, models.WaterData.predicted_stress_index, models.Village.population,
+        models.WaterData.rainfall_deviation_mm, models.WaterData.groundwater_level_m,
+    ).join(latest, and_(latest.c.id == models.WaterData.id, latest.c.rank == 1)).join(
+        models.Village, models.Village.id == models.WaterData.village_id
+    ).all()
+    db.query(models.VillageStatus).delete()
+    db.bulk_insert_mappings(models.VillageStatus, [
+        {
+            "village_id": village_id,
+            "record_date": record_date,
+            "stress_index": stress_index,
+            "predicted_stress_index": predicted,
+            "priority_score": triage_score(stress_index or 0.0, population),
+            "rainfall_deviation_mm": rainfall,
+            "groundwater_level_m": groundwater,
+        }
+        for village_id, record_date, stress_index, predicted, population, rainfall, groundwater in rows
+    ])
+    regions.rebuild(db)
+    cache.bump_version(db)
+    live.queue_event(db, "reset", {})
+    db.commit()
+    return len(rows)
+
+def ensure_village_status(db: Session):
+    """Backfill village_status on databases created before it existed."""
+    if db.query(models.VillageStatus.village_id).first() is None and db.query(models.WaterData.id).first() is not None:
+        rebuild_village_status(db)
+
+def within_bbox(query, lat_column, lon_column, bbox):
+    """Filter query to points inside bbox (min_lon, min_lat, max_lon, max_lat), see spatial.parse_bbox."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    query = query.filter(lat_column.between(min_lat, max_lat))
+    if min_lon <= max_lon:
+        return query.filter(lon_column.between(min_lon, max_lon))
+    return query.filter(or_(lon_column >= min_lon, lon_column <= max_lon))
+
+def get_stressed_villages(db: Session, threshold: float = 7.0, limit: int = None, after=None, bbox=None):
+    """Return rows of village and latest-status columns at or above threshold, highest priority first.
+
+    Rows are named tuples (village_id, village_name, district, population,
+    latitude, longitude, stress_index, predicted_stress_index,
+    priority_score, record_date). Pages are keyed on (priority_score,
+    village_id): pass the last row's pair as `after` to continue from it.
+    `bbox` limits the result to a map viewport.
+    """
+    status = models.VillageStatus
+    village = models.Village
+    query = db.query(
+        status.village_id, village.name.label("village_name"), village.district, village.population,
+        village.latitude, village.longitude, status.stress_index, status.predicted_stress_index,
+        status.priority_score, status.record_date,
+    ).join(status, status.village_id == village.id).filter(
+        status.stress_index >= threshold
+    )
+    if bbox is not None:
+        query = within_bbox(query, models.Village.latitude, models.Village.longitude, bbox)
+    if after is not None:
+        priority, village_id = after
+        query = query.filter(or_(
+            status.priority_score < priority,
+            and_(status.priority_score == priority, status.village_id < village_id),
+        ))
+    query = query.order_by(status.priority_score.desc(), status.village_id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def find_nearby_tankers(db: Session, latitude: float, longitude: float, radius_km: float, k: int = 1):
+    """Return up to k (tanker_id, distance_km) pairs of available tankers, nearest first.
+
+    Candidates are prefiltered with a lat/lon bounding box in SQL so only
+    tankers in the surrounding area are read, then ranked with a vectorized haversine.
+    """
+    min_lat, max_lat, min_lon, max_lon = spatial.bounding_box(latitude, longitude, radius_km)
+    query = db.query(
+        models.Tanker.id, models.Tanker.current_latitude, models.Tanker.current_longitude
+    ).filter(
+        models.Tanker.is_available == True,
+        models.Tanker.current_latitude.between(min_lat, max_lat),
+    )
+    if max_lon - min_lon < 360:
+        # Boxes crossing the antimeridian are split into two longitude ranges
+        lon_filter = models.Tanker.current_longitude.between(max(min_lon, -180.0), min(max_lon, 180.0))
+        if min_lon < -180:
+            lon_filter = lon_filter | (models.Tanker.current_longitude >= min_lon + 360)
+        elif max_lon > 180:
+            lon_filter = lon_filter | (models.Tanker.current_longitude <= max_lon - 360)
+        query = query.filter(lon_filter)
+    rows = query.all()
+    if not rows:
+        return []
+    ids, lats, lons = (np.asarray(col) for col in zip(*rows))
+    dists = spatial.haversine_km_vec(latitude, longitude, lats.astype(float), lons.astype(float))
+    order = np.argsort(dists, kind="stable")[:k]
+    return [(int(ids[i]), float(dists[i])) for i in order if dists[i] <= radius_km]
+
+def count_available_tankers(db: Session) -> int:
+    return db.query(func.count(models.Tanker.id)).filter(models.Tanker.is_available == True).scalar()
+
+def _nearest_candidates(db: Session, latitude: float, longitude: float, radius_km: float, k: int):
+    if settings.tanker_index_enabled:
+        index = spatial.get_tanker_index(db)
+        ids, dists = index.nearest(latitude, longitude, k=k, radius_km=radius_km)
+        return [(int(t), float(d)) for t, d in zip(ids, dists)]
+    return find_nearby_tankers(db, latitude, longitude, radius_km, k=k)
+
+def _tankers_changed(db: Session, tanker_ids, available: bool, village_ids, event: str):
+    """Fold committed claims or releases into the shared counters, in a transaction of their own.
+
+    The district/state summaries and the data version are single rows every
+    dispatch touches; updated inside the claim they would hold each claim's
+    row lock until commit and serialize all dispatching.
+    """
+    regions.tankers_changed(db, tanker_ids, available, village_ids)
+    cache.bump_version(db)
+    live.queue_event(db, "tankers", {event: list(tanker_ids), "available": count_available_tankers(db)})
+    db.commit()
+
+def claim_tanker(db: Session, tanker_id: int, version: int, village_id: int) -> bool:
+    """Take a tanker for village_id if it is still available and unchanged since `version` was read.
+
+    A single conditional UPDATE, so concurrent claims on one tanker cannot
+    both succeed and claims on different tankers never wait on each other.
+    The caller commits (or rolls back) the claim.
+    """
+    result = db.execute(
+        update(models.Tanker)
+        .where(models.Tanker.id == tanker_id, models.Tanker.is_available == True,
+               models.Tanker.version == version)
+        .values(is_available=False, version=models.Tanker.version + 1, assigned_village_id=village_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
 
 def dispatch_tanker(db: Session, village_id: int, radius_km: float = 500.0):
-    """Find the nearest available tanker within radius_km using the Haversine formula."""
+    """Claim the nearest available tanker within radius_km.
+
+    Candidates come from the tanker index (or SQL), are re-read from the
+    database and claimed optimistically with claim_tanker; a tanker taken
+    by a concurrent dispatch is skipped in favour of the next-nearest one.
+    """
     # Get the requesting village's GPS coordinates
     village = db.query(models.Village).filter(models.Village.id == village_id).first()
     if not village:
         return {"success": False, "message": "Village not found!"}
 
-    # Fetch all available tankers and calculate distances
-    available_tankers = db.query(models.Tanker).filter(models.Tanker.is_available == True).all()
-    
-    nearest_tanker = None
-    nearest_distance = float('inf')
+    tried = set()
+    while True:
+        candidates = [
+            tanker_id for tanker_id, _ in
+            _nearest_candidates(db, village.latitude, village.longitude, radius_km, k=8 + len(tried))
+            if tanker_id not in tried
+        ]
+        if not candidates:
+            break
+        # Positions and versions as committed now, not as the index last saw them
+        rows = db.query(
+            models.Tanker.id, models.Tanker.version, models.Tanker.is_available,
+            models.Tanker.current_latitude, models.Tanker.current_longitude, models.Tanker.license_plate,
+        ).filter(models.Tanker.id.in_(candidates)).all()
+        stale = [r.id for r in rows if not r.is_available]
+        if stale:
+            # Another worker dispatched them; keep the index from offering them again
+            spatial.tanker_index.set_available(stale, False)
+        tried.update(candidates)
 
-    for tanker in available_tankers:
-        if tanker.current_latitude is None or tanker.current_longitude is None:
-            continue
-        dist = haversine_km(
-            village.latitude, village.longitude,
-            tanker.current_latitude, tanker.current_longitude
+        # Tankers without a stored position are skipped, but stay available
+        fresh = [r for r in rows if r.is_available and r.current_latitude is not None]
+        # Latest GPS ping where this worker has one, else the stored position
+        ranked = sorted(
+            (haversine_km(village.latitude, village.longitude,
+                          *positions.store.current(r.id, r.current_latitude, r.current_longitude)), r.id, r)
+            for r in fresh
         )
-        if dist < nearest_distance and dist <= radius_km:
-            nearest_distance = dist
-            nearest_tanker = tanker
-
-    if nearest_tanker:
-        nearest_tanker.is_available = False
-        db.commit()
-        db.refresh(nearest_tanker)
-        return {
-            "success": True,
-            "tanker_license": nearest_tanker.license_plate,
-            "distance_km": round(nearest_distance, 1),
-            "message": f"Nearest tanker {nearest_tanker.license_plate} dispatched from {nearest_distance:.0f} km away!"
-        }
+        for distance, _, tanker in ranked:
+            if distance > radius_km:
+                break
+            if not claim_tanker(db, tanker.id, tanker.version, village.id):
+                continue
+            # The claim commits on its own, so concurrent dispatches only ever wait on their own tanker's row
+            db.commit()
+            spatial.tanker_index.set_available([tanker.id], False)
+            _tankers_changed(db, [tanker.id], False, [village.id], "unavailable")
+            return {
+                "success": True,
+                "tanker_id": tanker.id,
+                "tanker_license": tanker.license_plate,
+                "distance_km": round(distance, 1),
+                "message": f"Nearest tanker {tanker.license_plate} dispatched from {distance:.0f} km away!"
+            }
+        # Every fresh candidate was claimed concurrently; release any lock and look further out
+        db.rollback()
+
     return {"success": False, "message": f"No tankers available within {radius_km:.0f} km of {village.name}! Consider requesting inter-district support."}
+
+def release_tanker(db: Session, tanker_id: int, latitude: float, longitude: float):
+    """Return a dispatched tanker to service at its new position.
+
+    Returns the tanker, or None if it does not exist or is not currently dispatched.
+    """
+    while True:
+        current = db.query(models.Tanker.is_available, models.Tanker.assigned_village_id).filter(
+            models.Tanker.id == tanker_id).first()
+        if current is None or current.is_available:
+            db.rollback()
+            return None
+        village_id = current.assigned_village_id
+        # Matching the assignment just read means the release credits the village it actually ends
+        result = db.execute(
+            update(models.Tanker)
+            .where(models.Tanker.id == tanker_id, models.Tanker.is_available == False,
+                   models.Tanker.assigned_village_id == village_id)
+            .values(is_available=True, version=models.Tanker.version + 1, assigned_village_id=None,
+                    current_latitude=latitude, current_longitude=longitude)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            break
+        # Released, or released and re-dispatched, since the read; read again
+        db.rollback()
+    db.commit()
+    _tankers_changed(db, [tanker_id], True, [village_id], "released")
+    if spatial.tanker_index.loaded:
+        spatial.tanker_index.upsert(tanker_id, latitude, longitude, True)
+    if positions.store.loaded:
+        positions.store.record(tanker_id, latitude, longitude)
+    return db.get(models.Tanker, tanker_id, populate_existing=True)
@@ -1,10 +1,14 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, declarative_base
+from backend import metrics
 from backend.config import settings
 
 engine = create_engine(
     settings.database_url, connect_args={"check_same_thread": False}
 )
+if settings.metrics_enabled:
+    metrics.instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -15,3 +19,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def bulk_insert(db, table, columns, rows, statement=None):
+    """executemany an INSERT of row tuples directly on the DBAPI cursor.
+
+    Skips SQLAlchemy's per-row parameter handling, which dominates the cost of
+    large inserts; column bind processors (e.g. SQLite's DateTime-to-string)
+    are still applied so stored values match ORM-written rows. `statement`
+    replaces the plain INSERT, e.g. with an upsert() .. on_conflict_do_update.
+    """
+    if not rows:
+        return
+    conn = db.connection()
+    dialect = conn.dialect
+    columns = list(columns)
+    # Scalar Python-side defaults (e.g. Tanker.version) are otherwise left unbound
+    defaults = [c for c in table.c if c.key not in columns and c.default is not None and c.default.is_scalar]
+    if defaults:
+        columns += [c.key for c in defaults]
+        extra = tuple(c.default.arg for c in defaults)
+        rows = [tuple(row) + extra for row in rows]
+    compiled = (table.insert() if statement is None else statement).compile(dialect=dialect, column_keys=columns)
+    processors = [table.c[c].type.dialect_impl(dialect).bind_processor(dialect) for c in columns]
+    if any(processors):
+        cols = list(zip(*rows))
+        for i, process in enumerate(processors):
+            if process:
+                # Bulk rows repeat values heavily (e.g. one ingest timestamp), so memoize
+                seen = {}
+                cols[i] = [seen[v] if v in seen else seen.setdefault(v, process(v)) for v in cols[i]]
+        rows = list(zip(*cols))
+    if compiled.positional:
+        order = [columns.index(key) for key in compiled.positiontup]
+        if order != list(range(len(columns))):
+            rows = [tuple(row[i] for i in order) for row in rows]
+        params = rows
+    else:
+        params = [dict(zip(columns, row)) for row in rows]
+    conn.exec_driver_sql(compiled.string, params)
+
+def upsert(db, table):
+    """Dialect-specific INSERT that supports ON CONFLICT (SQLite and PostgreSQL)."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
@@ -0,0 +1,54 @@
+"""Offline stand-in for the Open-Meteo archive API.
+
+Serves deterministic synthetic daily precipitation for any coordinates and
+date window, so the rainfall client can be exercised without network access:
+
+    transport = httpx.ASGITransport(app=fake_archive.app)
+    openmeteo.set_rainfall_client(openmeteo.RainfallClient(
+        base_url="http://fake-archive/v1/archive", transport=transport))
+
+or run it as a local server and point OPEN_METEO_ARCHIVE_URL at it:
+
+    uvicorn backend.fake_archive:app --port 8001
+"""
+import math
+import zlib
+from datetime import date, timedelta
+
+from fastapi import FastAPI, HTTPException
+
+app = FastAPI(title="Fake Open-Meteo archive")
+
+# Requests served, for asserting on caching and coalescing
+request_count = 0
+
+
+def synthetic_precipitation(latitude: float, longitude: float, day: date) -> float:
+    """Monsoon-shaped rainfall (mm) that depends only on the location and day."""
+    seed = zlib.crc32(f"{latitude:.2f},{longitude:.2f},{day.isoformat()}".encode())
+    noise = (seed % 1000) / 1000
+    # Peaks in July, near zero in the dry season
+    season = max(0.0, math.sin((day.timetuple().tm_yday - 150) / 365 * 2 * math.pi))
+    if noise < 0.4:
+        return 0.0
+    return round(season * 30 * noise + noise, 1)
+
+
+@app.get("/v1/archive")
+def archive(latitude: float, longitude: float, start_date: date, end_date: date,
+            daily: str = "precipitation_sum", timezone: str = "auto"):
+    global request_count
+    request_count += 1
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": timezone,
+        "daily_units": {"time": "iso8601", "precipitation_sum": "mm"},
+        "daily": {
+            "time": [d.isoformat() for d in days],
+            "precipitation_sum": [synthetic_precipitation(latitude, longitude, d) for d in days],
+        },
+    }
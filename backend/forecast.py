@@ -0,0 +1,178 @@
+"""30-day stress forecasts for every village.
+
+Each village's recent stress history is fitted with an ordinary least-squares
+trend line. All villages are fitted at once: readings are grouped by village
+and the normal equations are solved from per-group sums (np.bincount), so the
+cost is a handful of array passes regardless of the number of villages.
+
+Runs are incremental: only villages with readings newer than the previous
+run's watermark are refitted. The watermark is a water_data id, valid only
+within the history generation it was taken in (see
+cache.bump_history_generation), since a reseed lets ids be reused.
+
+    python -m backend.forecast          # refit villages with new readings
+    python -m backend.forecast --full   # refit everything
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from backend import cache, live, models
+
+HORIZON_DAYS = 30
+# Only readings this recent (relative to the latest reading overall) shape the trend
+HISTORY_DAYS = 180
+# Above this many villages one table scan beats chunked IN (...) lookups
+FULL_SCAN_VILLAGES = 5000
+VILLAGE_CHUNK = 900
+
+
+def fit_trends(village_ids: np.ndarray, days: np.ndarray, stress: np.ndarray, horizon_days: float = HORIZON_DAYS):
+    """Batched OLS per village.
+
+    Takes parallel arrays of readings (days = age in days, any origin) and
+    returns (villages, predictions) with each village's fitted stress
+    horizon_days after its own latest reading, clipped to 0..10. Villages
+    with a single reading (or all readings on one day) keep their last value.
+    """
+    villages, group = np.unique(village_ids, return_inverse=True)
+    n_groups = len(villages)
+    count = np.bincount(group, minlength=n_groups).astype(float)
+
+    # Centre time on each village's latest reading so the intercept is "now"
+    last_day = np.full(n_groups, -np.inf)
+    np.maximum.at(last_day, group, days)
+    x = days - last_day[group]
+
+    sx = np.bincount(group, x, n_groups)
+    sy = np.bincount(group, stress, n_groups)
+    sxx = np.bincount(group, x * x, n_groups)
+    sxy = np.bincount(group, x * stress, n_groups)
+    denom = count * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denom > 1e-9, (count * sxy - sx * sy) / denom, 0.0)
+    intercept = (sy - slope * sx) / count
+
+    # Flat villages fall back to their latest reading rather than the mean
+    order = np.lexsort((x, group))
+    sorted_group = group[order]
+    is_last = np.r_[sorted_group[1:] != sorted_group[:-1], True]
+    latest = np.zeros(n_groups)
+    latest[sorted_group[is_last]] = stress[order][is_last]
+    intercept = np.where(denom > 1e-9, intercept, latest)
+
+    predictions = np.clip(np.round(intercept + slope * horizon_days, 2), 0.0, 10.0)
+    return villages, predictions
+
+
+def _load_history(db: Session, village_ids, since):
+    """Return (ids, village_ids, record_dates, stress) arrays for readings after `since`."""
+    columns = (models.WaterData.id, models.WaterData.village_id,
+               models.WaterData.record_date, models.WaterData.stress_index)
+    base = db.query(*columns).filter(
+        models.WaterData.record_date >= since, models.WaterData.stress_index.isnot(None)
+    )
+    if village_ids is None or len(village_ids) > FULL_SCAN_VILLAGES:
+        rows = base.all()
+        if village_ids is not None:
+            wanted = set(village_ids)
+            rows = [r for r in rows if r[1] in wanted]
+    else:
+        village_ids = list(village_ids)
+        rows = []
+        for start in range(0, len(village_ids), VILLAGE_CHUNK):
+            rows.extend(base.filter(models.WaterData.village_id.in_(village_ids[start:start + VILLAGE_CHUNK])).all())
+    if not rows:
+        return None
+    ids, vids, dates, stress = zip(*rows)
+    epoch = since
+    days = np.fromiter(((d - epoch).total_seconds() / 86400 for d in dates), dtype=float, count=len(dates))
+    return np.array(ids), np.array(vids), days, np.array(stress, dtype=float)
+
+
+def run_forecast(db: Session, full: bool = False):
+    """Refit villages with new readings and store their predictions. Returns a summary dict."""
+    started = time.perf_counter()
+    watermark = db.query(func.max(models.WaterData.id)).scalar() or 0
+    generation = cache.current_history_generation(db)
+    last_run = db.query(models.ForecastRun).order_by(models.ForecastRun.id.desc()).first()
+    # A watermark from before a reseed may point past reused ids, so it only counts within its generation
+    stale = last_run is None or last_run.history_generation != generation
+    previous = 0 if full or stale else last_run.last_water_data_id
+
+    if previous >= watermark:
+        return {"villages_refit": 0, "watermark": watermark, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+    if previous == 0:
+        changed = None  # every village
+    else:
+        changed = [v for (v,) in db.query(models.WaterData.village_id).filter(
+            models.WaterData.id > previous, models.WaterData.id <= watermark
+        ).distinct()]
+
+    latest_date = db.query(func.max(models.WaterData.record_date)).scalar()
+    since = latest_date - datetime.timedelta(days=HISTORY_DAYS)
+    history = _load_history(db, changed, since)
+
+    refit = 0
+    if history is not None:
+        ids, vids, days, stress = history
+        villages, predictions = fit_trends(vids, days, stress)
+
+        # The forecast is stored on each village's latest reading
+        order = np.lexsort((ids, days, vids))
+        last_of_group = np.r_[vids[order][1:] != vids[order][:-1], True]
+        latest_ids = ids[order][last_of_group]
+
+        water_data = models.WaterData.__table__
+        status = models.VillageStatus.__table__
+        db.execute(
+            update(water_data).where(water_data.c.id == bindparam("b_id"))
+            .values(predicted_stress_index=bindparam("b_pred")),
+            [{"b_id": int(i), "b_pred": float(p)} for i, p in zip(latest_ids, predictions)],
+        )
+        db.execute(
+            update(status).where(status.c.village_id == bindparam("b_village"))
+            .values(predicted_stress_index=bindparam("b_pred")),
+            [{"b_village": int(v), "b_pred": float(p)} for v, p in zip(villages, predictions)],
+        )
+        refit = len(villages)
+        cache.bump_version(db)
+        live.queue_event(db, "forecast", {"villages_refit": refit})
+
+    db.add(models.ForecastRun(last_water_data_id=watermark, history_generation=generation, villages_refit=refit))
+    db.commit()
+    return {"villages_refit": refit, "watermark": watermark, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+def holt_forecast(series, horizon: int, alpha: float = 0.5, beta: float = 0.3):
+    """Holt's linear exponential smoothing; returns `horizon` non-negative forecasts."""
+    values = [v for v in series if v is not None]
+    if not values:
+        return [0.0] * horizon
+    level, trend = values[0], (values[1] - values[0]) if len(values) > 1 else 0.0
+    for v in values[1:]:
+        prev_level = level
+        level = alpha * v + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev_level) + (1 - beta) * trend
+    return [max(0.0, level + h * trend) for h in range(1, horizon + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refit 30-day stress forecasts.")
+    parser.add_argument("--full", action="store_true", help="Refit every village, ignoring the watermark")
+    args = parser.parse_args()
+
+    from backend.database import SessionLocal, engine
+    models.create_schema(engine)
+    with SessionLocal() as db:
+        result = run_forecast(db, full=args.full)
+    print(f"Refit {result['villages_refit']} villages up to reading {result['watermark']} in {result['elapsed_s']} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Bulk ingestion of water readings from sensor gateways.
+
+Readings arrive as NDJSON (one object per line) or CSV with a header row,
+using the WaterDataCreate fields plus an optional ISO-8601 record_date
+(stored as naive UTC; timestamps with an offset are converted).
+The body is parsed as it streams in; every CHUNK_SIZE valid rows are
+scored with the vectorized stress formula and written in one transaction.
+What derives from the readings (village_status and its district counts,
+rollups, the live "readings" event and the data version) is brought up to
+date once per UPKEEP_ROWS written rows and at the end of the batch, in the
+transaction of the chunk that triggers it, rather than once per chunk. If a
+process dies in between, `python -m backend.rollups backfill` and
+crud.rebuild_village_status catch the derived tables up.
+"""
+import csv
+import datetime
+import json
+import math
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend import cache, crud, database, models, rollups
+
+CHUNK_SIZE = 20000
+# Written rows folded into the derived tables at a time; bounds the rows held for it
+UPKEEP_ROWS = 200000
+# Per-row errors reported back to the caller; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+FIELDS = ("village_id", "rainfall_deviation_mm", "groundwater_level_m", "record_date")
+
+
+def parse_record_date(value: str) -> datetime.datetime:
+    """ISO-8601 timestamp as naive UTC, the way record_date is stored; offsets are converted, not dropped."""
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class IngestFormatError(Exception):
+    """The batch as a whole is unreadable (e.g. a CSV header without the required columns)."""
+
+
+class BulkIngestor:
+    """Accumulates parsed rows and writes them to the database chunk by chunk."""
+
+    def __init__(self, db: Session, fmt: str, chunk_size: int = CHUNK_SIZE):
+        if fmt not in ("ndjson", "csv"):
+            raise ValueError(f"Unsupported format {fmt!r}")
+        self.db = db
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        # Populations double as the set of valid village IDs
+        self.population = dict(db.query(models.Village.id, models.Village.population).all())
+        self.columns = None  # CSV header -> positions
+        self.line_no = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+        self._pending = []  # (village_id, rainfall, groundwater, record_date)
+        self._written = []  # (village_ids, dates, stress, rainfall, groundwater) per chunk awaiting upkeep
+        self._written_rows = 0
+
+    def feed_lines(self, lines):
+        """Parse complete lines; returns True once a chunk is ready to flush."""
+        if self.fmt == "ndjson" and self._feed_ndjson_fast(lines):
+            return len(self._pending) >= self.chunk_size
+        if self.fmt == "csv":
+            records, parse = csv.reader(lines), self._parse_csv
+        else:
+            records, parse = lines, self._parse_ndjson
+        for record in records:
+            self.line_no += 1
+            if not record or (self.fmt == "ndjson" and not record.strip()):
+                continue
+            try:
+                row = parse(record)
+            except (ValueError, KeyError, TypeError, IndexError) as exc:
+                self._error(str(exc) or type(exc).__name__)
+                continue
+            if row is None:
+                continue
+            if row[0] not in self.population:
+                self._error(f"Unknown village_id {row[0]}")
+                continue
+            self._pending.append(row)
+        return len(self._pending) >= self.chunk_size
+
+    def flush(self, final: bool = False):
+        """Write all pending rows in one transaction, with the derived upkeep once enough rows await it (or final)."""
+        if not self._pending and not (final and self._written):
+            return
+        rows, self._pending = self._pending, []
+        try:
+            if rows:
+                now = datetime.datetime.utcnow()
+                village_ids, rainfall, groundwater, dates = zip(*rows)
+                stress = crud.calculate_stress_index_array(
+                    np.array(rainfall, dtype=float), np.array(groundwater, dtype=float)
+                ).tolist()
+                dates = [d or now for d in dates]
+                database.bulk_insert(
+                    self.db, models.WaterData.__table__,
+                    ("village_id", "record_date", "rainfall_deviation_mm", "groundwater_level_m", "stress_index"),
+                    list(zip(village_ids, dates, rainfall, groundwater, stress)),
+                )
+                self._written.append((village_ids, dates, stress, rainfall, groundwater))
+                self._written_rows += len(rows)
+            if final or self._written_rows >= UPKEEP_ROWS:
+                self._upkeep()
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self.accepted += len(rows)
+        if final or self._written_rows >= UPKEEP_ROWS:
+            self._written, self._written_rows = [], 0
+
+    def finish(self):
+        """Write the remaining rows and bring everything derived from the batch up to date."""
+        self.flush(final=True)
+
+    def catch_up(self):
+        """After an error: bring the derived tables up to date with the rows already written, dropping the rest."""
+        self._pending = []
+        self.flush(final=True)
+
+    def _upkeep(self):
+        """Fold the written rows into village_status, rollups and the data version (caller commits)."""
+        village_ids, dates, stress, rainfall, groundwater = (
+            [value for chunk in self._written for value in chunk[i]] for i in range(5)
+        )
+        # Only each village's newest reading can move its status
+        if all(a <= b for a, b in zip(dates, dates[1:])):
+            # Time-ordered batches (the usual case): last occurrence wins
+            latest = {v: i for i, v in enumerate(village_ids)}
+        else:
+            latest = {}
+            for i, (v, d) in enumerate(zip(village_ids, dates)):
+                if v not in latest or d >= dates[latest[v]]:
+                    latest[v] = i
+        crud._upsert_village_status(self.db, [
+            {
+                "village_id": v,
+                "record_date": dates[i],
+                "stress_index": stress[i],
+                "predicted_stress_index": None,
+                "priority_score": crud.triage_score(stress[i], self.population[v]),
+                "rainfall_deviation_mm": rainfall[i],
+                "groundwater_level_m": groundwater[i],
+            }
+            for v, i in latest.items()
+        ])
+        rollups.add_readings(self.db, village_ids, dates, stress, rainfall, groundwater)
+        cache.bump_version(self.db)
+
+    def report(self):
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "errors_truncated": self.rejected > len(self.errors),
+        }
+
+    # --- parsing ---
+
+    def _error(self, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": self.line_no, "error": message})
+
+    def _feed_ndjson_fast(self, lines):
+        """Decode a whole batch of well-formed lines with one json.loads call.
+
+        Returns False (having consumed nothing) if any line needs per-row
+        error reporting, so the caller falls back to line-by-line parsing.
+        """
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return False
+        try:
+            objs = json.loads("[" + ",".join(lines) + "]")
+            village_ids = [o["village_id"] for o in objs]
+            rainfall = [o["rainfall_deviation_mm"] for o in objs]
+            groundwater = [o["groundwater_level_m"] for o in objs]
+            dates = [o.get("record_date") for o in objs]
+            dates = [None if d is None else parse_record_date(d) for d in dates]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        if len(objs) != len(lines):  # a line held more than one value
+            return False
+        population = self.population
+        if (
+            not all(type(v) is int and v in population for v in village_ids)
+            or not all(type(r) in (int, float) for r in rainfall)
+            or not all(type(g) in (int, float) for g in groundwater)
+        ):
+            return False
+        # NaN and out-of-range values such as 1e400 (inf) go through per-row reporting
+        try:
+            finite = np.isfinite(np.array(rainfall, dtype=float)).all() and np.isfinite(np.array(groundwater, dtype=float)).all()
+        except OverflowError:  # integers too large for a float
+            return False
+        if not finite:
+            return False
+        self.line_no += len(lines)
+        self._pending.extend(zip(village_ids, map(float, rainfall), map(float, groundwater), dates))
+        return True
+
+    def _parse_ndjson(self, line):
+        obj = json.loads(line)
+        if not isinstance(obj, dict):
+            raise ValueError("Expected a JSON object")
+        return self._coerce(obj["village_id"], obj["rainfall_deviation_mm"], obj["groundwater_level_m"], obj.get("record_date"))
+
+    def _parse_csv(self, values):
+        if self.columns is None:
+            header = [v.strip() for v in values]
+            missing = [f for f in FIELDS[:3] if f not in header]
+            if missing:
+                raise IngestFormatError(f"CSV header is missing {', '.join(missing)}")
+            self.columns = [header.index(f) if f in header else None for f in FIELDS]
+            return None
+        village, rain, ground, when = (values[i] if i is not None else None for i in self.columns)
+        return self._coerce(village, rain, ground, when or None)
+
+    @staticmethod
+    def _coerce(village_id, rainfall, groundwater, record_date):
+        if isinstance(village_id, bool) or isinstance(rainfall, bool) or isinstance(groundwater, bool):
+            raise ValueError("Numeric fields must not be booleans")
+        if isinstance(village_id, float) and not village_id.is_integer():
+            raise ValueError(f"Invalid village_id {village_id}")
+        try:
+            rainfall, groundwater = float(rainfall), float(groundwater)
+        except OverflowError:
+            raise ValueError("Numeric fields must be finite")
+        if not (math.isfinite(rainfall) and math.isfinite(groundwater)):
+            raise ValueError("Numeric fields must be finite")
+        if record_date is not None:
+            record_date = parse_record_date(record_date)
+        return int(village_id), rainfall, groundwater, record_date
+
+
+def split_lines(buffer: bytes, final: bool = False):
+    """Split a streamed buffer into complete decoded lines and the unfinished remainder."""
+    if final:
+        return buffer.decode("utf-8").splitlines(), b""
+    head, sep, tail = buffer.rpartition(b"\n")
+    if not sep:
+        return [], buffer
+    return head.decode("utf-8").split("\n"), tail
@@ -1,5 +1,7 @@
-from backend import models, database
+from backend import models, database, crud, migrate
 
 # Create tables for SQLite specifically
-models.Base.metadata.create_all(bind=database.engine)
+migrate.migrate(database.engine)
+with database.SessionLocal() as db:
+    crud.rebuild_village_status(db)
 print("SQLite Database initialized successfully.")
@@ -0,0 +1,37 @@
+"""Deferred module imports for a fast cold start.
+
+main.py reaches most backend modules through LazyModule stand-ins, so
+importing the app (e.g. a serverless cold start) skips NumPy and the
+planning code until a request first touches them.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r} ({'loaded' if self._module is not None else 'not loaded'})>"
+
+
+def module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_loaded(lazy_module: LazyModule) -> bool:
+    return lazy_module._module is not None
@@ -0,0 +1,199 @@
+"""Server-Sent Events fan-out of committed changes.
+
+Write paths queue events on their session (queue_event); they are published
+only once the transaction commits. The broker keeps a bounded history of
+recent events so reconnecting clients resume from their Last-Event-ID, and
+gives every subscriber a bounded queue: a subscriber that falls behind has
+its queue dropped and catches up from the history instead (or is told to
+reload if the history has moved past it), so slow clients never hold
+memory or block publishers.
+
+Event types:
+    readings  {"villages": [{village_id, stress_index, priority_score, record_date, band}],
+               "bands": [{village_id, from, to}]}
+    tankers   {"unavailable" | "released": [tanker ids], "available": count}
+    villages  {"created": [{id, name, district, population, latitude, longitude}]}
+    forecast  {"villages_refit": count}
+    positions {"moved": [{id, lat, lng}]}
+    reset     {} or {"tankers": true} when the fleet was replaced too -- state changed
+              wholesale (seeding, rebuilds, lost history); reload
+
+Pub/sub is per process: with several workers, each streams the writes it
+handled itself.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+
+# (lower bound, name), highest first; matches the dashboard's colour bands
+STRESS_BANDS = ((8.0, "critical"), (5.0, "warning"), (float("-inf"), "normal"))
+HEARTBEAT_S = 15.0
+
+
+def stress_band(stress) -> str:
+    for lower, name in STRESS_BANDS:
+        if (stress or 0.0) >= lower:
+            return name
+    return STRESS_BANDS[-1][1]
+
+
+class _Subscriber:
+    __slots__ = ("pending", "wakeup", "overflowed")
+
+    def __init__(self):
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+
+class Broker:
+    def __init__(self, history_bytes: int = None, queue_size: int = None):
+        self.history_bytes = settings.live_history_max_bytes if history_bytes is None else history_bytes
+        self.queue_size = settings.live_queue_size if queue_size is None else queue_size
+        # Event ids are "<epoch>-<seq>" so ids from before a restart are recognised as stale
+        self.epoch = str(int(time.time() * 1000))
+        self._seq = 0
+        self._history = deque()  # (seq, frame bytes)
+        self._history_size = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data):
+        """Publish an event; safe to call from any thread."""
+        payload = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            frame = f"id: {self.epoch}-{seq}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+            self._history.append((seq, frame))
+            self._history_size += len(frame)
+            while self._history_size > self.history_bytes and len(self._history) > 1:
+                self._history_size -= len(self._history.popleft()[1])
+            # Scheduled under the lock so deliveries run in sequence order
+            if self._loop is not None and self._subscribers:
+                self._loop.call_soon_threadsafe(self._deliver, seq, frame)
+
+    def _deliver(self, seq, frame):
+        for sub in self._subscribers:
+            if sub.overflowed:
+                continue
+            if len(sub.pending) >= self.queue_size:
+                # Drop the backlog; the stream resumes from the history
+                sub.pending.clear()
+                sub.overflowed = True
+            else:
+                sub.pending.append((seq, frame))
+            sub.wakeup.set()
+
+    def _replay(self, after_seq):
+        """Frames newer than after_seq, or None if the history no longer reaches back that far."""
+        with self._lock:
+            if self._history and self._history[0][0] > after_seq + 1:
+                return None
+            if not self._history and self._seq > after_seq:
+                return None
+            return [(seq, frame) for seq, frame in self._history if seq > after_seq]
+
+    def _parse_event_id(self, last_event_id):
+        """Sequence number to resume after, or None if the id is from another process lifetime."""
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _reset_frame(self):
+        with self._lock:
+            seq = self._seq
+        return seq, f"id: {self.epoch}-{seq}\nevent: reset\ndata: {{}}\n\n".encode()
+
+    async def stream(self, last_event_id: str = None):
+        """Yield SSE frames for one subscriber until the client disconnects."""
+        self._loop = asyncio.get_running_loop()
+        sub = _Subscriber()
+        self._subscribers.add(sub)
+        try:
+            position = self._parse_event_id(last_event_id) if last_event_id else None
+            if position is None:
+                with self._lock:
+                    current = self._seq
+                # An id from before a restart: the client's state is unknown
+                backlog = None if last_event_id else []
+                position = current
+            else:
+                backlog = self._replay(position)
+            yield b"retry: 3000\n: connected\n\n"
+
+            while True:
+                if backlog is None:
+                    position, frame = self._reset_frame()
+                    yield frame
+                    backlog = []
+                for seq, frame in backlog:
+                    # Replayed and queued frames can overlap; ids only move forward
+                    if seq > position:
+                        position = seq
+                        yield frame
+                if sub.overflowed:
+                    sub.overflowed = False
+                    sub.pending.clear()
+                    backlog = self._replay(position)
+                    continue
+                if sub.pending:
+                    backlog = list(sub.pending)
+                    sub.pending.clear()
+                    continue
+                backlog = []
+                sub.wakeup.clear()
+                try:
+                    await asyncio.wait_for(sub.wakeup.wait(), HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+        finally:
+            self._subscribers.discard(sub)
+
+
+broker = Broker()
+
+
+# --- Publish events once their transaction commits ---
+
+_PENDING_KEY = "live_events"
+
+
+# In-process consumers of committed events, called as fn(event_type, data)
+_listeners = []
+
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+
+def queue_event(db: Session, event_type: str, data):
+    """Publish (event_type, data) after db's current transaction commits."""
+    db.info.setdefault(_PENDING_KEY, []).append((event_type, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    for event_type, data in session.info.pop(_PENDING_KEY, ()):
+        for listener in _listeners:
+            listener(event_type, data)
+        broker.publish(event_type, data)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_events(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
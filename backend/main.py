@@ -1,17 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import FastAPI, BackgroundTasks, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import ValidationError
+
+from backend import lazy, metrics, migrate, models, schemas
+from backend.config import settings
+from backend.database import engine, get_db, SessionLocal
 
-from backend import models, schemas, crud
-from backend.database import engine, get_db
+# Imported on first use, so a cold start only pays for what its first request needs
+(crud, assignment, cache, clusters, forecast, ingest, live, openmeteo, positions, rainfall, regions, rollups,
+ routing, serialize, spatial, stress) = (
+    lazy.module(f"backend.{name}") for name in (
+        "crud", "assignment", "cache", "clusters", "forecast", "ingest", "live", "openmeteo", "positions",
+        "rainfall", "regions", "rollups", "routing", "serialize", "spatial", "stress",
+    )
+)
 
-# Create all tables in the database
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One query when the schema is current; run `python -m backend.migrate` at
+    # release time and set SCHEMA_CHECK_ON_STARTUP=false to skip even that
+    if settings.schema_check_on_startup:
+        await run_in_threadpool(migrate.ensure_schema, engine)
+    yield
+    if lazy.is_loaded(openmeteo):
+        await openmeteo.close_rainfall_client()
+    if lazy.is_loaded(positions):
+        # Write back pings still held in memory
+        await run_in_threadpool(positions.stop_flusher, SessionLocal)
 
 app = FastAPI(
     title="Integrated Drought Warning & Smart Tanker Management System API",
     description="API for managing drought warnings and optimizing water tanker allocations.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -27,7 +57,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+if settings.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware, router=app.router)
 
 @app.get("/")
 def read_root():
@@ -37,14 +70,94 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus text-format request, SQL, upstream and cache metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profiles")
+def read_slow_profiles():
+    """Sampled stacks of recent slow requests (needs METRICS_PROFILE_SAMPLE_RATE > 0)."""
+    return metrics.slow_profiles()
+
 @app.post("/villages/", response_model=schemas.VillageResponse)
 def create_village(village: schemas.VillageCreate, db: Session = Depends(get_db)):
     return crud.create_village(db=db, village=village)
 
-@app.get("/villages/", response_model=list[schemas.VillageResponse])
-def read_villages(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    villages = crud.get_villages(db, skip=skip, limit=limit)
-    return villages
+# Streamed, so the body is described here rather than validated through a response_model
+# (media types spelled out: reading serialize.MEDIA_TYPES would import NumPy at startup)
+VILLAGE_LIST_RESPONSES = {200: {
+    "description": "Villages as a JSON array, or one JSON object per line with format=ndjson",
+    "model": list[schemas.VillageResponse],
+    "content": {"application/x-ndjson": {"schema": {"$ref": "#/components/schemas/VillageResponse"}}},
+    "headers": {"X-Next-Cursor": {
+        "description": "Pass as `after` for the next page; absent on the last page",
+        "schema": {"type": "integer"},
+    }},
+}}
+
+@app.get("/villages/", responses=VILLAGE_LIST_RESPONSES)
+def read_villages(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1),
+    after: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    """Lists villages in id order, streamed as a JSON array or NDJSON.
+
+    Page with `after`, the last id of the previous page (sent in the
+    X-Next-Cursor header while more remain); `skip` still works but slows
+    down the deeper it goes. Rows are streamed as they are read, so a limit
+    covering every village exports them all in constant memory.
+    """
+    headers = {}
+    cursor = crud.next_village_cursor(db, skip=skip, limit=limit, after=after)
+    if cursor is not None:
+        headers["X-Next-Cursor"] = str(cursor)
+
+    def batches():
+        # The request's session may be closed before the body is sent
+        with SessionLocal() as stream_db:
+            rows = crud.get_villages(stream_db, skip=skip, limit=limit, after=after, batch_size=serialize.STREAM_BATCH)
+            for partition in rows.partitions():
+                yield [
+                    {"name": name, "district": district, "population": population,
+                     "latitude": latitude, "longitude": longitude, "id": village_id}
+                    for village_id, name, district, population, latitude, longitude in partition
+                ]
+
+    return StreamingResponse(serialize.stream_list(batches(), format), media_type=serialize.MEDIA_TYPES[format],
+                             headers=headers)
+
+@app.get("/villages/{village_id}/history")
+def read_village_history(
+    village_id: int,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """Per-bucket min/max/mean/last of stress, rainfall deviation and groundwater level.
+
+    Served from precomputed rollups; `start` and `end` filter on bucket start dates.
+    """
+    if db.query(models.Village.id).filter(models.Village.id == village_id).first() is None:
+        raise HTTPException(status_code=404, detail="Village not found")
+    buckets = rollups.get_history(db, village_id, granularity, start, end)
+
+    history = []
+    for bucket in buckets:
+        entry = {"bucket_start": bucket.bucket_start.date(), "count": bucket.count}
+        for metric in rollups.METRICS:
+            entry[metric] = {
+                "min": getattr(bucket, f"{metric}_min"),
+                "max": getattr(bucket, f"{metric}_max"),
+                "mean": round(getattr(bucket, f"{metric}_sum") / bucket.count, 3),
+                "last": getattr(bucket, f"{metric}_last"),
+            }
+        history.append(entry)
+    return {"village_id": village_id, "granularity": granularity, "buckets": history}
 
 @app.post("/water-data/", response_model=schemas.WaterDataResponse)
 def create_water_data(data: schemas.WaterDataCreate, db: Session = Depends(get_db)):
@@ -54,62 +167,209 @@ def create_water_data(data: schemas.WaterDataCreate, db: Session = Depends(get_d
         raise HTTPException(status_code=404, detail="Village not found")
     return crud.add_water_data(db=db, data=data)
 
+@app.post("/water-data/bulk")
+async def bulk_create_water_data(request: Request, format: Optional[str] = None, db: Session = Depends(get_db)):
+    """Ingests a streamed NDJSON or CSV batch of readings and reports rejected rows.
+
+    The format is taken from `format` (ndjson|csv) or the Content-Type header.
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    try:
+        ingestor = await run_in_threadpool(ingest.BulkIngestor, db, fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    buffer = b""
+    try:
+        async for chunk in request.stream():
+            lines, buffer = ingest.split_lines(buffer + chunk)
+            if lines and await run_in_threadpool(ingestor.feed_lines, lines):
+                await run_in_threadpool(ingestor.flush)
+        lines, _ = ingest.split_lines(buffer, final=True)
+        await run_in_threadpool(ingestor.feed_lines, lines)
+    except UnicodeDecodeError:
+        # Chunks already written still need their derived upkeep
+        await run_in_threadpool(ingestor.catch_up)
+        raise HTTPException(status_code=400, detail="Body must be UTF-8 encoded")
+    except ingest.IngestFormatError as exc:
+        await run_in_threadpool(ingestor.catch_up)
+        raise HTTPException(status_code=400, detail=str(exc))
+    await run_in_threadpool(ingestor.finish)
+    return ingestor.report()
+
 @app.get("/crisis-dashboard/")
-def get_crisis_dashboard(threshold: float = 6.0, db: Session = Depends(get_db)):
-    """Returns a list of highly stressed villages prioritizing tanker allocation."""
-    results = crud.get_stressed_villages(db, threshold=threshold)
-    
-    dashboard_data = []
-    for village, w_data in results:
-        # Triage Algorithm: Priority = Stress Index * Population scale factor
-        triage_score = min(100.0, round(w_data.stress_index * (1 + (village.population / 100000)), 2))
-        
-        dashboard_data.append({
-            "village_id": village.id,
-            "village_name": village.name,
-            "district": village.district,
-            "population": village.population,
-            "location": {"lat": village.latitude, "lng": village.longitude},
-            "stress_index": w_data.stress_index,
-            "predicted_stress_index": w_data.predicted_stress_index,
-            "priority_score": triage_score,
-            "last_recorded": w_data.record_date
-        })
-        
-    # Sort strictly by triage priority score rather than basic stress
-    dashboard_data.sort(key=lambda x: x["priority_score"], reverse=True)
-    return dashboard_data
+def get_crisis_dashboard(
+    request: Request,
+    threshold: float = 6.0,
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    bbox: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Returns a list of highly stressed villages prioritizing tanker allocation.
+
+    Sorted by triage priority score. Pass `limit` to page through the list; the
+    cursor for the next page is returned in the X-Next-Cursor header. `bbox`
+    (min_lon,min_lat,max_lon,max_lat) limits the list to a map viewport.
+    Served with an ETag; unchanged polls get 304 Not Modified.
+    """
+    box = _parse_bbox(bbox)
+    after = None
+    if cursor:
+        try:
+            priority, village_id = cursor.split(":")
+            after = (float(priority), int(village_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def build():
+        results = crud.get_stressed_villages(db, threshold=threshold, limit=limit, after=after, bbox=box)
+
+        dashboard_data = [
+            {
+                "village_id": village_id,
+                "village_name": name,
+                "district": district,
+                "population": population,
+                "location": {"lat": latitude, "lng": longitude},
+                "stress_index": stress_index,
+                "predicted_stress_index": predicted,
+                "priority_score": priority,
+                "last_recorded": record_date
+            }
+            for village_id, name, district, population, latitude, longitude, stress_index, predicted, priority, record_date
+            in results
+        ]
+
+        headers = {}
+        if limit is not None and len(results) == limit:
+            last = results[-1]
+            headers["X-Next-Cursor"] = f"{last.priority_score}:{last.village_id}"
+        return dashboard_data, headers
+
+    return cache.cached_json(request, db, build)
+
+def _parse_bbox(bbox: Optional[str]):
+    if bbox is None:
+        return None
+    try:
+        return spatial.parse_bbox(bbox)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox: {exc}")
+
+@app.get("/map/clusters")
+def get_map_clusters(
+    request: Request,
+    zoom: int = Query(..., ge=0, le=22),
+    layer: str = Query("villages", pattern="^(villages|tankers)$"),
+    bbox: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Returns villages or tankers clustered on a grid for the map's zoom level.
+
+    Each cluster has its centroid, point count and aggregates (villages:
+    population, critical/warning counts and max stress; tankers: available
+    count and capacity); single-point clusters carry the point's id. Pass the
+    viewport as `bbox` (min_lon,min_lat,max_lon,max_lat).
+    """
+    box = _parse_bbox(bbox)
+
+    def build():
+        return {"zoom": zoom, "layer": layer, "clusters": clusters.query(db, layer, zoom, box)}, {}
+
+    return cache.cached_json(request, db, build)
+
+@app.get("/live")
+async def live_updates(
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events stream of changes (readings, band changes, tanker availability).
+
+    Reconnecting clients resume from Last-Event-ID (sent automatically by
+    EventSource, or as ?last_event_id=); a "reset" event means reload everything.
+    """
+    return StreamingResponse(
+        live.broker.stream(last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/tankers/available")
-def get_available_tankers(db: Session = Depends(get_db)):
+def get_available_tankers(request: Request, db: Session = Depends(get_db)):
     """Returns the count of currently available water tankers."""
-    count = db.query(models.Tanker).filter(models.Tanker.is_available == True).count()
-    return {"available": count}
+    def build():
+        return {"available": crud.count_available_tankers(db)}, {}
+
+    return cache.cached_json(request, db, build)
 
 @app.get("/tankers/fleet")
-def get_tanker_fleet(db: Session = Depends(get_db)):
-    """Returns all tankers with their availability and state info (derived from license plate)."""
-    state_map = {
-        "MH": "Maharashtra", "MP": "Madhya Pradesh", "RJ": "Rajasthan",
-        "GJ": "Gujarat", "KA": "Karnataka", "UP": "Uttar Pradesh",
-        "DL": "Delhi", "TN": "Tamil Nadu", "AP": "Andhra Pradesh",
-        "TS": "Telangana", "KL": "Kerala", "WB": "West Bengal",
-        "RJ": "Rajasthan", "HR": "Haryana", "PB": "Punjab",
-    }
-    tankers = db.query(models.Tanker).all()
-    fleet = []
-    for t in tankers:
-        prefix = t.license_plate.split("-")[0]
-        state = state_map.get(prefix, prefix)
-        fleet.append({
-            "license_plate": t.license_plate,
-            "state": state,
-            "capacity_liters": t.capacity_liters,
-            "is_available": t.is_available,
-            "lat": t.current_latitude,
-            "lng": t.current_longitude,
-        })
-    return fleet
+def get_tanker_fleet(request: Request, bbox: Optional[str] = None, db: Session = Depends(get_db)):
+    """Returns all tankers with their availability and state info (derived from license plate).
+
+    `bbox` (min_lon,min_lat,max_lon,max_lat) limits the list to a map viewport.
+    """
+    box = _parse_bbox(bbox)
+
+    def build():
+        query = db.query(
+            models.Tanker.id, models.Tanker.license_plate, models.Tanker.capacity_liters, models.Tanker.is_available,
+            models.Tanker.current_latitude, models.Tanker.current_longitude,
+        )
+        if box is not None:
+            query = crud.within_bbox(query, models.Tanker.current_latitude, models.Tanker.current_longitude, box)
+        tankers = query.all()
+        if not tankers:
+            return [], {}
+        ids, plates, capacities, available, lats, lons = zip(*tankers)
+        # GPS pings this worker has not written back yet
+        lats, lons = positions.store.overlay(ids, lats, lons)
+        fleet = [
+            {
+                "license_plate": plate,
+                "state": regions.state_of(plate),
+                "capacity_liters": capacity,
+                "is_available": is_available,
+                "lat": None if lat != lat else lat,
+                "lng": None if lng != lng else lng,
+            }
+            for plate, capacity, is_available, lat, lng in zip(plates, capacities, available, lats.tolist(), lons.tolist())
+        ]
+        return fleet, {}
+
+    return cache.cached_json(request, db, build)
+
+@app.get("/regions/summary")
+def get_region_summary(
+    request: Request,
+    district: Optional[str] = None,
+    state: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Village stress bands and tanker coverage per district, and the tanker fleet per state.
+
+    Read from incrementally maintained summary tables, so the cost does not
+    grow with the number of villages. `district` / `state` select one row.
+    """
+    def build():
+        return regions.summary(db, district=district, state=state), {}
+
+    return cache.cached_json(request, db, build)
+
+@app.post("/tankers/positions")
+def ingest_tanker_positions(pings: List[schemas.TankerPing], db: Session = Depends(get_db)):
+    """Accepts a batch of GPS pings; dispatch uses them at once, the database gets them write-behind."""
+    store = positions.get_store(db)
+    if settings.position_flush_interval_s > 0:
+        positions.start_flusher(SessionLocal)
+    now = time.time()
+    result = store.ingest(
+        db, [p.tanker_id for p in pings], [p.latitude for p in pings], [p.longitude for p in pings],
+        [now if p.recorded_at is None else positions.epoch_seconds(p.recorded_at) for p in pings],
+    )
+    if settings.position_flush_interval_s <= 0:
+        store.flush(db)
+    return result
 
 @app.post("/dispatch-tanker/{village_id}")
 def dispatch_tanker_to_village(village_id: int, db: Session = Depends(get_db)):
@@ -119,46 +379,116 @@ def dispatch_tanker_to_village(village_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=result["message"])
     return result
 
-@app.get("/city-rainfall/{village_id}")
-def get_city_rainfall(village_id: int, db: Session = Depends(get_db)):
-    """Fetches real weekly rainfall data from Open-Meteo for a specific village."""
-    import requests
-    from datetime import date, timedelta
+@app.post("/tankers/{tanker_id}/release", response_model=schemas.TankerResponse)
+def release_tanker(tanker_id: int, position: schemas.TankerRelease, db: Session = Depends(get_db)):
+    """Returns a dispatched tanker to service at its current position."""
+    tanker = crud.release_tanker(db, tanker_id, position.latitude, position.longitude)
+    if tanker is None:
+        if db.get(models.Tanker, tanker_id) is None:
+            raise HTTPException(status_code=404, detail="Tanker not found")
+        raise HTTPException(status_code=409, detail="Tanker is not dispatched")
+    return tanker
+
+@app.post("/dispatch-batch/")
+def dispatch_batch(threshold: float = 7.0, radius_km: float = 500.0, dry_run: bool = False, db: Session = Depends(get_db)):
+    """Optimally assigns the available fleet across every stressed village in one transaction."""
+    try:
+        return assignment.dispatch_batch(db, threshold=threshold, radius_km=radius_km, dry_run=dry_run)
+    except assignment.AssignmentConflict as exc:
+        raise HTTPException(status_code=409, detail=f"{exc}; please retry.")
 
-    village = db.query(models.Village).filter(models.Village.id == village_id).first()
+@app.post("/route-plan/")
+def plan_routes(
+    threshold: float = 7.0,
+    radius_km: float = 500.0,
+    capacity_liters: Optional[float] = Query(None, gt=0),
+    dry_run: bool = True,
+    db: Session = Depends(get_db),
+):
+    """Groups nearby stressed villages into multi-stop tanker trips by demand.
+
+    Returns the plan only; pass dry_run=false to dispatch its tankers.
+    """
+    try:
+        return routing.plan_routes(db, threshold=threshold, radius_km=radius_km,
+                                   capacity_liters=capacity_liters, dry_run=dry_run)
+    except assignment.AssignmentConflict as exc:
+        raise HTTPException(status_code=409, detail=f"{exc}; please retry.")
+
+def _run_forecast_job(full: bool):
+    with SessionLocal() as db:
+        forecast.run_forecast(db, full=full)
+
+@app.post("/forecast/run", status_code=202)
+def run_forecast(background_tasks: BackgroundTasks, full: bool = False):
+    """Refits 30-day stress forecasts in the background (only villages with new readings unless full)."""
+    background_tasks.add_task(_run_forecast_job, full)
+    return {"status": "scheduled", "full": full}
+
+@app.get("/stress/model")
+def get_stress_model(db: Session = Depends(get_db)):
+    """The stress model in use, and whether stored history still needs recomputing with it."""
+    return stress.describe(db)
+
+def _run_stress_recompute_job():
+    with SessionLocal() as db:
+        stress.recompute(db)
+
+@app.post("/stress/recompute", status_code=202)
+def recompute_stress(background_tasks: BackgroundTasks):
+    """Rewrites stress_index across all history with the current model in the background."""
+    background_tasks.add_task(_run_stress_recompute_job)
+    return {"status": "scheduled", "model_version": stress.current_model().version}
+
+@app.post("/stress/what-if")
+def stress_what_if(scenario: schemas.StressScenario, limit: int = Query(20, ge=0, le=500), db: Session = Depends(get_db)):
+    """Shows how band counts and the triage order would change under other weights and thresholds.
+
+    Nothing is written; every village's latest reading is re-scored in memory.
+    """
+    overrides = scenario.model_dump(exclude_unset=True)
+    critical, warning = overrides.pop("critical", None), overrides.pop("warning", None)
+    critical = live.STRESS_BANDS[0][0] if critical is None else critical
+    warning = live.STRESS_BANDS[1][0] if warning is None else warning
+    if warning > critical:
+        raise HTTPException(status_code=400, detail="warning threshold must not exceed critical")
+    # Validate the merged model, so a null on a required weight is rejected rather than copied in
+    try:
+        model = stress.StressModel.model_validate({**stress.current_model().model_dump(), **overrides})
+    except ValidationError as exc:
+        raise HTTPException(status_code=400, detail=exc.errors(include_url=False))
+    return stress.what_if(db, model, critical=critical, warning=warning, limit=limit)
+
+@app.get("/city-rainfall/{village_id}")
+async def get_city_rainfall(village_id: int, db: Session = Depends(get_db)):
+    """Weekly rainfall for a village from the local archive, topped up from Open-Meteo."""
+    village = await run_in_threadpool(
+        lambda: db.query(models.Village).filter(models.Village.id == village_id).first()
+    )
     if not village:
         raise HTTPException(status_code=404, detail="Village not found")
 
     end_date = date.today()
     start_date = end_date - timedelta(days=83)  # 12 weeks
 
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": village.latitude,
-        "longitude": village.longitude,
-        "start_date": start_date.isoformat(),
-        "end_date": end_date.isoformat(),
-        "daily": "precipitation_sum",
-        "timezone": "Asia/Kolkata"
-    }
-
-    try:
-        resp = requests.get(url, params=params, timeout=10)
-        data = resp.json()
-        daily_rain = data.get("daily", {}).get("precipitation_sum", [])
-    except Exception:
+    # The chart is drawn from what is already stored while the days not yet
+    # stored are fetched in the background; only a village with nothing stored
+    # waits for the fetch. The store does its file work (opening, growing and
+    # flushing the arrays) in worker threads
+    store = await run_in_threadpool(rainfall.get_store)
+    sync = store.sync_once(village.latitude, village.longitude, start_date, end_date)
+    totals = await run_in_threadpool(store.weekly, village.latitude, village.longitude, start_date, 12)
+    if totals is None:
+        # Shielded: other requests may be waiting on the same sync
+        await asyncio.shield(sync)
+        totals = await run_in_threadpool(store.weekly, village.latitude, village.longitude, start_date, 12)
+    if totals is None:
         raise HTTPException(status_code=502, detail="Could not fetch rainfall data")
+    weeks = [{"week": f"W{i + 1}", "actual": round(float(total), 1), "forecast": None}
+             for i, total in enumerate(totals)]
 
-    # Aggregate into weekly buckets
-    weeks = []
-    for i in range(0, min(84, len(daily_rain)), 7):
-        chunk = daily_rain[i:i+7]
-        total = round(sum(v for v in chunk if v is not None), 1)
-        weeks.append({"week": f"W{i//7 + 1}", "actual": total, "forecast": None})
-
-    # 4-week forward forecast (linear decay from last known value)
-    last_val = weeks[-1]["actual"] if weeks else 0
-    for j in range(1, 5):
-        weeks.append({"week": f"F{j}", "actual": None, "forecast": round(max(0, last_val * max(0.05, 1 - j * 0.25)), 1)})
+    # 4-week forward forecast (Holt's linear trend over the weekly totals)
+    for j, value in enumerate(forecast.holt_forecast([w["actual"] for w in weeks], horizon=4), start=1):
+        weeks.append({"week": f"F{j}", "actual": None, "forecast": round(value, 1)})
 
     return {"village": village.name, "data": weeks}
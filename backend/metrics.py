@@ -0,0 +1,307 @@
+"""Request, SQL and upstream instrumentation, exported in Prometheus text format.
+
+MetricsMiddleware times every request by route template and tracks requests
+in flight. SQLAlchemy cursor events (instrument_engine) count and time the
+queries each request issues; a statement repeated N_PLUS_ONE_THRESHOLD
+times within one request (e.g. lazy loads of Village.water_data in a loop)
+is counted as an N+1 pattern and logged once per route. Open-Meteo calls
+are timed by the rainfall client, and cache hit ratios are read at scrape
+time. Everything is served at GET /metrics.
+
+Setting METRICS_PROFILE_SAMPLE_RATE > 0 turns on a sampling profiler: that
+fraction of requests is sampled every few milliseconds while it runs, and
+the stacks of those slower than METRICS_PROFILE_SLOW_MS are kept for
+GET /metrics/profiles.
+"""
+import bisect
+import collections
+import contextvars
+import logging
+import random
+import sys
+import threading
+import time
+import traceback
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+N_PLUS_ONE_THRESHOLD = 10
+PROFILE_INTERVAL_S = 0.002
+PROFILES_KEPT = 20
+IDLE_FILES = {"threading.py", "selectors.py", "queue.py"}
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names, kind="counter"):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.kind = kind
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{{{_labels(self.label_names, labels)}}} {value:g}" for labels, value in items)
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", ("method", "route"))
+REQUESTS = Counter("http_requests_total", "Requests by route and status code.", ("method", "route", "status"))
+IN_FLIGHT = Counter("http_requests_in_flight", "Requests currently being served.", ("method", "route"), kind="gauge")
+REQUEST_QUERIES = Histogram("http_request_sql_queries", "SQL statements issued per request.", ("method", "route"),
+                            buckets=QUERY_COUNT_BUCKETS)
+REQUEST_SQL_TIME = Histogram("http_request_sql_duration_seconds", "Time spent in SQL per request.", ("method", "route"))
+N_PLUS_ONE = Counter("sql_n_plus_one_total", "Requests that repeated one statement at least "
+                     f"{N_PLUS_ONE_THRESHOLD} times.", ("route", "statement"))
+SQL_LATENCY = Histogram("sql_query_duration_seconds", "SQL statement latency by operation.", ("operation",))
+UPSTREAM_LATENCY = Histogram("upstream_request_duration_seconds", "Outbound HTTP latency.", ("service", "outcome"))
+TANKER_PINGS = Counter("tanker_pings_total", "GPS pings received, by outcome.", ("outcome",))
+TANKER_POSITION_WRITES = Counter("tanker_position_writes_total", "Tanker positions persisted by the write-behind flush.", ())
+
+
+# --- SQL ---
+
+class _RequestStats:
+    __slots__ = ("queries", "sql_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = collections.Counter()
+
+
+_current = contextvars.ContextVar("request_sql_stats", default=None)
+
+
+def instrument_engine(engine):
+    """Time every statement on engine and attribute it to the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip()[:6].upper()
+        SQL_LATENCY.observe((operation,), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_time += elapsed
+            stats.statements[statement] += 1
+
+
+# --- Requests ---
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering).
+
+    `router` is the app's router, used to label requests by route template.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    def _route_template(self, scope):
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        template = self._route_template(scope)
+        labels = (method, template)
+        stats = _RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        sampler = _start_profile() if _profile_rate and random.random() < _profile_rate else None
+        IN_FLIGHT.inc(labels)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            IN_FLIGHT.inc(labels, -1)
+            REQUEST_LATENCY.observe(labels, elapsed)
+            REQUESTS.inc((method, template, status[0]))
+            REQUEST_QUERIES.observe(labels, stats.queries)
+            REQUEST_SQL_TIME.observe(labels, stats.sql_time)
+            if stats.statements:
+                statement, repeats = stats.statements.most_common(1)[0]
+                if repeats >= N_PLUS_ONE_THRESHOLD:
+                    _report_n_plus_one(template, statement, repeats)
+            if sampler is not None:
+                sampler.finish(method, template, elapsed)
+
+
+_reported = set()
+
+
+def _report_n_plus_one(route, statement, repeats):
+    summary = " ".join(statement.split())[:120]
+    N_PLUS_ONE.inc((route, summary))
+    if (route, summary) not in _reported:
+        _reported.add((route, summary))
+        logger.warning("Possible N+1 on %s: %d executions of %s", route, repeats, summary)
+
+
+# --- Sampling profiler (opt-in) ---
+
+_profile_rate = settings.metrics_profile_sample_rate
+_profiles = collections.deque(maxlen=PROFILES_KEPT)
+
+
+class _Sampler(threading.Thread):
+    """Samples every thread's stack (except its own) until finished."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.samples = collections.Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._done.wait(PROFILE_INTERVAL_S):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = traceback.extract_stack(frame, limit=40)
+                # Skip idle threads parked in thread pools or the event loop's selector
+                if not stack or stack[-1].filename.rsplit("/", 1)[-1] in IDLE_FILES:
+                    continue
+                self.samples[tuple(f"{fs.name} ({fs.filename.rsplit('/', 1)[-1]}:{fs.lineno})" for fs in stack)] += 1
+
+    def finish(self, method, route, elapsed):
+        self._done.set()
+        if elapsed * 1000 < settings.metrics_profile_slow_ms:
+            return
+        self.join()
+        if not self.samples:
+            return
+        leaf = collections.Counter()
+        for stack, count in self.samples.items():
+            leaf[stack[-1]] += count
+        _profiles.append({
+            "method": method,
+            "route": route,
+            "duration_ms": round(elapsed * 1000, 1),
+            "samples": sum(self.samples.values()),
+            "interval_ms": PROFILE_INTERVAL_S * 1000,
+            "top_frames": leaf.most_common(25),
+            "stacks": [{"stack": ";".join(stack), "count": count} for stack, count in self.samples.most_common(20)],
+        })
+
+
+def _start_profile():
+    sampler = _Sampler()
+    sampler.start()
+    return sampler
+
+
+def slow_profiles():
+    return list(_profiles)
+
+
+# --- Exposition ---
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    from backend import cache, live, openmeteo, routing
+
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUESTS, IN_FLIGHT, REQUEST_QUERIES, REQUEST_SQL_TIME, N_PLUS_ONE,
+                   SQL_LATENCY, UPSTREAM_LATENCY, TANKER_PINGS, TANKER_POSITION_WRITES):
+        lines.extend(metric.render())
+
+    caches = [
+        ("response", cache.response_cache.hits, cache.response_cache.misses),
+        ("distance", routing.distance_cache.hits, routing.distance_cache.misses),
+    ]
+    client = openmeteo._client
+    if client is not None:
+        caches.append(("rainfall", client.hits, client.misses))
+    lines.append("# HELP cache_requests_total Cache lookups by result.")
+    lines.append("# TYPE cache_requests_total counter")
+    for name, hits, misses in caches:
+        lines.append(f'cache_requests_total{{cache="{name}",result="hit"}} {hits}')
+        lines.append(f'cache_requests_total{{cache="{name}",result="miss"}} {misses}')
+    lines.append("# HELP cache_hit_ratio Hits over lookups since start.")
+    lines.append("# TYPE cache_hit_ratio gauge")
+    for name, hits, misses in caches:
+        lines.append(f'cache_hit_ratio{{cache="{name}"}} {hits / (hits + misses) if hits + misses else 0:.4f}')
+
+    lines.append("# HELP live_subscribers Connected Server-Sent Events clients.")
+    lines.append("# TYPE live_subscribers gauge")
+    lines.append(f"live_subscribers {live.broker.subscriber_count}")
+    return "\n".join(lines) + "\n"
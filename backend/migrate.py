@@ -0,0 +1,59 @@
+"""Schema creation and upgrades.
+
+    python -m backend.migrate
+
+Creates missing tables, columns and indexes, backfills derived tables on
+databases created before they existed, and records models.SCHEMA_VERSION
+(and, on a database with no stress model run yet, the current model).
+The app runs ensure_schema at startup (unless SCHEMA_CHECK_ON_STARTUP is
+off), which costs a single query when the database is already current, so
+deployments can migrate explicitly at release time and skip the check.
+"""
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from backend import models
+
+
+def current_version(engine):
+    """The recorded schema version, or None for a database that was never migrated."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(models.SchemaVersion.version).where(models.SchemaVersion.id == 1)).scalar()
+    except SQLAlchemyError:
+        # No schema_version table yet
+        return None
+
+
+def migrate(engine):
+    from backend import crud, regions, rollups, stress
+
+    before = current_version(engine)
+    models.create_schema(engine)
+    with Session(engine) as db:
+        crud.ensure_village_status(db)
+        rollups.ensure_rollups(db)
+        regions.ensure_summaries(db)
+        stress.ensure_history(db)
+        if before is not None and before < 2:
+            # village_status gained the latest reading's inputs
+            crud.rebuild_village_status(db)
+        db.merge(models.SchemaVersion(id=1, version=models.SCHEMA_VERSION))
+        db.commit()
+
+
+def ensure_schema(engine) -> bool:
+    """Migrate unless the database is already at SCHEMA_VERSION; returns whether it migrated."""
+    if current_version(engine) == models.SCHEMA_VERSION:
+        return False
+    migrate(engine)
+    return True
+
+
+if __name__ == "__main__":
+    from backend.database import engine
+
+    before = current_version(engine)
+    migrate(engine)
+    print(f"Schema migrated from version {before} to {models.SCHEMA_VERSION}.")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index, inspect, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import relationship
 from backend.database import Base
 import datetime
@@ -15,6 +16,11 @@ class Village(Base):
     
     water_data = relationship("WaterData", back_populates="village")
 
+    __table_args__ = (
+        # Map viewport (bbox) queries
+        Index("ix_villages_position", "latitude", "longitude"),
+    )
+
 class WaterData(Base):
     __tablename__ = "water_data"
 
@@ -32,6 +38,104 @@ class WaterData(Base):
     
     village = relationship("Village", back_populates="water_data")
 
+    __table_args__ = (
+        # Per-village history lookups and range scans
+        Index("ix_water_data_village_date", "village_id", "record_date"),
+    )
+
+class WaterDataRollup(Base):
+    """Per-village min/max/sum/last of each metric per day, week and month (see backend.rollups)."""
+    __tablename__ = "water_data_rollups"
+
+    village_id = Column(Integer, ForeignKey("villages.id"), primary_key=True)
+    granularity = Column(String, primary_key=True)  # "day" | "week" | "month"
+    bucket_start = Column(DateTime, primary_key=True)
+
+    count = Column(Integer)
+    last_record_date = Column(DateTime)
+
+    stress_min = Column(Float)
+    stress_max = Column(Float)
+    stress_sum = Column(Float)
+    stress_last = Column(Float)
+
+    rainfall_min = Column(Float)
+    rainfall_max = Column(Float)
+    rainfall_sum = Column(Float)
+    rainfall_last = Column(Float)
+
+    groundwater_min = Column(Float)
+    groundwater_max = Column(Float)
+    groundwater_sum = Column(Float)
+    groundwater_last = Column(Float)
+
+class VillageStatus(Base):
+    """Latest reading per village, kept current by crud.add_water_data."""
+    __tablename__ = "village_status"
+
+    village_id = Column(Integer, ForeignKey("villages.id"), primary_key=True)
+    record_date = Column(DateTime)
+
+    stress_index = Column(Float)
+    predicted_stress_index = Column(Float, nullable=True)
+    priority_score = Column(Float)  # Triage score, see crud.triage_score
+    # Inputs of the latest reading, so stress what-ifs need no history scan (see backend.stress)
+    rainfall_deviation_mm = Column(Float, nullable=True)
+    groundwater_level_m = Column(Float, nullable=True)
+
+    village = relationship("Village")
+
+    __table_args__ = (
+        # Crisis dashboard walks this index backwards (highest priority first)
+        Index("ix_village_status_priority", "priority_score", "village_id"),
+    )
+
+class DistrictSummary(Base):
+    """Village stress bands and tanker coverage per Village.district, kept current by backend.regions."""
+    __tablename__ = "district_summaries"
+
+    district = Column(String, primary_key=True)  # "" for villages without one
+    villages = Column(Integer, nullable=False, default=0)
+    population = Column(Integer, nullable=False, default=0)
+    # Villages by band of their latest reading (live.STRESS_BANDS); villages without readings are in none
+    critical = Column(Integer, nullable=False, default=0)
+    warning = Column(Integer, nullable=False, default=0)
+    safe = Column(Integer, nullable=False, default=0)
+    population_at_risk = Column(Integer, nullable=False, default=0)  # Population of critical and warning villages
+    tankers_assigned = Column(Integer, nullable=False, default=0)  # Dispatched tankers assigned to its villages
+
+class StateSummary(Base):
+    """Tanker fleet per registration state (license plate prefix), kept current by backend.regions."""
+    __tablename__ = "state_summaries"
+
+    state = Column(String, primary_key=True)
+    tankers = Column(Integer, nullable=False, default=0)
+    tankers_available = Column(Integer, nullable=False, default=0)
+    capacity_liters = Column(Integer, nullable=False, default=0)
+    capacity_available_liters = Column(Integer, nullable=False, default=0)
+
+class ForecastRun(Base):
+    """Bookkeeping for forecast.run_forecast; the watermark makes runs incremental."""
+    __tablename__ = "forecast_runs"
+
+    id = Column(Integer, primary_key=True)
+    run_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_water_data_id = Column(Integer)  # Highest reading included in this run
+    # DataVersion.history_generation the watermark belongs to; ids from older generations mean nothing
+    history_generation = Column(Integer, nullable=False, default=0, server_default="0")
+    villages_refit = Column(Integer)
+
+class StressModelRun(Base):
+    """A bulk recompute of stress history with one model version (see backend.stress)."""
+    __tablename__ = "stress_model_runs"
+
+    id = Column(Integer, primary_key=True)
+    model_version = Column(Integer, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime, nullable=True)  # None while running; resumed from the watermark
+    last_water_data_id = Column(Integer)  # Highest reading rewritten so far
+    readings_updated = Column(Integer)
+
 class Tanker(Base):
     __tablename__ = "tankers"
 
@@ -41,3 +145,51 @@ class Tanker(Base):
     is_available = Column(Boolean, default=True)
     current_latitude = Column(Float, nullable=True)
     current_longitude = Column(Float, nullable=True)
+    # Bumped on every claim and release; dispatch claims are conditional on it (crud.claim_tanker)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    assigned_village_id = Column(Integer, ForeignKey("villages.id"), nullable=True)
+
+    __table_args__ = (
+        # Bounding-box prefilter for nearest-tanker dispatch
+        Index("ix_tankers_available_position", "is_available", "current_latitude", "current_longitude"),
+        # Map viewport (bbox) queries over the whole fleet
+        Index("ix_tankers_position", "current_latitude", "current_longitude"),
+    )
+
+
+class DataVersion(Base):
+    """Single-row counter bumped by every write that changes API-visible data (see backend.cache)."""
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # Bumped when water_data is replaced wholesale (a reseed), which lets its ids be reused
+    history_generation = Column(Integer, nullable=False, default=0, server_default="0")
+
+class SchemaVersion(Base):
+    """Single row recording the SCHEMA_VERSION the database was last migrated to (see backend.migrate)."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+# Bump whenever tables, columns or indexes change so deployed databases are migrated
+SCHEMA_VERSION = 4
+
+def create_schema(bind):
+    """Create missing tables, plus columns and indexes added to tables that already exist.
+
+    New columns on existing tables must be nullable or carry a server_default.
+    """
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        existing = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            present = {c["name"] for c in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present:
+                    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -0,0 +1,198 @@
+"""Shared async client for the Open-Meteo historical archive.
+
+One pooled httpx.AsyncClient serves every request. Responses are kept in a
+TTL + LRU cache keyed on the rounded coordinates and date window, identical
+in-flight requests share a single upstream fetch, and once an entry goes
+stale it is still served while a background refresh runs.
+
+Pass any httpx transport (e.g. httpx.ASGITransport(app=fake_archive.app))
+to run without network access.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+import httpx
+
+from backend import metrics
+from backend.config import settings
+
+# ~1 km; well below the resolution of the archive's reanalysis grid
+COORD_PRECISION = 2
+
+
+class RainfallUnavailable(Exception):
+    """The archive could not be reached and nothing usable was cached."""
+
+
+class RainfallClient:
+    def __init__(
+        self,
+        base_url: str = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        ttl_s: float = None,
+        stale_s: float = None,
+        max_entries: int = None,
+        timeout_s: float = 10.0,
+        stale_while_revalidate: bool = True,
+    ):
+        self.base_url = base_url or settings.open_meteo_archive_url
+        self.ttl_s = settings.rainfall_cache_ttl_s if ttl_s is None else ttl_s
+        self.stale_s = settings.rainfall_cache_stale_s if stale_s is None else stale_s
+        self.max_entries = max_entries or settings.rainfall_cache_size
+        self.stale_while_revalidate = stale_while_revalidate
+        self._http = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(timeout_s),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        self._cache = OrderedDict()  # key -> (fetched_at, daily precipitation list)
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+
+    async def aclose(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self._http.aclose()
+
+    async def daily_precipitation(
+        self, latitude: float, longitude: float, start_date: date, end_date: date, timezone: str = "Asia/Kolkata"
+    ):
+        """Return the daily precipitation_sum list (mm, None for missing days) for the window."""
+        key = (round(latitude, COORD_PRECISION), round(longitude, COORD_PRECISION),
+               start_date.isoformat(), end_date.isoformat(), timezone)
+        entry = self._cache.get(key)
+        if entry is not None:
+            fetched_at, value = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl_s:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return value
+            if self.stale_while_revalidate and age < self.ttl_s + self.stale_s:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                self._fetch_once(key)
+                return value
+
+        self.misses += 1
+        try:
+            # shield: one caller's cancellation must not abort the shared fetch
+            return await asyncio.shield(self._fetch_once(key))
+        except RainfallUnavailable:
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_s + self.stale_s:
+                return entry[1]
+            raise
+
+    def _fetch_once(self, key) -> asyncio.Task:
+        """Start the upstream fetch for key unless one is already running."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._fetch_done(key, t))
+        return task
+
+    def _fetch_done(self, key, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Background refreshes have no awaiter; retrieve their error so it is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key):
+        latitude, longitude, start_date, end_date, timezone = key
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "start_date": start_date,
+            "end_date": end_date,
+            "daily": "precipitation_sum",
+            "timezone": timezone,
+        }
+        started = time.perf_counter()
+        try:
+            resp = await self._http.get(self.base_url, params=params)
+            resp.raise_for_status()
+            daily_rain = resp.json().get("daily", {}).get("precipitation_sum", [])
+        except (httpx.HTTPError, ValueError) as exc:
+            metrics.UPSTREAM_LATENCY.observe(("open-meteo", "error"), time.perf_counter() - started)
+            raise RainfallUnavailable(str(exc)) from exc
+        metrics.UPSTREAM_LATENCY.observe(("open-meteo", "ok"), time.perf_counter() - started)
+        self._cache[key] = (time.monotonic(), daily_rain)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return daily_rain
+
+
+_client: Optional[RainfallClient] = None
+
+
+def get_rainfall_client() -> RainfallClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = RainfallClient()
+    return _client
+
+
+def set_rainfall_client(client: Optional[RainfallClient]):
+    """Install a client (e.g. one built on a fake transport); None resets to the default."""
+    global _client
+    _client = client
+
+
+async def close_rainfall_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# --- Recording and replaying archive responses ---
+
+def _fixture_name(request: httpx.Request) -> str:
+    params = sorted(request.url.params.multi_items())
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return hashlib.sha1(query.encode()).hexdigest()[:20] + ".json"
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answers archive requests from responses saved by RecordingTransport."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = os.path.join(self.directory, _fixture_name(request))
+        if not os.path.exists(path):
+            return httpx.Response(404, json={"reason": f"No recorded response for {request.url.query.decode()}"})
+        with open(path, "rb") as f:
+            return httpx.Response(200, content=f.read(), headers={"content-type": "application/json"})
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests through to a real transport and saves successful responses."""
+
+    def __init__(self, directory: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.directory = directory
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        os.makedirs(directory, exist_ok=True)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        if response.status_code == 200:
+            with open(os.path.join(self.directory, _fixture_name(request)), "wb") as f:
+                f.write(content)
+        # The body is already decoded, so drop headers describing the wire encoding
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(response.status_code, headers=headers, content=content)
+
+    async def aclose(self):
+        await self.transport.aclose()
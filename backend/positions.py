@@ -0,0 +1,318 @@
+"""Live tanker positions from GPS pings, persisted write-behind.
+
+POST /tankers/positions feeds batches of pings into PositionStore, which
+keeps one slot per tanker in flat NumPy arrays (position, ping time, dirty
+flag), so memory is bounded by the fleet however fast pings arrive. A batch
+is applied with a few vectorized steps: ids map to slots through a dense
+lookup array, the batch is reduced to each tanker's newest ping, and only
+pings newer than the stored one are kept. The dispatch index
+(spatial.tanker_index) moves in the same step, so dispatch uses a ping as
+soon as it is accepted.
+
+A background thread writes the latest position of every tanker that moved
+since the previous flush every settings.position_flush_interval_s, in one
+executemany, then bumps the data version and publishes a "positions" live
+event so cached fleet responses and map clusters follow. Pings are held by
+the worker that received them until its next flush. Each write is
+conditional on the row still holding the position this worker last saw
+there, so a release that moved the tanker meanwhile (crud.release_tanker,
+possibly in another worker) wins over pings queued before it.
+"""
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from backend import cache, live, metrics, models, spatial
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ids above this are rejected without a lookup, so the dense id -> slot array stays small
+MAX_TANKER_ID = 10_000_000
+# Ids looked up and not found; cleared when full so a bad device costs one query per batch at most
+MAX_UNKNOWN_IDS = 10000
+
+
+class PositionStore:
+    """Latest known position of every tanker, safe to share across threads."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Drop all positions; reloaded from the database on next use (pending pings are lost)."""
+        with self._lock:
+            self.loaded = False
+            self._slot_of = np.full(0, -1, dtype=np.int64)  # tanker id -> slot
+            self._ids = np.empty(0, dtype=np.int64)
+            self._lat = np.empty(0)
+            self._lon = np.empty(0)
+            self._at = np.empty(0)  # epoch seconds of the newest ping; -inf if only the database position is known
+            self._saved_lat = np.empty(0)  # position the database held when last read or written
+            self._saved_lon = np.empty(0)
+            self._dirty = np.zeros(0, dtype=bool)
+            self._size = 0
+            self._unknown = set()
+
+    def __len__(self):
+        return self._size
+
+    def load(self, rows):
+        """(Re)load from (id, lat, lon) tuples as stored in the database."""
+        with self._lock:
+            self.reset()
+            self._add(rows)
+            self.loaded = True
+
+    def _add(self, rows):
+        rows = [row for row in rows if 0 <= row[0] <= MAX_TANKER_ID and (row[0] >= len(self._slot_of) or self._slot_of[row[0]] < 0)]
+        if not rows:
+            return
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        n = self._size + len(rows)
+        if n > len(self._ids):
+            capacity = max(n, 2 * len(self._ids), 64)
+            extra = capacity - len(self._ids)
+            self._ids = np.concatenate([self._ids, np.full(extra, -1, dtype=np.int64)])
+            self._lat = np.concatenate([self._lat, np.full(extra, np.nan)])
+            self._lon = np.concatenate([self._lon, np.full(extra, np.nan)])
+            self._at = np.concatenate([self._at, np.full(extra, -np.inf)])
+            self._saved_lat = np.concatenate([self._saved_lat, np.full(extra, np.nan)])
+            self._saved_lon = np.concatenate([self._saved_lon, np.full(extra, np.nan)])
+            self._dirty = np.concatenate([self._dirty, np.zeros(extra, dtype=bool)])
+        if ids.max() >= len(self._slot_of):
+            grown = np.full(max(int(ids.max()) + 1, 2 * len(self._slot_of)), -1, dtype=np.int64)
+            grown[:len(self._slot_of)] = self._slot_of
+            self._slot_of = grown
+        slots = np.arange(self._size, n)
+        self._slot_of[ids] = slots
+        self._ids[slots] = ids
+        self._lat[slots] = [np.nan if row[1] is None else row[1] for row in rows]
+        self._lon[slots] = [np.nan if row[2] is None else row[2] for row in rows]
+        self._saved_lat[slots] = self._lat[slots]
+        self._saved_lon[slots] = self._lon[slots]
+        self._size = n
+
+    def _slots(self, ids: np.ndarray) -> np.ndarray:
+        slots = np.full(len(ids), -1, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < len(self._slot_of))
+        slots[in_range] = self._slot_of[ids[in_range]]
+        return slots
+
+    def ingest(self, db: Session, tanker_ids, lats, lons, recorded_at=None):
+        """Apply a batch of pings (parallel sequences; recorded_at in epoch seconds, default now).
+
+        Returns counts of pings accepted and rejected (unknown tanker or
+        invalid coordinates) and of tankers whose position moved.
+        """
+        ids = np.asarray(tanker_ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        at = np.full(len(ids), time.time()) if recorded_at is None else np.asarray(recorded_at, dtype=float)
+        valid = np.isfinite(lats) & np.isfinite(lons) & (np.abs(lats) <= 90) & (np.abs(lons) <= 180) & np.isfinite(at)
+
+        with self._lock:
+            slots = self._slots(ids)
+            missing = np.unique(ids[valid & (slots < 0) & (ids >= 0) & (ids <= MAX_TANKER_ID)]).tolist()
+            missing = [t for t in missing if t not in self._unknown]
+        if missing:
+            # Tankers created since the store was loaded
+            found = db.query(models.Tanker.id, models.Tanker.current_latitude, models.Tanker.current_longitude).filter(
+                models.Tanker.id.in_(missing)).all()
+            with self._lock:
+                self._add(found)
+                if len(self._unknown) + len(missing) > MAX_UNKNOWN_IDS:
+                    self._unknown.clear()
+                self._unknown.update(set(missing) - {row[0] for row in found})
+                slots = self._slots(ids)
+
+        keep = valid & (slots >= 0)
+        accepted = int(keep.sum())
+        metrics.TANKER_PINGS.inc(("accepted",), accepted)
+        metrics.TANKER_PINGS.inc(("rejected",), len(ids) - accepted)
+        if not accepted:
+            return {"accepted": 0, "rejected": len(ids), "moved": 0}
+
+        # Newest ping per tanker in this batch
+        slots, at, lats, lons = slots[keep], at[keep], lats[keep], lons[keep]
+        order = np.lexsort((at, slots))
+        last = np.r_[slots[order][1:] != slots[order][:-1], True]
+        pick = order[last]
+        slots, at, lats, lons = slots[pick], at[pick], lats[pick], lons[pick]
+
+        with self._lock:
+            newer = at > self._at[slots]
+            slots, at, lats, lons = slots[newer], at[newer], lats[newer], lons[newer]
+            self._lat[slots] = lats
+            self._lon[slots] = lons
+            self._at[slots] = at
+            self._dirty[slots] = True
+            moved_ids = self._ids[slots]
+        if spatial.tanker_index.loaded:
+            spatial.tanker_index.move(moved_ids.tolist(), lats, lons)
+        return {"accepted": accepted, "rejected": len(ids) - accepted, "moved": len(slots)}
+
+    def record(self, tanker_id: int, lat: float, lon: float):
+        """Note a position the database already holds (e.g. set on release), superseding older pings."""
+        with self._lock:
+            slot = self._slots(np.array([tanker_id]))[0]
+            if slot < 0:
+                self._add([(tanker_id, lat, lon)])
+                slot = self._slot_of[tanker_id]
+            self._lat[slot], self._lon[slot], self._at[slot] = lat, lon, time.time()
+            self._saved_lat[slot], self._saved_lon[slot] = lat, lon
+            self._dirty[slot] = False
+
+    def overlay(self, tanker_ids, lats, lons):
+        """Return (lats, lons) with positions from pings replacing the database values passed in."""
+        ids = np.asarray(tanker_ids, dtype=np.int64)
+        lats = np.array(lats, dtype=float)
+        lons = np.array(lons, dtype=float)
+        with self._lock:
+            slots = self._slots(ids)
+            known = slots >= 0
+            known[known] = np.isfinite(self._at[slots[known]])
+            lats[known] = self._lat[slots[known]]
+            lons[known] = self._lon[slots[known]]
+        return lats, lons
+
+    def current(self, tanker_id: int, lat: float, lon: float):
+        """The tanker's position from pings, or (lat, lon) as read from the database."""
+        lats, lons = self.overlay([tanker_id], [np.nan if lat is None else lat], [np.nan if lon is None else lon])
+        return (None, None) if np.isnan(lats[0]) else (float(lats[0]), float(lons[0]))
+
+    def flush(self, db: Session) -> int:
+        """Write every position that changed since the last flush in one statement; returns how many.
+
+        Tankers whose stored position changed underneath (released since)
+        are skipped and take the stored position instead.
+        """
+        with self._lock:
+            slots = np.flatnonzero(self._dirty[:self._size])
+            self._dirty[slots] = False
+            ids, lats, lons = self._ids[slots].tolist(), self._lat[slots].tolist(), self._lon[slots].tolist()
+            saved = [(None if np.isnan(la) else la, None if np.isnan(lo) else lo)
+                     for la, lo in zip(self._saved_lat[slots].tolist(), self._saved_lon[slots].tolist())]
+        if not ids:
+            return 0
+        tankers = models.Tanker.__table__
+        try:
+            result = db.execute(
+                update(tankers).where(
+                    tankers.c.id == bindparam("b_id"),
+                    tankers.c.current_latitude.is_not_distinct_from(bindparam("b_saved_lat")),
+                    tankers.c.current_longitude.is_not_distinct_from(bindparam("b_saved_lon")),
+                ).values(current_latitude=bindparam("b_lat"), current_longitude=bindparam("b_lon")),
+                [{"b_id": i, "b_lat": la, "b_lon": lo, "b_saved_lat": sla, "b_saved_lon": slo}
+                 for i, la, lo, (sla, slo) in zip(ids, lats, lons, saved)],
+            )
+            stored = {}
+            if result.rowcount != len(ids) or not db.get_bind().dialect.supports_sane_multi_rowcount:
+                # Some rows were moved since this worker last saw them; read back what they hold now
+                stored = {row.id: (row.current_latitude, row.current_longitude) for row in db.execute(
+                    select(tankers.c.id, tankers.c.current_latitude, tankers.c.current_longitude)
+                    .where(tankers.c.id.in_(ids)))}
+            moved = [(i, la, lo) for i, la, lo in zip(ids, lats, lons) if stored.get(i, (la, lo)) == (la, lo)]
+            if moved:
+                cache.bump_version(db)
+                live.queue_event(db, "positions", {"moved": [
+                    {"id": i, "lat": round(la, 6), "lng": round(lo, 6)} for i, la, lo in moved
+                ]})
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                # Keep them for the next flush unless a newer position already replaced them
+                self._dirty[slots] = True
+            raise
+        self._saved(slots, lats, lons, stored)
+        metrics.TANKER_POSITION_WRITES.inc((), len(moved))
+        return len(moved)
+
+    def _saved(self, slots, lats, lons, stored):
+        """Note what a flush left in the database: the flushed positions, except where `stored` differs."""
+        with self._lock:
+            if not stored:
+                self._saved_lat[slots], self._saved_lon[slots] = lats, lons
+                return
+            for slot, lat, lon in zip(slots.tolist(), lats, lons):
+                lat, lon = stored.get(int(self._ids[slot]), (lat, lon))
+                lat, lon = np.nan if lat is None else lat, np.nan if lon is None else lon
+                if not self._dirty[slot] and not (lat == self._lat[slot] and lon == self._lon[slot]):
+                    # Moved by a release and not pinged since; the stored position is the newest
+                    self._lat[slot], self._lon[slot], self._at[slot] = lat, lon, time.time()
+                self._saved_lat[slot], self._saved_lon[slot] = lat, lon
+
+
+# Process-wide store shared by every request handled in this worker
+store = PositionStore()
+
+
+def get_store(db: Session) -> PositionStore:
+    """Return the shared store, loading it from the database on first use."""
+    if not store.loaded:
+        with store._lock:
+            if not store.loaded:
+                store.load(db.query(models.Tanker.id, models.Tanker.current_latitude, models.Tanker.current_longitude).all())
+    return store
+
+
+def epoch_seconds(moment: datetime.datetime) -> float:
+    """Ping time as epoch seconds; naive datetimes are taken as UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+# --- Write-behind ---
+
+_flusher = None
+_stop = threading.Event()
+
+
+def _flush_loop(session_factory, interval_s: float):
+    while not _stop.wait(interval_s):
+        try:
+            with session_factory() as db:
+                store.flush(db)
+        except Exception:
+            logger.exception("Tanker position flush failed; retrying in %.1fs", interval_s)
+
+
+def start_flusher(session_factory):
+    """Start the background write-behind thread (idempotent)."""
+    global _flusher
+    with store._lock:
+        if _flusher is None:
+            _stop.clear()
+            _flusher = threading.Thread(target=_flush_loop, name="tanker-positions",
+                                        args=(session_factory, settings.position_flush_interval_s), daemon=True)
+            _flusher.start()
+
+
+def stop_flusher(session_factory):
+    """Stop the thread and write whatever is still pending."""
+    global _flusher
+    if _flusher is not None:
+        _stop.set()
+        _flusher.join()
+        _flusher = None
+    with session_factory() as db:
+        store.flush(db)
+
+
+def _on_event(event_type: str, data):
+    # Only a reset that replaced the fleet (the seed) invalidates positions; village-only
+    # rebuilds must not drop pings that are not flushed yet
+    if event_type == "reset" and data.get("tankers"):
+        store.reset()
+        spatial.tanker_index.reset()
+
+
+live.add_listener(_on_event)
@@ -0,0 +1,381 @@
+"""Local archive of daily precipitation, synced incrementally from Open-Meteo.
+
+    python -m backend.rainfall --days 365     # sync every village in the database
+
+Past days never change upstream, so each location's daily precipitation_sum
+is fetched once and kept in memory-mapped NumPy arrays under
+settings.rainfall_store_dir:
+
+    precip.npy   float32 (locations, days), NaN where nothing is stored
+    coords.npy   float64 (locations, 2), the rounded latitude/longitude of each row
+    synced.npy   int32 (locations, 2), first and last stored day offset (-1: none)
+    meta.json    the date of day offset 0 and the number of locations in use
+
+sync() requests only the days outside a location's stored range, and reads
+slice the mapped arrays directly: the 12-week chart is a (12, 7) view of one
+row and annual totals for every village are one nansum over a column window.
+Locations that round to the same archive coordinates share a row.
+
+Processes sharing a directory (uvicorn workers, the seed and sync CLIs)
+take an exclusive lock on its lock file around every write and growth, and
+reopen the files first if another process replaced them (meta.json
+changed), so no write lands in an unlinked copy. Readers see writes through
+the shared mapping. Where fcntl is unavailable the lock only covers this
+process, and each process needs its own directory. Without a writable
+directory the store lives in memory.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+
+from backend import openmeteo
+from backend.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; the lock then only covers this process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Spare capacity added whenever an axis has to grow, so daily appends rarely copy
+DAY_SLACK = 366
+MIN_LOCATIONS = 1024
+
+ARRAYS = {
+    # name: (dtype, columns or None for the day axis, fill)
+    "precip": (np.float32, None, np.nan),
+    "coords": (np.float64, 2, 0.0),
+    "synced": (np.int32, 2, -1),
+}
+
+
+def location_key(latitude: float, longitude: float):
+    return round(latitude, openmeteo.COORD_PRECISION), round(longitude, openmeteo.COORD_PRECISION)
+
+
+class RainfallStore:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self.fetched_days = 0  # days requested upstream, for benchmarks
+        self._syncs = {}  # (location key, start, end) -> running sync_once task
+        self._lock_fd = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._lock_fd = os.open(self._path("lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._load()
+
+    # --- Files and growth ---
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Hold this store's lock and the directory's file lock, with the files current; not reentrant."""
+        with self._lock:
+            if self._lock_fd is not None and fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                if self._lock_fd is not None and fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _load(self):
+        self.start = None
+        self.count = 0
+        self.precip = self.coords = self.synced = None
+        self._index = {}
+        if self.directory and os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+            self._meta_mtime = os.stat(self._path("meta.json")).st_mtime_ns
+            self.start = date.fromisoformat(meta["start"])
+            self.count = meta["count"]
+            for name in ARRAYS:
+                setattr(self, name, np.lib.format.open_memmap(self._path(f"{name}.npy"), mode="r+"))
+            self._index = {(lat, lon): row for row, (lat, lon) in enumerate(self.coords[:self.count].tolist())}
+
+    def _refresh(self):
+        """Reopen the files if another process grew them."""
+        if self.directory:
+            try:
+                mtime = os.stat(self._path("meta.json")).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self._meta_mtime:
+                with self._lock:
+                    self._load()
+
+    def _save_meta(self):
+        if not self.directory:
+            return
+        for name in ARRAYS:
+            getattr(self, name).flush()
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"start": self.start.isoformat(), "count": self.count}, f)
+        os.replace(tmp, self._path("meta.json"))
+        self._meta_mtime = os.stat(self._path("meta.json")).st_mtime_ns
+
+    def _reserve(self, locations: int, first: date, last: date):
+        """Grow the arrays to hold `locations` rows and the days first..last; returns whether they grew."""
+        old_days, capacity = (0, 0) if self.precip is None else self.precip.shape[::-1]
+        start = first if self.start is None else min(self.start, first)
+        shift = 0 if self.start is None else (self.start - start).days
+        needed = (last - start).days + 1
+        if shift == 0 and needed <= old_days and locations <= capacity:
+            return False
+        days = old_days + shift if needed <= old_days + shift else needed + DAY_SLACK
+        if locations > capacity:
+            capacity = max(MIN_LOCATIONS, 2 * locations)
+
+        arrays = {}
+        for name, (dtype, columns, fill) in ARRAYS.items():
+            shape = (capacity, columns or days)
+            if self.directory:
+                arrays[name] = np.lib.format.open_memmap(self._path(f"{name}.npy.tmp"), mode="w+", dtype=dtype, shape=shape)
+            else:
+                arrays[name] = np.empty(shape, dtype)
+            # Rows past count are filled when they are claimed, so unused capacity stays sparse on disk
+            arrays[name][:self.count] = fill
+        if self.count:
+            old_days = self.precip.shape[1]
+            arrays["precip"][:self.count, shift:shift + old_days] = self.precip[:self.count]
+            arrays["coords"][:self.count] = self.coords[:self.count]
+            synced = np.array(self.synced[:self.count])
+            arrays["synced"][:self.count] = np.where(synced >= 0, synced + shift, -1)
+        for name, array in arrays.items():
+            if self.directory:
+                array.flush()
+                os.replace(self._path(f"{name}.npy.tmp"), self._path(f"{name}.npy"))
+            setattr(self, name, array)
+        self.start = start
+        return True
+
+    def _offset(self, day: date) -> int:
+        return (day - self.start).days
+
+    def _day(self, offset: int) -> date:
+        return self.start + timedelta(days=int(offset))
+
+    # --- Sync ---
+
+    async def sync(self, points, start: date, end: date, client: Optional[openmeteo.RainfallClient] = None,
+                   concurrency: int = 8, retries: int = 0):
+        """Fetch the days in [start, end] not yet stored for each (latitude, longitude).
+
+        Returns {location_key: RainfallUnavailable} for locations that could
+        not be brought up to date; whatever they already had stays readable.
+        """
+        end = min(end, date.today())
+        if end < start:
+            return {}
+        client = client or openmeteo.get_rainfall_client()
+        keys = list(dict.fromkeys(location_key(lat, lon) for lat, lon in points))
+        # Growing the files copies them, so it stays off the event loop
+        rows = await asyncio.to_thread(self._claim, keys, start, end)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        failures = {}
+
+        async def fetch(key, row):
+            async with semaphore:
+                for gap_start, gap_end in self._gaps(row, start, end):
+                    for attempt in range(retries + 1):
+                        try:
+                            daily = await client.daily_precipitation(key[0], key[1], gap_start, gap_end, timezone="auto")
+                            break
+                        except openmeteo.RainfallUnavailable as e:
+                            if attempt == retries:
+                                failures[key] = e
+                                return
+                            await asyncio.sleep(0.5 * 2 ** attempt)
+                    # May wait on another process's lock
+                    await asyncio.to_thread(self._write, row, gap_start, gap_end, daily)
+
+        await asyncio.gather(*(fetch(key, row) for key, row in zip(keys, rows)))
+        if self.directory:
+            await asyncio.to_thread(self._flush)
+        return failures
+
+    def sync_once(self, latitude: float, longitude: float, start: date, end: date) -> asyncio.Task:
+        """Start syncing one location, or join the sync already running for it.
+
+        Requests for a village share one upstream fetch, so an unreachable
+        archive costs one timeout per location rather than one per request.
+        """
+        key = (location_key(latitude, longitude), start, end)
+        task = self._syncs.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.sync([(latitude, longitude)], start, end))
+            self._syncs[key] = task
+            task.add_done_callback(lambda done: self._sync_done(key, done))
+        return task
+
+    def _sync_done(self, key, task: asyncio.Task):
+        self._syncs.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Rainfall sync for %s failed: %r", key[0], task.exception())
+
+    def _claim(self, keys, start: date, end: date):
+        """Rows for keys, adding new ones and growing the arrays to cover [start, end]."""
+        with self._writing():
+            new = [key for key in keys if key not in self._index]
+            grew = self._reserve(self.count + len(new), start, end)
+            for key in new:
+                row = self.count
+                self.precip[row] = np.nan
+                self.coords[row] = key
+                self.synced[row] = -1
+                self._index[key] = row
+                self.count += 1
+            if grew or new:
+                self._save_meta()
+            return [self._index[key] for key in keys]
+
+    def _flush(self):
+        with self._writing():
+            self.precip.flush()
+            self.synced.flush()
+
+    def _gaps(self, row: int, start: date, end: date):
+        """Windows to fetch so the stored range covers [start, end] without holes."""
+        first, last = (int(v) for v in self.synced[row])
+        if first < 0 or last < first:
+            return [(start, end)]
+        gaps = []
+        if self._offset(start) < first:
+            gaps.append((start, self._day(first - 1)))
+        if self._offset(end) > last:
+            gaps.append((self._day(last + 1), end))
+        return gaps
+
+    def _write(self, row: int, start: date, end: date, daily):
+        values = np.array([np.nan if v is None else v for v in daily[:(end - start).days + 1]], dtype=np.float32)
+        self.fetched_days += (end - start).days + 1
+        with self._writing():
+            a = self._offset(start)
+            self.precip[row, a:a + len(values)] = values
+            first, last = (int(v) for v in self.synced[row])
+            valid = np.flatnonzero(~np.isnan(values))
+            # The archive lags a few days behind; trailing nulls are refetched next time
+            if len(valid):
+                last = max(last, a + int(valid[-1]))
+            self.synced[row] = (a if first < 0 else min(first, a), last)
+
+    # --- Reads ---
+
+    def daily(self, latitude: float, longitude: float, start: date, end: date):
+        """Precipitation (mm) for each day in [start, end], NaN where not stored, or None for an unknown location.
+
+        A view of the mapped array when the window lies within the stored day axis.
+        """
+        self._refresh()
+        row = self._index.get(location_key(latitude, longitude))
+        if row is None:
+            return None
+        return self._window(self.precip[row], start, end)
+
+    def _window(self, precip, start: date, end: date):
+        a, b = self._offset(start), self._offset(end) + 1
+        if a >= 0 and b <= precip.shape[-1]:
+            return precip[..., a:b]
+        out = np.full(precip.shape[:-1] + (b - a,), np.nan, dtype=np.float32)
+        lo, hi = max(a, 0), min(b, precip.shape[-1])
+        if lo < hi:
+            out[..., lo - a:hi - a] = precip[..., lo:hi]
+        return out
+
+    def weekly(self, latitude: float, longitude: float, start: date, weeks: int):
+        """Total precipitation of each 7-day week from start, or None if nothing is stored for them."""
+        days = self.daily(latitude, longitude, start, start + timedelta(days=7 * weeks - 1))
+        if days is None or np.isnan(days).all():
+            return None
+        return np.nansum(days.reshape(weeks, 7), axis=1)
+
+    def totals(self, points, start: date, end: date, max_stale_days: int = None):
+        """Total precipitation over [start, end] for each (latitude, longitude).
+
+        NaN where the stored range does not reach back to start, or stops
+        more than max_stale_days before end.
+        """
+        max_stale_days = settings.rainfall_max_stale_days if max_stale_days is None else max_stale_days
+        self._refresh()
+        result = np.full(len(points), np.nan)
+        rows = np.array([self._index.get(location_key(lat, lon), -1) for lat, lon in points], dtype=np.int64)
+        known = rows >= 0
+        if not known.any():
+            return result
+        sums = np.nansum(self._window(self.precip[:self.count], start, end), axis=1, dtype=np.float64)
+        synced = self.synced[rows[known]]
+        covered = (synced[:, 0] >= 0) & (synced[:, 0] <= self._offset(start)) \
+            & (synced[:, 1] >= self._offset(min(end, date.today())) - max_stale_days)
+        result[known] = np.where(covered, sums[rows[known]], np.nan)
+        return result
+
+
+_store: Optional[RainfallStore] = None
+
+
+def get_store() -> RainfallStore:
+    """Return the process-wide store, creating it on first use."""
+    global _store
+    if _store is None:
+        try:
+            _store = RainfallStore(settings.rainfall_store_dir or None)
+        except OSError as e:
+            logger.warning("Rainfall store %s unavailable (%s); keeping rainfall in memory", settings.rainfall_store_dir, e)
+            _store = RainfallStore()
+    return _store
+
+
+def set_store(store: Optional[RainfallStore]):
+    """Install a store (e.g. an in-memory one); None resets to the default."""
+    global _store
+    _store = store
+
+
+def main():
+    from backend import models
+    from backend.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Sync the local rainfall archive for every village.")
+    parser.add_argument("--days", type=int, default=365, help="Trailing window to keep complete")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=2)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        points = db.query(models.Village.latitude, models.Village.longitude).all()
+    end = date.today()
+    store = get_store()
+
+    async def run():
+        try:
+            return await store.sync(points, end - timedelta(days=args.days), end,
+                                    concurrency=args.concurrency, retries=args.retries)
+        finally:
+            await openmeteo.close_rainfall_client()
+
+    started = time.perf_counter()
+    failures = asyncio.run(run())
+    print(f"Synced {len(points)} villages ({store.count} locations, {store.fetched_days} days fetched) "
+          f"in {time.perf_counter() - started:.1f}s; {len(failures)} failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""District and state summaries, maintained incrementally.
+
+district_summaries counts, per Village.district, the villages in each
+stress band of their latest reading (live.STRESS_BANDS), the population of
+critical and warning villages, and the dispatched tankers assigned to its
+villages. state_summaries counts the tanker fleet per registration state,
+read from the license plate prefix (STATE_BY_PREFIX). Every writer that
+moves a count folds its change in as deltas with one
+INSERT .. ON CONFLICT DO UPDATE, so GET /regions/summary reads one row per
+district and state however many villages there are.
+
+    python -m backend.regions check     # compare with a full recount
+    python -m backend.regions rebuild   # recount from villages, village_status and tankers
+"""
+import argparse
+import collections
+import sys
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from backend import database, live, models
+
+STATE_BY_PREFIX = {
+    "MH": "Maharashtra", "MP": "Madhya Pradesh", "RJ": "Rajasthan",
+    "GJ": "Gujarat", "KA": "Karnataka", "UP": "Uttar Pradesh",
+    "DL": "Delhi", "TN": "Tamil Nadu", "AP": "Andhra Pradesh",
+    "TS": "Telangana", "KL": "Kerala", "WB": "West Bengal",
+    "HR": "Haryana", "PB": "Punjab",
+}
+
+DISTRICT_COLUMNS = ("villages", "population", "critical", "warning", "safe", "population_at_risk", "tankers_assigned")
+STATE_COLUMNS = ("tankers", "tankers_available", "capacity_liters", "capacity_available_liters")
+# district_summaries column counting each stress band
+BAND_COLUMNS = {"critical": "critical", "warning": "warning", "normal": "safe"}
+AT_RISK_BANDS = ("critical", "warning")
+
+
+def state_of(license_plate) -> str:
+    """Registration state from a plate such as "MH-12-AB-1234" (the prefix itself if unknown)."""
+    prefix = (license_plate or "").split("-")[0]
+    return STATE_BY_PREFIX.get(prefix, prefix)
+
+
+def _district_key(district) -> str:
+    return district or ""
+
+
+def _merge(db: Session, table, key: str, columns, deltas):
+    """Add {key: {column: delta}} to the counters in table (caller commits)."""
+    rows = sorted(
+        (k,) + tuple(delta.get(c, 0) for c in columns) for k, delta in deltas.items() if any(delta.values())
+    )
+    if not rows:
+        return
+    stmt = database.upsert(db, table)
+    database.bulk_insert(db, table, (key,) + tuple(columns), rows, statement=stmt.on_conflict_do_update(
+        index_elements=[table.c[key]],
+        set_={c: table.c[c] + stmt.excluded[c] for c in columns},
+    ))
+
+
+def _lookup(db: Session, columns, id_column, ids):
+    """{id: (columns...)} for ids, queried in chunks under bound-parameter limits."""
+    ids = list(set(ids))
+    found = {}
+    for start in range(0, len(ids), 900):
+        found.update((row[0], tuple(row[1:])) for row in db.query(id_column, *columns).filter(
+            id_column.in_(ids[start:start + 900])))
+    return found
+
+
+# --- Incremental updates (callers commit) ---
+
+def villages_added(db: Session, districts, populations):
+    """New villages, which count in no band until their first reading."""
+    deltas = collections.defaultdict(lambda: collections.defaultdict(int))
+    for district, population in zip(districts, populations):
+        delta = deltas[_district_key(district)]
+        delta["villages"] += 1
+        delta["population"] += population or 0
+    _merge(db, models.DistrictSummary.__table__, "district", DISTRICT_COLUMNS, deltas)
+
+
+def bands_changed(db: Session, changes):
+    """Fold (village_id, old band or None, new band) transitions into the district counts."""
+    changes = [change for change in changes if change[1] != change[2]]
+    if not changes:
+        return
+    villages = _lookup(db, (models.Village.district, models.Village.population), models.Village.id,
+                       [change[0] for change in changes])
+    deltas = collections.defaultdict(lambda: collections.defaultdict(int))
+    for village_id, old, new in changes:
+        if village_id not in villages:
+            continue
+        district, population = villages[village_id]
+        delta = deltas[_district_key(district)]
+        for band, sign in ((old, -1), (new, 1)):
+            if band is None:
+                continue
+            delta[BAND_COLUMNS[band]] += sign
+            if band in AT_RISK_BANDS:
+                delta["population_at_risk"] += sign * (population or 0)
+    _merge(db, models.DistrictSummary.__table__, "district", DISTRICT_COLUMNS, deltas)
+
+
+def tankers_changed(db: Session, tanker_ids, available: bool, village_ids=None):
+    """Tankers dispatched (available=False) or released, with the villages they were assigned to, if any."""
+    tanker_ids = list(tanker_ids)
+    if not tanker_ids:
+        return
+    village_ids = list(village_ids) if village_ids is not None else [None] * len(tanker_ids)
+    sign = 1 if available else -1
+    tankers = _lookup(db, (models.Tanker.license_plate, models.Tanker.capacity_liters), models.Tanker.id, tanker_ids)
+    districts = _lookup(db, (models.Village.district,), models.Village.id, [v for v in village_ids if v is not None])
+
+    states = collections.defaultdict(lambda: collections.defaultdict(int))
+    coverage = collections.defaultdict(lambda: collections.defaultdict(int))
+    for tanker_id, village_id in zip(tanker_ids, village_ids):
+        if tanker_id not in tankers:
+            continue
+        plate, capacity = tankers[tanker_id]
+        delta = states[state_of(plate)]
+        delta["tankers_available"] += sign
+        delta["capacity_available_liters"] += sign * (capacity or 0)
+        if village_id in districts:
+            coverage[_district_key(districts[village_id][0])]["tankers_assigned"] -= sign
+    _merge(db, models.StateSummary.__table__, "state", STATE_COLUMNS, states)
+    _merge(db, models.DistrictSummary.__table__, "district", DISTRICT_COLUMNS, coverage)
+
+
+# --- Recount ---
+
+def recount(db: Session):
+    """Compute both summaries from scratch; returns ({district: counts}, {state: counts})."""
+    village, status, tanker = models.Village, models.VillageStatus, models.Tanker
+    critical_at, warning_at = live.STRESS_BANDS[0][0], live.STRESS_BANDS[1][0]
+    # Matches live.stress_band, which reads a missing stress index as 0
+    stress = func.coalesce(status.stress_index, 0.0)
+    reported = status.village_id.isnot(None)
+    population = func.coalesce(village.population, 0)
+
+    districts = collections.defaultdict(lambda: dict.fromkeys(DISTRICT_COLUMNS, 0))
+    for district, *counts in db.query(
+        village.district,
+        func.count(village.id),
+        func.sum(population),
+        func.sum(case((and_(reported, stress >= critical_at), 1), else_=0)),
+        func.sum(case((and_(reported, stress >= warning_at, stress < critical_at), 1), else_=0)),
+        func.sum(case((and_(reported, stress < warning_at), 1), else_=0)),
+        func.sum(case((and_(reported, stress >= warning_at), population), else_=0)),
+    ).outerjoin(status, status.village_id == village.id).group_by(village.district):
+        row = districts[_district_key(district)]
+        for column, count in zip(DISTRICT_COLUMNS, counts):
+            row[column] += int(count or 0)
+    for district, count in db.query(village.district, func.count(tanker.id)).join(
+        village, village.id == tanker.assigned_village_id
+    ).filter(tanker.is_available == False).group_by(village.district):  # noqa: E712
+        districts[_district_key(district)]["tankers_assigned"] += count
+
+    states = collections.defaultdict(lambda: dict.fromkeys(STATE_COLUMNS, 0))
+    for plate, is_available, capacity in db.query(tanker.license_plate, tanker.is_available, tanker.capacity_liters):
+        row = states[state_of(plate)]
+        row["tankers"] += 1
+        row["capacity_liters"] += capacity or 0
+        if is_available:
+            row["tankers_available"] += 1
+            row["capacity_available_liters"] += capacity or 0
+    return dict(districts), dict(states)
+
+
+def rebuild(db: Session):
+    """Replace both summaries with a recount (caller commits); returns the number of districts and states."""
+    districts, states = recount(db)
+    db.query(models.DistrictSummary).delete()
+    db.query(models.StateSummary).delete()
+    database.bulk_insert(db, models.DistrictSummary.__table__, ("district",) + DISTRICT_COLUMNS, [
+        (district,) + tuple(counts[c] for c in DISTRICT_COLUMNS) for district, counts in districts.items()
+    ])
+    database.bulk_insert(db, models.StateSummary.__table__, ("state",) + STATE_COLUMNS, [
+        (state,) + tuple(counts[c] for c in STATE_COLUMNS) for state, counts in states.items()
+    ])
+    return len(districts) + len(states)
+
+
+def check(db: Session):
+    """Differences between the stored summaries and a recount, as dicts; empty when consistent."""
+    expected = recount(db)
+    differences = []
+    for (model, key, columns), recounted in zip((
+        (models.DistrictSummary, "district", DISTRICT_COLUMNS),
+        (models.StateSummary, "state", STATE_COLUMNS),
+    ), expected):
+        stored = {row[0]: dict(zip(columns, row[1:])) for row in db.query(
+            getattr(model, key), *(getattr(model, c) for c in columns))}
+        for name in sorted(set(stored) | set(recounted)):
+            for column in columns:
+                have = stored.get(name, {}).get(column, 0)
+                want = recounted.get(name, {}).get(column, 0)
+                if have != want:
+                    differences.append({"table": model.__tablename__, key: name, "column": column,
+                                        "stored": have, "expected": want})
+    return differences
+
+
+def ensure_summaries(db: Session):
+    """Build the summaries on databases created before they existed."""
+    if db.query(models.DistrictSummary.district).first() is None and db.query(models.StateSummary.state).first() is None and (
+        db.query(models.Village.id).first() is not None or db.query(models.Tanker.id).first() is not None
+    ):
+        rebuild(db)
+        db.commit()
+
+
+# --- Reads ---
+
+def summary(db: Session, district: str = None, state: str = None):
+    """Both summaries, districts with the most population at risk first; optionally a single district/state."""
+    districts = db.query(models.DistrictSummary)
+    if district is not None:
+        districts = districts.filter(models.DistrictSummary.district == district)
+    states = db.query(models.StateSummary)
+    if state is not None:
+        states = states.filter(models.StateSummary.state == state)
+    return {
+        "districts": [
+            dict({c: getattr(row, c) for c in DISTRICT_COLUMNS}, district=row.district,
+                 unreported=row.villages - row.critical - row.warning - row.safe)
+            for row in districts.order_by(models.DistrictSummary.population_at_risk.desc(),
+                                          models.DistrictSummary.district)
+        ],
+        "states": [
+            dict({c: getattr(row, c) for c in STATE_COLUMNS}, state=row.state)
+            for row in states.order_by(models.StateSummary.state)
+        ],
+    }
+
+
+def main():
+    from backend.database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Maintain district and state summaries.")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    args = parser.parse_args()
+    models.create_schema(engine)
+    with SessionLocal() as db:
+        if args.command == "rebuild":
+            count = rebuild(db)
+            db.commit()
+            print(f"Rebuilt {count} district and state summaries.")
+            return
+        differences = check(db)
+        for difference in differences:
+            print(difference)
+        print(f"{len(differences)} differences.")
+        if differences:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
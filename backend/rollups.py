@@ -0,0 +1,191 @@
+"""Daily, weekly and monthly rollups of water readings.
+
+Every write path folds its new readings into water_data_rollups: readings
+are aggregated per (village, granularity, bucket) with NumPy, then merged
+into existing rows with one INSERT .. ON CONFLICT DO UPDATE, so history
+queries read a few rows per bucket no matter how many raw readings exist.
+
+    python -m backend.rollups backfill   # rebuild from the full water_data history
+"""
+import argparse
+import datetime
+
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from backend import database, models
+
+GRANULARITIES = ("day", "week", "month")
+METRICS = ("stress", "rainfall", "groundwater")
+BACKFILL_CHUNK = 200000
+KEY_SHIFT = 20
+
+COLUMNS = ("village_id", "granularity", "bucket_start", "count", "last_record_date") + tuple(
+    f"{metric}_{stat}" for metric in METRICS for stat in ("min", "max", "sum", "last")
+)
+
+
+def _bucket_starts(days: np.ndarray, granularity: str) -> np.ndarray:
+    """Map datetime64[D] values to the start of their day/week/month bucket."""
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        offset = (days.astype(np.int64) + 3) % 7
+        return days - offset.astype("timedelta64[D]")
+    return days.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _to_datetime64(record_dates) -> np.ndarray:
+    """Convert datetimes to datetime64[us], converting each distinct value once.
+
+    Batches usually share a handful of timestamps, and numpy's per-object
+    datetime conversion is the slowest step of an aggregation.
+    """
+    distinct = {}
+    positions = np.fromiter(
+        (distinct.setdefault(d, len(distinct)) for d in record_dates), dtype=np.int64, count=len(record_dates)
+    )
+    return np.array(list(distinct), dtype="datetime64[us]")[positions]
+
+
+def aggregate(village_ids, record_dates, stress, rainfall, groundwater):
+    """Aggregate parallel sequences of readings into rollup row tuples (in COLUMNS order)."""
+    if len(village_ids) == 0:
+        return []
+    village_ids = np.asarray(village_ids, dtype=np.int64)
+    moments = _to_datetime64(record_dates)
+    days = moments.astype("datetime64[D]")
+    values = {
+        "stress": np.array(stress, dtype=float),
+        "rainfall": np.array(rainfall, dtype=float),
+        "groundwater": np.array(groundwater, dtype=float),
+    }
+
+    rows = []
+    for granularity in GRANULARITIES:
+        buckets = _bucket_starts(days, granularity)
+        # One int64 key per (village, bucket): days since the epoch fit in the low 20 bits
+        keys = (village_ids << KEY_SHIFT) | (buckets.astype(np.int64) + (1 << (KEY_SHIFT - 1)))
+        unique_keys, group = np.unique(keys, return_inverse=True)
+        n = len(unique_keys)
+
+        # The latest reading per group supplies the *_last columns
+        order = np.lexsort((moments, group))
+        sorted_group = group[order]
+        last = order[np.r_[sorted_group[1:] != sorted_group[:-1], True]]
+
+        columns = {
+            "village_id": (unique_keys >> KEY_SHIFT).tolist(),
+            "bucket_start": ((unique_keys & ((1 << KEY_SHIFT) - 1)) - (1 << (KEY_SHIFT - 1)))
+            .astype("datetime64[D]").astype("datetime64[us]").astype(object).tolist(),
+            "granularity": [granularity] * n,
+            "count": np.bincount(group, minlength=n).tolist(),
+            "last_record_date": moments[last].astype(object).tolist(),
+        }
+        for metric, v in values.items():
+            mins = np.full(n, np.inf)
+            maxs = np.full(n, -np.inf)
+            np.fmin.at(mins, group, v)
+            np.fmax.at(maxs, group, v)
+            columns[f"{metric}_min"] = mins.tolist()
+            columns[f"{metric}_max"] = maxs.tolist()
+            columns[f"{metric}_sum"] = np.bincount(group, np.nan_to_num(v), n).tolist()
+            columns[f"{metric}_last"] = v[last].tolist()
+
+        rows.extend(zip(*(columns[name] for name in COLUMNS)))
+    return rows
+
+
+def merge_rollups(db: Session, rows):
+    """Fold aggregated rows into water_data_rollups (caller commits)."""
+    if not rows:
+        return
+    table = models.WaterDataRollup.__table__
+    stmt = database.upsert(db, table)
+    new = stmt.excluded
+    postgres = db.get_bind().dialect.name == "postgresql"
+    least = func.least if postgres else func.min
+    greatest = func.greatest if postgres else func.max
+    newer = new.last_record_date >= table.c.last_record_date
+
+    merged = {
+        "count": table.c.count + new["count"],
+        "last_record_date": case((newer, new.last_record_date), else_=table.c.last_record_date),
+    }
+    for metric in METRICS:
+        merged[f"{metric}_min"] = least(table.c[f"{metric}_min"], new[f"{metric}_min"])
+        merged[f"{metric}_max"] = greatest(table.c[f"{metric}_max"], new[f"{metric}_max"])
+        merged[f"{metric}_sum"] = table.c[f"{metric}_sum"] + new[f"{metric}_sum"]
+        merged[f"{metric}_last"] = case((newer, new[f"{metric}_last"]), else_=table.c[f"{metric}_last"])
+
+    database.bulk_insert(db, table, COLUMNS, rows, statement=stmt.on_conflict_do_update(
+        index_elements=[table.c.village_id, table.c.granularity, table.c.bucket_start],
+        set_=merged,
+    ))
+
+
+def add_readings(db: Session, village_ids, record_dates, stress, rainfall, groundwater):
+    """Aggregate and merge a batch of new readings (caller commits)."""
+    merge_rollups(db, aggregate(village_ids, record_dates, stress, rainfall, groundwater))
+
+
+def backfill(db: Session, chunk_size: int = BACKFILL_CHUNK):
+    """Rebuild every rollup from water_data, streaming the history in chunks."""
+    db.query(models.WaterDataRollup).delete()
+    water_data = models.WaterData
+    rows = db.execute(
+        select(water_data.village_id, water_data.record_date, water_data.stress_index,
+               water_data.rainfall_deviation_mm, water_data.groundwater_level_m)
+        .where(water_data.record_date.isnot(None))
+        .execution_options(yield_per=chunk_size)
+    )
+    total = 0
+    for partition in rows.partitions():
+        add_readings(db, *zip(*partition))
+        total += len(partition)
+    db.commit()
+    return total
+
+
+def ensure_rollups(db: Session):
+    """Backfill rollups on databases created before they existed."""
+    if db.query(models.WaterDataRollup.village_id).first() is None and db.query(models.WaterData.id).first() is not None:
+        backfill(db)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.combine(value, datetime.time())
+
+
+def get_history(db: Session, village_id: int, granularity: str, start=None, end=None):
+    """Return the village's rollup rows for a granularity, oldest bucket first.
+
+    start/end (dates or datetimes) bound the bucket start, inclusive.
+    """
+    rollup = models.WaterDataRollup
+    query = db.query(rollup).filter(rollup.village_id == village_id, rollup.granularity == granularity)
+    if start is not None:
+        query = query.filter(rollup.bucket_start >= _as_datetime(start))
+    if end is not None:
+        query = query.filter(rollup.bucket_start <= _as_datetime(end))
+    return query.order_by(rollup.bucket_start).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain water_data rollups.")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+
+    from backend.database import SessionLocal, engine
+    models.create_schema(engine)
+    with SessionLocal() as db:
+        if args.command == "backfill":
+            print(f"Rolled up {backfill(db)} readings.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Capacity-aware multi-stop tanker routes.
+
+A village needs population * LITERS_PER_PERSON litres. Whole tanker loads of
+that go out as dedicated trips; the remainder (all of a small hamlet's
+demand) becomes a stop that can share a trip with its neighbours. Stops are
+grouped into trips no heavier than the route capacity with Clarke-Wright
+savings, measured as if each trip started and ended at the stop's nearest
+available tanker, then improved by 2-opt within trips and by relocating
+stops into neighbouring trips. Finally every trip, most valuable first, is
+given the nearest free tanker able to carry it, or the largest one left in
+range, which then drops the stops it has no room for.
+
+Village-to-village distances come from DistanceCache, which keeps one dense
+matrix over the villages it has seen most recently and only computes rows
+for new or moved villages, so repeated plans over a similar stressed set
+reuse it.
+"""
+import collections
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend import assignment, models, positions, spatial
+
+MAX_STOPS_PER_TRIP = 6
+# Nearest stops considered when merging trips or relocating a stop
+NEIGHBOURS = 20
+LOCAL_SEARCH_PASSES = 4
+# ~64 MB of float32; past this many villages the least recently used are evicted
+# (a single larger plan still keeps all of its own villages)
+MAX_CACHED_POINTS = 4000
+TANKER_CANDIDATES = 16
+
+
+class DistanceCache:
+    """Dense km distance matrix between villages, grown and reused across plans, evicting least recently used."""
+
+    def __init__(self, max_points: int = MAX_CACHED_POINTS):
+        self.max_points = max_points
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._clear()
+
+    def _clear(self):
+        self._slots = {}  # key -> row/column
+        self._keys = []  # row/column -> key, None when free
+        self._free = []
+        self._used = np.empty(0, dtype=np.int64)  # call count at each slot's last use
+        self._calls = 0
+        self._lat = np.empty(0)
+        self._lon = np.empty(0)
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def _evict(self, count: int, keep):
+        """Free the count least recently used slots outside keep."""
+        candidates = np.array([slot for slot in self._slots.values() if not keep[slot]], dtype=np.int64)
+        for slot in candidates[np.argsort(self._used[candidates], kind="stable")[:count]].tolist():
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = None
+            self._free.append(slot)
+
+    def _grow(self, size: int):
+        start = len(self._keys)
+        grown = np.zeros((size, size), dtype=np.float32)
+        grown[:start, :start] = self._matrix
+        self._matrix = grown
+        self._lat = np.concatenate([self._lat, np.zeros(size - start)])
+        self._lon = np.concatenate([self._lon, np.zeros(size - start)])
+        self._used = np.concatenate([self._used, np.zeros(size - start, dtype=np.int64)])
+        self._keys.extend([None] * (size - start))
+        self._free.extend(range(size - 1, start - 1, -1))
+
+    def matrix(self, keys, lats, lons) -> np.ndarray:
+        """Return distances between the given points, rows and columns in order of keys.
+
+        keys identify points across calls; a point whose coordinates changed
+        since it was cached is recomputed.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        with self._lock:
+            slots = np.array([self._slots.get(k, -1) for k in keys], dtype=np.int64)
+            new = slots < 0
+            # Make room for the new points, keeping every point of this plan
+            capacity = max(self.max_points, len(slots))
+            excess = len(self._slots) + int(new.sum()) - capacity
+            if excess > 0:
+                keep = np.zeros(len(self._keys), dtype=bool)
+                keep[slots[~new]] = True
+                self._evict(excess, keep)
+            moved = ~new
+            moved[moved] = (self._lat[slots[moved]] != lats[moved]) | (self._lon[slots[moved]] != lons[moved])
+
+            if new.any():
+                needed = int(new.sum()) - len(self._free)
+                if needed > 0:
+                    self._grow(len(self._keys) + needed)
+                for i in np.flatnonzero(new).tolist():
+                    slot = self._free.pop()
+                    self._slots[keys[i]] = slots[i] = slot
+                    self._keys[slot] = keys[i]
+            self._calls += 1
+            self._used[slots] = self._calls
+
+            stale = new | moved
+            if stale.any():
+                rows = slots[stale]
+                self._lat[rows] = lats[stale]
+                self._lon[rows] = lons[stale]
+                block = spatial.haversine_km_matrix(self._lat[rows], self._lon[rows], self._lat, self._lon)
+                self._matrix[rows, :] = block
+                self._matrix[:, rows] = block.T
+            self.misses += int(stale.sum())
+            self.hits += len(slots) - int(stale.sum())
+            return self._matrix[np.ix_(slots, slots)]
+
+
+# Process-wide cache shared by every planning request in this worker
+distance_cache = DistanceCache()
+
+
+def _savings_routes(dist, depot, load, capacity, max_stops, near):
+    """Clarke-Wright parallel savings; returns a list of routes (lists of stop indices)."""
+    n = len(depot)
+    routes = [[i] for i in range(n)]
+    route_of = list(range(n))
+    route_load = [float(q) for q in load]
+    if n < 2:
+        return routes
+
+    # Candidate merges only between near neighbours keeps the savings list O(n)
+    first = np.repeat(np.arange(n), near.shape[1])
+    second = near.ravel()
+    a, b = np.minimum(first, second), np.maximum(first, second)
+    pairs = np.unique(a * n + b)
+    a, b = pairs // n, pairs % n
+    savings = depot[a] + depot[b] - dist[a, b]
+    order = np.argsort(-savings, kind="stable")
+    order = order[savings[order] > 0]
+
+    for i, j in zip(a[order].tolist(), b[order].tolist()):
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj or route_load[ri] + route_load[rj] > capacity:
+            continue
+        left, right = routes[ri], routes[rj]
+        if len(left) + len(right) > max_stops:
+            continue
+        # Only route ends can be joined: i must end the left route, j start the right one
+        if left[-1] != i:
+            if left[0] != i:
+                continue
+            left.reverse()
+        if right[0] != j:
+            if right[-1] != j:
+                continue
+            right.reverse()
+        left.extend(right)
+        route_load[ri] += route_load[rj]
+        for stop in right:
+            route_of[stop] = ri
+        routes[rj] = None
+    return [r for r in routes if r]
+
+
+def _route_cost(route, dist, depot):
+    cost = depot[route[0]] + depot[route[-1]]
+    for u, v in zip(route, route[1:]):
+        cost += dist[u, v]
+    return float(cost)
+
+
+def _two_opt(route, dist, depot):
+    """Reverse segments of one route while that shortens it."""
+    best = _route_cost(route, dist, depot)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(route) - 1):
+            for j in range(i + 1, len(route)):
+                candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                cost = _route_cost(candidate, dist, depot)
+                if cost < best - 1e-9:
+                    route, best, improved = candidate, cost, True
+    return route
+
+
+def _relocate(routes, dist, depot, load, capacity, max_stops, near, passes):
+    """Move single stops into the cheapest position of a neighbouring route."""
+    route_of = {stop: r for r, route in enumerate(routes) for stop in route}
+    route_load = [float(sum(load[s] for s in route)) for route in routes]
+
+    def link(u, v):
+        # An end of a route links to its (virtual) depot
+        if u is None:
+            return 0.0 if v is None else float(depot[v])
+        return float(depot[u]) if v is None else float(dist[u, v])
+
+    for _ in range(passes):
+        moved = 0
+        for stop in range(len(depot)):
+            r = route_of[stop]
+            route = routes[r]
+            pos = route.index(stop)
+            prev = route[pos - 1] if pos > 0 else None
+            nxt = route[pos + 1] if pos + 1 < len(route) else None
+            gain = link(prev, stop) + link(stop, nxt) - link(prev, nxt)
+
+            best = None
+            for t in {route_of[u] for u in near[stop]}:
+                target = routes[t]
+                if t == r or len(target) >= max_stops or route_load[t] + load[stop] > capacity:
+                    continue
+                for p in range(len(target) + 1):
+                    before = target[p - 1] if p > 0 else None
+                    after = target[p] if p < len(target) else None
+                    delta = link(before, stop) + link(stop, after) - link(before, after) - gain
+                    if delta < -1e-9 and (best is None or delta < best[0]):
+                        best = (delta, t, p)
+            if best is None:
+                continue
+            _, t, p = best
+            route.pop(pos)
+            routes[t].insert(p, stop)
+            route_of[stop] = t
+            route_load[r] -= load[stop]
+            route_load[t] += load[stop]
+            moved += 1
+        if not moved:
+            break
+    return [route for route in routes if route]
+
+
+def build_routes(
+    villages,
+    tankers,
+    capacity_liters: float = None,
+    radius_km: float = 500.0,
+    liters_per_person: float = assignment.LITERS_PER_PERSON,
+    max_stops: int = MAX_STOPS_PER_TRIP,
+    distances: DistanceCache = None,
+):
+    """Group villages into tanker trips.
+
+    villages is a list of dicts with village_id, latitude, longitude,
+    population and priority_score; tankers a list of (id, lat, lon,
+    capacity_liters) that may be used. Trips are loaded up to
+    capacity_liters, by default the median tanker capacity so most of the
+    fleet can carry any trip. Returns (trips, route_capacity); each trip is
+    a dict with tanker_id, load_liters, distance_km (from the tanker through
+    every stop) and stops, a list of (village_id, liters) in driving order.
+    """
+    if not villages or not tankers:
+        return [], 0.0
+    distances = distances or distance_cache
+    capacity = {int(t): float(cap or 0) for t, _, _, cap in tankers}
+    route_capacity = float(capacity_liters or np.median(list(capacity.values())))
+    if route_capacity <= 0:
+        return [], 0.0
+    index = spatial.TankerIndex()
+    index.load((t, lat, lon, True) for t, lat, lon, _ in tankers)
+
+    lat = np.array([v["latitude"] for v in villages], dtype=float)
+    lon = np.array([v["longitude"] for v in villages], dtype=float)
+    demand = np.array([(v["population"] or 0) * liters_per_person for v in villages], dtype=float)
+    full_loads = np.minimum(demand // route_capacity, assignment.MAX_TANKERS_PER_VILLAGE).astype(int)
+    # Villages already at the per-village cap get no extra partial load
+    remainder = np.where(full_loads < assignment.MAX_TANKERS_PER_VILLAGE, demand - full_loads * route_capacity, 0.0)
+
+    # Shared stops, each measured from its nearest tanker; unreachable ones are dropped
+    stops = np.flatnonzero(remainder > 0)
+    depot = np.full(len(stops), np.inf)
+    for s, i in enumerate(stops.tolist()):
+        _, dists = index.nearest(lat[i], lon[i], k=1, radius_km=radius_km)
+        if len(dists):
+            depot[s] = dists[0]
+    reachable = np.isfinite(depot)
+    stops, depot = stops[reachable], depot[reachable]
+    load = remainder[stops].tolist()
+
+    trips = []
+    if len(stops):
+        dist = distances.matrix([villages[i]["village_id"] for i in stops.tolist()], lat[stops], lon[stops])
+        masked = dist.copy()
+        np.fill_diagonal(masked, np.inf)
+        k = min(NEIGHBOURS, len(stops) - 1)
+        near = np.argpartition(masked, k - 1, axis=1)[:, :k] if k > 0 else np.empty((len(stops), 0), dtype=np.int64)
+        routes = _savings_routes(dist, depot, load, route_capacity, max_stops, near)
+        routes = [_two_opt(route, dist, depot) for route in routes]
+        routes = _relocate(routes, dist, depot, load, route_capacity, max_stops, near.tolist(), LOCAL_SEARCH_PASSES)
+        for route in routes:
+            route = _two_opt(route, dist, depot)
+            legs = [float(dist[u, v]) for u, v in zip(route, route[1:])]
+            trips.append(([int(stops[s]) for s in route], [load[s] for s in route], legs))
+    for i in np.flatnonzero(full_loads).tolist():
+        trips.extend(([i], [route_capacity], []) for _ in range(full_loads[i]))
+
+    def value(trip):
+        return sum(villages[i]["priority_score"] * q for i, q in zip(trip[0], trip[1]))
+
+    planned = []
+    for members, liters, legs in sorted(trips, key=value, reverse=True):
+        total = sum(liters)
+        best = None
+        for end in {0, len(members) - 1}:
+            pick = _nearest_tanker(index, lat[members[end]], lon[members[end]], radius_km, capacity, total)
+            if pick and (best is None or pick[1] < best[1]):
+                best = (pick[0], pick[1], end)
+        if best is None:
+            continue
+        tanker_id, tanker_km, end = best
+        index.set_available([tanker_id], False)
+        if end:
+            members, liters, legs = members[::-1], liters[::-1], legs[::-1]
+        # A smaller tanker (when no big enough one is left) drops the trip's tail
+        room = capacity[tanker_id]
+        served = []
+        for i, q in zip(members, liters):
+            if room <= 0:
+                break
+            served.append((villages[i]["village_id"], min(q, room)))
+            room -= q
+        planned.append({
+            "tanker_id": tanker_id,
+            "load_liters": sum(q for _, q in served),
+            "distance_km": float(tanker_km) + sum(legs[:len(served) - 1]),
+            "stops": served,
+        })
+    return planned, route_capacity
+
+
+def _nearest_tanker(index, lat, lon, radius_km, capacity, load):
+    """Nearest free tanker that can carry load, widening the search as needed.
+
+    If none in range can, the largest (then nearest) one is returned.
+    """
+    k = TANKER_CANDIDATES
+    while True:
+        ids, dists = index.nearest(lat, lon, k=k, radius_km=radius_km)
+        for tanker_id, km in zip(ids.tolist(), dists.tolist()):
+            if capacity[tanker_id] >= load - 1e-6:
+                return tanker_id, km
+        if len(ids) < k:
+            if not len(ids):
+                return None
+            largest = max(range(len(ids)), key=lambda j: (capacity[int(ids[j])], -dists[j]))
+            return int(ids[largest]), float(dists[largest])
+        k *= 4
+
+
+def plan_routes(
+    db: Session,
+    threshold: float = 7.0,
+    radius_km: float = 500.0,
+    capacity_liters: float = None,
+    dry_run: bool = True,
+):
+    """Plan multi-stop trips for every village above the stress threshold, reserving tankers unless dry_run."""
+    villages = assignment.stressed_villages(db, threshold)
+    fleet = db.query(
+        models.Tanker.id, models.Tanker.license_plate, models.Tanker.capacity_liters,
+        models.Tanker.current_latitude, models.Tanker.current_longitude,
+    ).filter(
+        models.Tanker.is_available == True,
+        models.Tanker.current_latitude.isnot(None),
+        models.Tanker.current_longitude.isnot(None),
+    ).all()
+    plates = {t_id: plate for t_id, plate, _, _, _ in fleet}
+    capacities = {t_id: cap or 0 for t_id, _, cap, _, _ in fleet}
+    ids = [t_id for t_id, _, _, _, _ in fleet]
+    lats, lons = positions.store.overlay(ids, [t[3] for t in fleet], [t[4] for t in fleet])
+
+    trips, route_capacity = build_routes(
+        villages,
+        [(t_id, lat, lon, capacities[t_id]) for t_id, lat, lon in zip(ids, lats.tolist(), lons.tolist())],
+        capacity_liters=capacity_liters,
+        radius_km=radius_km,
+    )
+    if not dry_run:
+        # A multi-stop tanker is assigned to its first stop
+        assignment.reserve_tankers(db, [trip["tanker_id"] for trip in trips], [trip["stops"][0][0] for trip in trips])
+
+    names = {v["village_id"]: v["village_name"] for v in villages}
+    delivered = collections.defaultdict(float)
+    for trip in trips:
+        for village_id, liters in trip["stops"]:
+            delivered[village_id] += liters
+    demand = sum((v["population"] or 0) * assignment.LITERS_PER_PERSON for v in villages)
+    return {
+        "dry_run": dry_run,
+        "route_capacity_liters": round(route_capacity),
+        "villages_considered": len(villages),
+        "villages_served": len(delivered),
+        "tankers_dispatched": len(trips),
+        "demand_liters": round(demand),
+        "delivered_liters": round(sum(delivered.values())),
+        "total_distance_km": round(sum(trip["distance_km"] for trip in trips), 1),
+        "unserved_village_ids": [v["village_id"] for v in villages if v["village_id"] not in delivered],
+        "trips": [
+            {
+                "license_plate": plates[trip["tanker_id"]],
+                "capacity_liters": capacities[trip["tanker_id"]],
+                "load_liters": round(trip["load_liters"]),
+                "distance_km": round(trip["distance_km"], 1),
+                "stops": [
+                    {"village_id": village_id, "village_name": names[village_id], "liters": round(liters)}
+                    for village_id, liters in trip["stops"]
+                ],
+            }
+            for trip in trips
+        ],
+    }
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import datetime
 
@@ -45,6 +45,18 @@ class TankerBase(BaseModel):
 class TankerCreate(TankerBase):
     pass
 
+class TankerRelease(BaseModel):
+    # Where the tanker is when it returns to service
+    latitude: float
+    longitude: float
+
+class TankerPing(BaseModel):
+    # One GPS fix; recorded_at defaults to when the batch arrives (naive times are UTC)
+    tanker_id: int
+    latitude: float
+    longitude: float
+    recorded_at: Optional[datetime.datetime] = None
+
 class TankerResponse(TankerBase):
     id: int
     is_available: bool
@@ -53,3 +65,17 @@ class TankerResponse(TankerBase):
 
     class Config:
         from_attributes = True
+
+# --- Stress Schemas ---
+class StressScenario(BaseModel):
+    # Fields left out keep the current model's value (null removes a cap); see backend.stress
+    rain_factor: Optional[float] = Field(None, ge=0)
+    rain_cap: Optional[float] = Field(None, ge=0)
+    groundwater_factor: Optional[float] = Field(None, ge=0)
+    groundwater_cap: Optional[float] = Field(None, ge=0)
+    max_stress: Optional[float] = Field(None, gt=0)
+    population_scale: Optional[float] = Field(None, gt=0)
+    max_priority: Optional[float] = Field(None, gt=0)
+    # Band thresholds; default to the dashboard's (live.STRESS_BANDS)
+    critical: Optional[float] = None
+    warning: Optional[float] = None
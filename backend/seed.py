@@ -1,157 +1,288 @@
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal, engine
-from backend import models
-import random
+"""Seed the database with villages, rainfall-derived water readings and tankers.
+
+    python -m backend.seed                                   # built-in sample set
+    python -m backend.seed --villages villages.csv --tankers tankers.json
+    python -m backend.seed --record fixtures/rainfall        # save archive responses
+    python -m backend.seed --fixtures fixtures/rainfall      # replay them offline
+
+Rainfall for every village is synced into the local archive (backend.rainfall)
+concurrently, with timeouts and retries, before anything is written; only
+days the archive does not already hold are fetched. All rows are then
+inserted in a single transaction. Villages that already carry
+rainfall_deviation_mm (and optionally groundwater_level_m) in the input file
+are not fetched at all, which is how large synthetic datasets are seeded.
+--record and --fixtures use a throwaway in-memory archive, so requests match
+the recorded windows.
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import math
+import os
+
+from backend.database import SessionLocal, engine, bulk_insert
+from backend import cache, live, models, openmeteo, rainfall, regions, rollups, stress
+
+VILLAGES = [
+    # Original Pilot Villages
+    {"name": "Pune", "district": "Maharashtra", "population": 3124000, "latitude": 18.5204, "longitude": 73.8567},
+    {"name": "Karjat", "district": "Raigad", "population": 3800, "latitude": 18.9102, "longitude": 73.3283},
+    {"name": "Khalapur", "district": "Raigad", "population": 6200, "latitude": 18.8267, "longitude": 73.2844},
+    {"name": "Lonavala (Rural)", "district": "Pune", "population": 1500, "latitude": 18.7516, "longitude": 73.4039},
+    {"name": "Rampur", "district": "Pune", "population": 4500, "latitude": 18.5204, "longitude": 73.8567},
+    {"name": "Shivapur", "district": "Pune", "population": 2100, "latitude": 18.3323, "longitude": 73.8687},
+
+    # North India
+    {"name": "Delhi", "district": "Delhi", "population": 16787000, "latitude": 28.7041, "longitude": 77.1025},
+    {"name": "Chandigarh", "district": "Chandigarh", "population": 1055000, "latitude": 30.7333, "longitude": 76.7794},
+    {"name": "Srinagar", "district": "Jammu & Kashmir", "population": 1183000, "latitude": 34.0837, "longitude": 74.7973},
+    {"name": "Amritsar", "district": "Punjab", "population": 1132000, "latitude": 31.6340, "longitude": 74.8723},
+    {"name": "Shimla", "district": "Himachal Pradesh", "population": 169000, "latitude": 31.1048, "longitude": 77.1734},
+    {"name": "Dehradun", "district": "Uttarakhand", "population": 578000, "latitude": 30.3165, "longitude": 78.0322},
+
+    # West & Central
+    {"name": "Mumbai", "district": "Maharashtra", "population": 12442000, "latitude": 19.0760, "longitude": 72.8777},
+    {"name": "Surat", "district": "Gujarat", "population": 4466000, "latitude": 21.1702, "longitude": 72.8311},
+    {"name": "Ahmedabad", "district": "Gujarat", "population": 5570000, "latitude": 23.0225, "longitude": 72.5714},
+    {"name": "Rajkot", "district": "Gujarat", "population": 1390000, "latitude": 22.3039, "longitude": 70.8022},
+    {"name": "Bhopal", "district": "Madhya Pradesh", "population": 1798000, "latitude": 23.2599, "longitude": 77.4126},
+    {"name": "Indore", "district": "Madhya Pradesh", "population": 1960000, "latitude": 22.7196, "longitude": 75.8577},
+    {"name": "Gwalior", "district": "Madhya Pradesh", "population": 1054000, "latitude": 26.2183, "longitude": 78.1828},
+    {"name": "Jaipur", "district": "Rajasthan", "population": 3046000, "latitude": 26.9124, "longitude": 75.7873},
+    {"name": "Jodhpur", "district": "Rajasthan", "population": 1033000, "latitude": 26.2389, "longitude": 73.0243},
+    {"name": "Udaipur", "district": "Rajasthan", "population": 451000, "latitude": 24.5854, "longitude": 73.7125},
+
+    # East & North-East
+    {"name": "Kolkata", "district": "West Bengal", "population": 4496000, "latitude": 22.5726, "longitude": 88.3639},
+    {"name": "Darjeeling", "district": "West Bengal", "population": 118000, "latitude": 27.0360, "longitude": 88.2627},
+    {"name": "Patna", "district": "Bihar", "population": 2046000, "latitude": 25.5941, "longitude": 85.1376},
+    {"name": "Gaya", "district": "Bihar", "population": 474000, "latitude": 24.7964, "longitude": 84.9914},
+    {"name": "Bhubaneswar", "district": "Odisha", "population": 841000, "latitude": 20.2961, "longitude": 85.8245},
+    {"name": "Guwahati", "district": "Assam", "population": 962000, "latitude": 26.1445, "longitude": 91.7362},
+    {"name": "Shillong", "district": "Meghalaya", "population": 143000, "latitude": 25.5788, "longitude": 91.8933},
+
+    # South
+    {"name": "Bengaluru", "district": "Karnataka", "population": 8443000, "latitude": 12.9716, "longitude": 77.5946},
+    {"name": "Mysuru", "district": "Karnataka", "population": 920000, "latitude": 12.2958, "longitude": 76.6394},
+    {"name": "Chennai", "district": "Tamil Nadu", "population": 7088000, "latitude": 13.0827, "longitude": 80.2707},
+    {"name": "Madurai", "district": "Tamil Nadu", "population": 1017000, "latitude": 9.9252, "longitude": 78.1198},
+    {"name": "Coimbatore", "district": "Tamil Nadu", "population": 1601000, "latitude": 11.0168, "longitude": 76.9558},
+    {"name": "Hyderabad", "district": "Telangana", "population": 6993000, "latitude": 17.3850, "longitude": 78.4867},
+    {"name": "Visakhapatnam", "district": "Andhra Pradesh", "population": 2035000, "latitude": 17.6868, "longitude": 83.2185},
+    {"name": "Kochi", "district": "Kerala", "population": 602000, "latitude": 9.9312, "longitude": 76.2673},
+    {"name": "Thiruvananthapuram", "district": "Kerala", "population": 743000, "latitude": 8.5241, "longitude": 76.9366},
+
+    # High-Rainfall Regions (expected GREEN — Northeast Monsoon / Western Ghats)
+    {"name": "Cherrapunji", "district": "Meghalaya", "population": 11000, "latitude": 25.2744, "longitude": 91.7323},
+    {"name": "Mawsynram", "district": "Meghalaya", "population": 6800, "latitude": 25.2957, "longitude": 91.5830},
+    {"name": "Panaji", "district": "Goa", "population": 114000, "latitude": 15.4909, "longitude": 73.8278},
+    {"name": "Mangaluru", "district": "Karnataka", "population": 623000, "latitude": 12.9141, "longitude": 74.8560},
+    {"name": "Kozhikode", "district": "Kerala", "population": 609000, "latitude": 11.2588, "longitude": 75.7804},
+    {"name": "Port Blair", "district": "Andaman & Nicobar", "population": 100600, "latitude": 11.6234, "longitude": 92.7265},
+]
+
+TANKERS = [
+    # Maharashtra (Near Pune/Mumbai)
+    {"license_plate": "MH-12-AB-1234", "capacity_liters": 10000, "is_available": True, "current_latitude": 18.5204, "current_longitude": 73.8567},
+    {"license_plate": "MH-12-XY-9876", "capacity_liters": 15000, "is_available": True, "current_latitude": 19.0760, "current_longitude": 72.8777},
+    {"license_plate": "MH-14-GH-5555", "capacity_liters": 8000,  "is_available": True, "current_latitude": 18.9102, "current_longitude": 73.3283},
+    # Madhya Pradesh (Near Bhopal/Indore)
+    {"license_plate": "MP-09-AA-0001", "capacity_liters": 10000, "is_available": True, "current_latitude": 23.2599, "current_longitude": 77.4126},
+    {"license_plate": "MP-09-BB-0002", "capacity_liters": 12000, "is_available": True, "current_latitude": 22.7196, "current_longitude": 75.8577},
+    # Rajasthan (Near Jaipur)
+    {"license_plate": "RJ-14-CC-1111", "capacity_liters": 10000, "is_available": True, "current_latitude": 26.9124, "current_longitude": 75.7873},
+    {"license_plate": "RJ-14-DD-2222", "capacity_liters": 15000, "is_available": True, "current_latitude": 26.2389, "current_longitude": 73.0243},
+    # Gujarat (Near Ahmedabad)
+    {"license_plate": "GJ-01-EE-3333", "capacity_liters": 10000, "is_available": True, "current_latitude": 23.0225, "current_longitude": 72.5714},
+    # Karnataka (Near Bengaluru)
+    {"license_plate": "KA-01-FF-4444", "capacity_liters": 10000, "is_available": True, "current_latitude": 12.9716, "current_longitude": 77.5946},
+    # Uttar Pradesh (Near Lucknow)
+    {"license_plate": "UP-32-GG-5555", "capacity_liters": 12000, "is_available": True, "current_latitude": 26.8467, "current_longitude": 80.9462},
+    # Delhi
+    {"license_plate": "DL-01-HH-6666", "capacity_liters": 8000,  "is_available": True, "current_latitude": 28.7041, "current_longitude": 77.1025},
+    # Tamil Nadu (Near Chennai)
+    {"license_plate": "TN-01-II-7777", "capacity_liters": 10000, "is_available": True, "current_latitude": 13.0827, "current_longitude": 80.2707},
+]
+
+
+# Annual total rainfall vs India's average annual rainfall (~800mm)
+# Wet cities (Cherrapunji=11000mm, Goa=2900mm) → low stress (GREEN)
+# Dry cities (Jaipur=350mm, Delhi=800mm) → high stress (RED/AMBER)
+INDIA_ANNUAL_AVG_MM = 800.0
+
+FIELD_TYPES = {
+    "population": int,
+    "latitude": float,
+    "longitude": float,
+    "rainfall_deviation_mm": float,
+    "groundwater_level_m": float,
+    "capacity_liters": int,
+    "current_latitude": float,
+    "current_longitude": float,
+    "is_available": lambda v: str(v).strip().lower() in ("1", "true", "yes"),
+}
+
+
+def load_records(path):
+    """Read a list of records from a .json (array of objects) or .csv file."""
+    with open(path, newline="") as f:
+        if path.endswith(".json"):
+            records = json.load(f)
+        else:
+            records = list(csv.DictReader(f))
+    return [
+        {k: FIELD_TYPES[k](v) if k in FIELD_TYPES and isinstance(v, str) else v
+         for k, v in record.items() if v not in ("", None)}
+        for record in records
+    ]
+
+
+def water_reading(rain_dev, gw_level=None):
+    """Derive (groundwater_level_m, stress_index) from the annual rainfall deviation, with the current stress model."""
+    if gw_level is None:
+        # Groundwater deplets inversely with rain deficit
+        gw_level = 15.0 + max(0, (-rain_dev * 0.005))
+
+    return gw_level, stress.current_model().stress(rain_dev, gw_level)
+
+
+async def fetch_rainfall_deviations(villages, store, client, start_date, end_date, concurrency=8, retries=2):
+    """Return each village's annual rainfall deviation (mm), or None where it could not be fetched."""
+    pending = [v for v in villages if "rainfall_deviation_mm" not in v]
+    points = [(v["latitude"], v["longitude"]) for v in pending]
+    # Only days missing from the local archive are fetched
+    failures = await store.sync(points, start_date, end_date, client, concurrency, retries)
+    for v in pending:
+        error = failures.get(rainfall.location_key(v["latitude"], v["longitude"]))
+        if error is not None:
+            print(f"API Error for {v['name']}: {error}")
+    # A failed fetch still counts if the archive already held (nearly) the whole year
+    totals = iter(store.totals(points, start_date, end_date).tolist())
+    deviations = []
+    for v in villages:
+        if "rainfall_deviation_mm" in v:
+            deviations.append(v["rainfall_deviation_mm"])
+        else:
+            total = next(totals)
+            deviations.append(None if math.isnan(total) else total - INDIA_ANNUAL_AVG_MM)
+    return deviations
+
+
+def seed_db(villages=VILLAGES, tankers=TANKERS, transport=None, end_date=None,
+            concurrency=8, timeout_s=20.0, retries=2, store=None):
+    # Using annual comparison vs 90-day to correctly handle dry winter season
+    end_date = end_date or datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=365)
+    store = store or rainfall.get_store()
+
+    async def fetch_all():
+        # Cache only needs to cover duplicate coordinates within this run
+        client = openmeteo.RainfallClient(transport=transport, timeout_s=timeout_s, max_entries=64)
+        try:
+            return await fetch_rainfall_deviations(villages, store, client, start_date, end_date, concurrency, retries)
+        finally:
+            await client.aclose()
+
+    models.create_schema(engine)
+    deviations = asyncio.run(fetch_all())
+    failed = sum(1 for d in deviations if d is None)
+    print(f"Rainfall ready for {len(villages) - failed}/{len(villages)} villages.")
+
+    now = datetime.datetime.utcnow()
+    village_rows = [
+        (v["name"], v["district"], v["population"], v["latitude"], v["longitude"]) for v in villages
+    ]
+    readings = [
+        (0.0 if rain_dev is None else rain_dev,) + water_reading(0.0 if rain_dev is None else rain_dev, v.get("groundwater_level_m"))
+        for v, rain_dev in zip(villages, deviations)
+    ]
+    tanker_rows = [
+        (t["license_plate"], t["capacity_liters"], t.get("is_available", True),
+         t.get("current_latitude"), t.get("current_longitude"))
+        for t in tankers
+    ]
 
-def seed_db():
     db = SessionLocal()
-    
-    # Check if we already have data, if so, clear it for a fresh seed
-    if db.query(models.Village).first():
-        print("Clearing old local database records...")
+    try:
+        # Clear old records for a fresh seed
+        db.query(models.ForecastRun).delete()
+        db.query(models.VillageStatus).delete()
+        db.query(models.WaterDataRollup).delete()
         db.query(models.WaterData).delete()
         db.query(models.Tanker).delete()
         db.query(models.Village).delete()
+        bulk_insert(db, models.Village.__table__,
+                    ("name", "district", "population", "latitude", "longitude"), village_rows)
+        # The table was just emptied, so ids come back in insertion order
+        village_ids = [row[0] for row in db.query(models.Village.id).order_by(models.Village.id)]
+        water_rows = [
+            (village_id, now, rain_dev, gw_level, stress_index)
+            for village_id, (rain_dev, gw_level, stress_index) in zip(village_ids, readings)
+        ]
+        status_rows = [
+            (village_id, now, stress_index, stress.current_model().priority(stress_index, v["population"]), rain_dev, gw_level)
+            for village_id, v, (rain_dev, gw_level, stress_index) in zip(village_ids, villages, readings)
+        ]
+        bulk_insert(db, models.WaterData.__table__,
+                    ("village_id", "record_date", "rainfall_deviation_mm", "groundwater_level_m", "stress_index"),
+                    water_rows)
+        rollups.add_readings(db, *zip(*((v, d, stress_index, rain, gw) for v, d, rain, gw, stress_index in water_rows)))
+        bulk_insert(db, models.VillageStatus.__table__,
+                    ("village_id", "record_date", "stress_index", "priority_score",
+                     "rainfall_deviation_mm", "groundwater_level_m"), status_rows)
+        bulk_insert(db, models.Tanker.__table__,
+                    ("license_plate", "capacity_liters", "is_available", "current_latitude", "current_longitude"),
+                    tanker_rows)
+        regions.rebuild(db)
+        cache.bump_history_generation(db)
+        cache.bump_version(db)
+        stress.record_history(db)
+        live.queue_event(db, "reset", {"tankers": True})
         db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
-    villages_data = [
-        # Original Pilot Villages
-        {"name": "Pune", "district": "Maharashtra", "population": 3124000, "latitude": 18.5204, "longitude": 73.8567},
-        {"name": "Karjat", "district": "Raigad", "population": 3800, "latitude": 18.9102, "longitude": 73.3283},
-        {"name": "Khalapur", "district": "Raigad", "population": 6200, "latitude": 18.8267, "longitude": 73.2844},
-        {"name": "Lonavala (Rural)", "district": "Pune", "population": 1500, "latitude": 18.7516, "longitude": 73.4039},
-        {"name": "Rampur", "district": "Pune", "population": 4500, "latitude": 18.5204, "longitude": 73.8567},
-        {"name": "Shivapur", "district": "Pune", "population": 2100, "latitude": 18.3323, "longitude": 73.8687},
-        
-        # North India
-        {"name": "Delhi", "district": "Delhi", "population": 16787000, "latitude": 28.7041, "longitude": 77.1025},
-        {"name": "Chandigarh", "district": "Chandigarh", "population": 1055000, "latitude": 30.7333, "longitude": 76.7794},
-        {"name": "Srinagar", "district": "Jammu & Kashmir", "population": 1183000, "latitude": 34.0837, "longitude": 74.7973},
-        {"name": "Amritsar", "district": "Punjab", "population": 1132000, "latitude": 31.6340, "longitude": 74.8723},
-        {"name": "Shimla", "district": "Himachal Pradesh", "population": 169000, "latitude": 31.1048, "longitude": 77.1734},
-        {"name": "Dehradun", "district": "Uttarakhand", "population": 578000, "latitude": 30.3165, "longitude": 78.0322},
-
-        # West & Central
-        {"name": "Mumbai", "district": "Maharashtra", "population": 12442000, "latitude": 19.0760, "longitude": 72.8777},
-        {"name": "Surat", "district": "Gujarat", "population": 4466000, "latitude": 21.1702, "longitude": 72.8311},
-        {"name": "Ahmedabad", "district": "Gujarat", "population": 5570000, "latitude": 23.0225, "longitude": 72.5714},
-        {"name": "Rajkot", "district": "Gujarat", "population": 1390000, "latitude": 22.3039, "longitude": 70.8022},
-        {"name": "Bhopal", "district": "Madhya Pradesh", "population": 1798000, "latitude": 23.2599, "longitude": 77.4126},
-        {"name": "Indore", "district": "Madhya Pradesh", "population": 1960000, "latitude": 22.7196, "longitude": 75.8577},
-        {"name": "Gwalior", "district": "Madhya Pradesh", "population": 1054000, "latitude": 26.2183, "longitude": 78.1828},
-        {"name": "Jaipur", "district": "Rajasthan", "population": 3046000, "latitude": 26.9124, "longitude": 75.7873},
-        {"name": "Jodhpur", "district": "Rajasthan", "population": 1033000, "latitude": 26.2389, "longitude": 73.0243},
-        {"name": "Udaipur", "district": "Rajasthan", "population": 451000, "latitude": 24.5854, "longitude": 73.7125},
-
-        # East & North-East
-        {"name": "Kolkata", "district": "West Bengal", "population": 4496000, "latitude": 22.5726, "longitude": 88.3639},
-        {"name": "Darjeeling", "district": "West Bengal", "population": 118000, "latitude": 27.0360, "longitude": 88.2627},
-        {"name": "Patna", "district": "Bihar", "population": 2046000, "latitude": 25.5941, "longitude": 85.1376},
-        {"name": "Gaya", "district": "Bihar", "population": 474000, "latitude": 24.7964, "longitude": 84.9914},
-        {"name": "Bhubaneswar", "district": "Odisha", "population": 841000, "latitude": 20.2961, "longitude": 85.8245},
-        {"name": "Guwahati", "district": "Assam", "population": 962000, "latitude": 26.1445, "longitude": 91.7362},
-        {"name": "Shillong", "district": "Meghalaya", "population": 143000, "latitude": 25.5788, "longitude": 91.8933},
-
-        # South
-        {"name": "Bengaluru", "district": "Karnataka", "population": 8443000, "latitude": 12.9716, "longitude": 77.5946},
-        {"name": "Mysuru", "district": "Karnataka", "population": 920000, "latitude": 12.2958, "longitude": 76.6394},
-        {"name": "Chennai", "district": "Tamil Nadu", "population": 7088000, "latitude": 13.0827, "longitude": 80.2707},
-        {"name": "Madurai", "district": "Tamil Nadu", "population": 1017000, "latitude": 9.9252, "longitude": 78.1198},
-        {"name": "Coimbatore", "district": "Tamil Nadu", "population": 1601000, "latitude": 11.0168, "longitude": 76.9558},
-        {"name": "Hyderabad", "district": "Telangana", "population": 6993000, "latitude": 17.3850, "longitude": 78.4867},
-        {"name": "Visakhapatnam", "district": "Andhra Pradesh", "population": 2035000, "latitude": 17.6868, "longitude": 83.2185},
-        {"name": "Kochi", "district": "Kerala", "population": 602000, "latitude": 9.9312, "longitude": 76.2673},
-        {"name": "Thiruvananthapuram", "district": "Kerala", "population": 743000, "latitude": 8.5241, "longitude": 76.9366},
-
-        # High-Rainfall Regions (expected GREEN — Northeast Monsoon / Western Ghats)
-        {"name": "Cherrapunji", "district": "Meghalaya", "population": 11000, "latitude": 25.2744, "longitude": 91.7323},
-        {"name": "Mawsynram", "district": "Meghalaya", "population": 6800, "latitude": 25.2957, "longitude": 91.5830},
-        {"name": "Panaji", "district": "Goa", "population": 114000, "latitude": 15.4909, "longitude": 73.8278},
-        {"name": "Mangaluru", "district": "Karnataka", "population": 623000, "latitude": 12.9141, "longitude": 74.8560},
-        {"name": "Kozhikode", "district": "Kerala", "population": 609000, "latitude": 11.2588, "longitude": 75.7804},
-        {"name": "Port Blair", "district": "Andaman & Nicobar", "population": 100600, "latitude": 11.6234, "longitude": 92.7265},
-    ]
+    print(f"Database seeded with {len(village_rows)} villages, {len(water_rows)} water readings and {len(tanker_rows)} tankers.")
 
-    for v_data in villages_data:
-        village = models.Village(**v_data)
-        db.add(village)
-        db.commit()
-        db.refresh(village)
-        
-        # Add a water data reading for each
-        # Fetch REAL historical rainfall data from Open-Meteo (past 12 months)
-        # Using annual comparison vs 90-day to correctly handle dry winter season
-        import requests
-        from datetime import datetime, timedelta
 
-        end_date = datetime.now().strftime("%Y-%m-%d")
-        start_date = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+def main():
+    parser = argparse.ArgumentParser(description="Seed the drought database.")
+    parser.add_argument("--villages", help="JSON or CSV file of villages (default: built-in sample set)")
+    parser.add_argument("--tankers", help="JSON or CSV file of tankers (default: built-in sample fleet)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--fixtures", metavar="DIR", help="Replay recorded archive responses from DIR (offline)")
+    mode.add_argument("--record", metavar="DIR", help="Save archive responses to DIR for later --fixtures runs")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat,
+                        help="Last day of the rainfall window (default: today, or the recorded date with --fixtures)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=20.0, help="Per-request timeout in seconds")
+    parser.add_argument("--retries", type=int, default=2)
+    args = parser.parse_args()
 
-        try:
-            url = f"https://archive-api.open-meteo.com/v1/archive?latitude={v_data['latitude']}&longitude={v_data['longitude']}&start_date={start_date}&end_date={end_date}&daily=precipitation_sum&timezone=auto"
-            response = requests.get(url)
-            weather_data = response.json()
-
-            # Annual total rainfall vs India's average annual rainfall (~800mm)
-            # Wet cities (Cherrapunji=11000mm, Goa=2900mm) → low stress (GREEN)
-            # Dry cities (Jaipur=350mm, Delhi=800mm) → high stress (RED/AMBER)
-            total_rain = sum([r for r in weather_data['daily']['precipitation_sum'] if r is not None])
-            india_annual_avg = 800.0
-            rain_dev = total_rain - india_annual_avg
-
-            # Groundwater deplets inversely with rain deficit
-            gw_level = 15.0 + max(0, (-rain_dev * 0.005))
-
-        except Exception as e:
-            print(f"API Error for {v_data['name']}: {e}")
-            rain_dev = 0.0
-            gw_level = 15.0
-
-        # Stress formula: negative deviation → high stress, positive → low
-        rain_stress = max(0, min(8.0, -rain_dev * 0.008))
-        gw_stress = max(0, min(2.0, gw_level * 0.1))
-        total_stress = min(10.0, round(rain_stress + gw_stress, 2))
-        
-        water_data = models.WaterData(
-            village_id=village.id,
-            rainfall_deviation_mm=rain_dev,
-            groundwater_level_m=gw_level,
-            stress_index=total_stress
-        )
-        db.add(water_data)
-        db.commit()
+    villages = load_records(args.villages) if args.villages else VILLAGES
+    tankers = load_records(args.tankers) if args.tankers else TANKERS
+    end_date = args.end_date
+    transport = None
+    if args.fixtures:
+        transport = openmeteo.ReplayTransport(args.fixtures)
+        if end_date is None:
+            with open(os.path.join(args.fixtures, "manifest.json")) as f:
+                end_date = datetime.date.fromisoformat(json.load(f)["end_date"])
+    elif args.record:
+        transport = openmeteo.RecordingTransport(args.record)
+        end_date = end_date or datetime.date.today()
+        with open(os.path.join(args.record, "manifest.json"), "w") as f:
+            json.dump({"end_date": end_date.isoformat()}, f)
 
-    # Add some tankers
-    # Add a geographically spread tanker fleet across India
-    tankers = [
-        # Maharashtra (Near Pune/Mumbai)
-        {"license_plate": "MH-12-AB-1234", "capacity_liters": 10000, "is_available": True, "current_latitude": 18.5204, "current_longitude": 73.8567},
-        {"license_plate": "MH-12-XY-9876", "capacity_liters": 15000, "is_available": True, "current_latitude": 19.0760, "current_longitude": 72.8777},
-        {"license_plate": "MH-14-GH-5555", "capacity_liters": 8000,  "is_available": True, "current_latitude": 18.9102, "current_longitude": 73.3283},
-        # Madhya Pradesh (Near Bhopal/Indore)
-        {"license_plate": "MP-09-AA-0001", "capacity_liters": 10000, "is_available": True, "current_latitude": 23.2599, "current_longitude": 77.4126},
-        {"license_plate": "MP-09-BB-0002", "capacity_liters": 12000, "is_available": True, "current_latitude": 22.7196, "current_longitude": 75.8577},
-        # Rajasthan (Near Jaipur)
-        {"license_plate": "RJ-14-CC-1111", "capacity_liters": 10000, "is_available": True, "current_latitude": 26.9124, "current_longitude": 75.7873},
-        {"license_plate": "RJ-14-DD-2222", "capacity_liters": 15000, "is_available": True, "current_latitude": 26.2389, "current_longitude": 73.0243},
-        # Gujarat (Near Ahmedabad)
-        {"license_plate": "GJ-01-EE-3333", "capacity_liters": 10000, "is_available": True, "current_latitude": 23.0225, "current_longitude": 72.5714},
-        # Karnataka (Near Bengaluru)
-        {"license_plate": "KA-01-FF-4444", "capacity_liters": 10000, "is_available": True, "current_latitude": 12.9716, "current_longitude": 77.5946},
-        # Uttar Pradesh (Near Lucknow)
-        {"license_plate": "UP-32-GG-5555", "capacity_liters": 12000, "is_available": True, "current_latitude": 26.8467, "current_longitude": 80.9462},
-        # Delhi
-        {"license_plate": "DL-01-HH-6666", "capacity_liters": 8000,  "is_available": True, "current_latitude": 28.7041, "current_longitude": 77.1025},
-        # Tamil Nadu (Near Chennai)
-        {"license_plate": "TN-01-II-7777", "capacity_liters": 10000, "is_available": True, "current_latitude": 13.0827, "current_longitude": 80.2707},
-    ]
-    for t_data in tankers:
-        tanker = models.Tanker(**t_data)
-        db.add(tanker)
-        db.commit()
+    seed_db(villages, tankers, transport=transport, end_date=end_date,
+            concurrency=args.concurrency, timeout_s=args.timeout, retries=args.retries,
+            store=rainfall.RainfallStore() if transport else None)
 
-    print("Database seeded with sample villages, water data, and tankers.")
-    db.close()
 
 if __name__ == "__main__":
-    seed_db()
+    main()
@@ -0,0 +1,70 @@
+"""Fast JSON encoding and streamed list bodies.
+
+dumps() encodes with orjson when it is installed and falls back to the
+standard library otherwise. Both produce the same compact output: NumPy
+values become plain numbers and lists, NaN and infinite floats become null
+(orjson's behaviour; the fallback replaces them before encoding), and
+anything else (dates, Pydantic models) goes through FastAPI's
+jsonable_encoder. stream_list() encodes
+batches of items as they arrive, either into one JSON array or as NDJSON
+(one item per line). A StreamingResponse over a yield_per query therefore
+holds one batch of rows at a time, however many it sends.
+"""
+import json
+import math
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is used instead
+    orjson = None
+
+MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+# Rows fetched and encoded per chunk of a streamed response
+STREAM_BATCH = 2000
+
+
+def _default(value):
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return jsonable_encoder(value)
+
+
+def _finite(value):
+    """value with NaN and infinite floats, at any depth, replaced by None."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps(content) -> bytes:
+    """Compact UTF-8 JSON, encoded the way FastAPI's JSONResponse would."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        _finite(content), default=lambda value: _finite(_default(value)), ensure_ascii=False, allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def stream_list(batches, fmt: str = "json"):
+    """Yield the body of a JSON array (or NDJSON) of the items in batches, one chunk per non-empty batch."""
+    if fmt == "ndjson":
+        for batch in batches:
+            if batch:
+                yield b"".join(dumps(item) + b"\n" for item in batch)
+        return
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        # Encode the batch as one array and splice its items into the open one
+        yield (b"[" if first else b",") + dumps(batch)[1:-1]
+        first = False
+    yield b"[]" if first else b"]"
@@ -0,0 +1,314 @@
+"""In-process spatial index over tanker positions.
+
+Tankers are bucketed into fixed-size lat/lon grid cells. Cell codes are kept
+sorted so a radius query only touches the contiguous slices of the cells that
+overlap the query's bounding box, and distances are computed with a NumPy
+vectorized haversine over those candidates.
+"""
+import math
+import threading
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend import models
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.195
+
+# ~1 degree cells keep a 500 km dispatch radius to roughly a hundred cells
+CELL_DEG = 1.0
+_NO_CELL = np.iinfo(np.int64).max
+
+
+def haversine_km_vec(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized great-circle distance in km from one point to many."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons) - math.radians(lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_km_matrix(lats_a, lons_a, lats_b, lons_b) -> np.ndarray:
+    """Great-circle distances in km between every point of a (rows) and b (columns)."""
+    phi1 = np.radians(np.asarray(lats_a, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(lats_b, dtype=float))[None, :]
+    dlambda = np.radians(np.asarray(lons_b, dtype=float))[None, :] - np.radians(np.asarray(lons_a, dtype=float))[:, None]
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a radius around a point.
+
+    Longitudes are not wrapped: a box crossing the antimeridian extends past
+    +/-180, and a box touching a pole spans every longitude.
+    """
+    dlat = radius_km / KM_PER_DEG_LAT
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(lat))))
+    if dlon >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+
+def parse_bbox(text: str):
+    """Parse "min_lon,min_lat,max_lon,max_lat" (Leaflet's toBBoxString) into floats.
+
+    Longitudes are wrapped into [-180, 180], so min_lon > max_lon means the
+    box crosses the antimeridian. Raises ValueError on malformed input.
+    """
+    parts = [float(p) for p in text.split(",")]
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox minimums must not exceed its maximums")
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    if max_lon - min_lon >= 360:
+        return -180.0, min_lat, 180.0, max_lat
+    return _wrap_lon(min_lon), min_lat, _wrap_lon(max_lon), max_lat
+
+
+def _wrap_lon(lon: float) -> float:
+    return lon if -180.0 <= lon <= 180.0 else (lon + 180.0) % 360.0 - 180.0
+
+
+class TankerIndex:
+    """Grid index of tanker positions and availability, safe to share across threads."""
+
+    def __init__(self, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self.n_rows = int(math.ceil(180 / cell_deg)) + 1
+        self.n_cols = int(math.ceil(360 / cell_deg))
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Drop all entries; the index is reloaded from the database on next use."""
+        with self._lock:
+            self.loaded = False
+            self._slots = {}  # tanker id -> slot
+            self._free = []
+            self._size = 0
+            self._ids = np.full(0, -1, dtype=np.int64)
+            self._lat = np.empty(0)
+            self._lon = np.empty(0)
+            self._available = np.zeros(0, dtype=bool)
+            self._codes = np.full(0, _NO_CELL, dtype=np.int64)
+            self._order = None  # slots sorted by cell code, rebuilt lazily
+            self._sorted_codes = None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def load(self, rows):
+        """Bulk (re)load from an iterable of (id, lat, lon, is_available) tuples."""
+        with self._lock:
+            self.reset()
+            rows = list(rows)
+            n = len(rows)
+            self._grow(n)
+            for slot, (tanker_id, lat, lon, available) in enumerate(rows):
+                self._slots[tanker_id] = slot
+                self._ids[slot] = tanker_id
+                self._lat[slot] = np.nan if lat is None else lat
+                self._lon[slot] = np.nan if lon is None else lon
+                self._available[slot] = bool(available)
+            self._size = n
+            self._codes[:n] = self._cell_codes(self._lat[:n], self._lon[:n])
+            self.loaded = True
+
+    def upsert(self, tanker_id: int, lat, lon, is_available: bool):
+        with self._lock:
+            slot = self._slots.get(tanker_id)
+            fresh = slot is None
+            if fresh:
+                slot = self._alloc(tanker_id)
+            lat = np.nan if lat is None else lat
+            lon = np.nan if lon is None else lon
+            # A reused slot still holds _NO_CELL, so always code a new tanker's position
+            if fresh or not (self._lat[slot] == lat and self._lon[slot] == lon):
+                self._lat[slot] = lat
+                self._lon[slot] = lon
+                self._codes[slot] = self._cell_codes(np.array([lat]), np.array([lon]))[0]
+                self._order = None
+            self._available[slot] = bool(is_available)
+
+    def move(self, tanker_ids, lats: np.ndarray, lons: np.ndarray):
+        """Update the positions of indexed tankers in bulk (GPS pings); unknown ids are ignored."""
+        with self._lock:
+            slots = np.array([self._slots.get(t, -1) for t in tanker_ids], dtype=np.int64)
+            known = slots >= 0
+            slots = slots[known]
+            if not len(slots):
+                return
+            self._lat[slots] = lats[known]
+            self._lon[slots] = lons[known]
+            self._codes[slots] = self._cell_codes(self._lat[slots], self._lon[slots])
+            self._order = None
+
+    def remove(self, tanker_id: int):
+        with self._lock:
+            slot = self._slots.pop(tanker_id, None)
+            if slot is None:
+                return
+            self._ids[slot] = -1
+            self._available[slot] = False
+            self._lat[slot] = self._lon[slot] = np.nan
+            self._codes[slot] = _NO_CELL
+            self._free.append(slot)
+            self._order = None
+
+    def set_available(self, tanker_ids, is_available: bool):
+        with self._lock:
+            slots = [self._slots[t] for t in tanker_ids if t in self._slots]
+            self._available[slots] = is_available
+
+    def within_radius(self, lat: float, lon: float, radius_km: float, available_only: bool = True):
+        """Return (tanker_ids, distances_km) within radius_km, nearest first."""
+        with self._lock:
+            slots = self._candidate_slots(lat, lon, radius_km)
+            if available_only:
+                slots = slots[self._available[slots]]
+            dists = haversine_km_vec(lat, lon, self._lat[slots], self._lon[slots])
+            keep = dists <= radius_km
+            slots, dists = slots[keep], dists[keep]
+            order = np.argsort(dists, kind="stable")
+            return self._ids[slots[order]], dists[order]
+
+    def nearest(self, lat: float, lon: float, k: int = 1, radius_km: float = math.inf, available_only: bool = True):
+        """Return up to k (tanker_ids, distances_km) within radius_km, nearest first.
+
+        The search radius doubles from a small start until k tankers are found,
+        so dense areas never scan beyond their immediate neighbourhood.
+        """
+        # Nothing on Earth is further than half its circumference
+        max_radius = min(radius_km, math.pi * EARTH_RADIUS_KM)
+        r = min(max_radius, 25.0)
+        while True:
+            ids, dists = self.within_radius(lat, lon, r, available_only=available_only)
+            if len(ids) >= k or r >= max_radius:
+                return ids[:k], dists[:k]
+            r = min(max_radius, r * 4)
+
+    # --- internals ---
+
+    def _cell_codes(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        rows = np.floor((lats + 90) / self.cell_deg)
+        cols = np.floor((np.mod(lons + 180, 360)) / self.cell_deg)
+        codes = rows * self.n_cols + cols
+        return np.where(np.isnan(codes), _NO_CELL, codes).astype(np.int64)
+
+    def _candidate_slots(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        if self._order is None:
+            live = self._size
+            self._order = np.argsort(self._codes[:live], kind="stable")
+            self._sorted_codes = self._codes[:live][self._order]
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        row_lo = int(math.floor((min_lat + 90) / self.cell_deg))
+        row_hi = int(math.floor((max_lat + 90) / self.cell_deg))
+        if max_lon - min_lon >= 360:
+            col_ranges = [(0, self.n_cols - 1)]
+        else:
+            col_lo = int(math.floor((min_lon + 180) / self.cell_deg)) % self.n_cols
+            col_hi = int(math.floor((max_lon + 180) / self.cell_deg)) % self.n_cols
+            if col_lo <= col_hi:
+                col_ranges = [(col_lo, col_hi)]
+            else:  # wraps across the antimeridian
+                col_ranges = [(col_lo, self.n_cols - 1), (0, col_hi)]
+        row_base = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.n_cols
+        chunks = []
+        for col_lo, col_hi in col_ranges:
+            starts = np.searchsorted(self._sorted_codes, row_base + col_lo, side="left")
+            ends = np.searchsorted(self._sorted_codes, row_base + col_hi, side="right")
+            chunks.extend(self._order[s:e] for s, e in zip(starts, ends) if e > s)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        extra = new_capacity - capacity
+        self._ids = np.concatenate([self._ids, np.full(extra, -1, dtype=np.int64)])
+        self._lat = np.concatenate([self._lat, np.full(extra, np.nan)])
+        self._lon = np.concatenate([self._lon, np.full(extra, np.nan)])
+        self._available = np.concatenate([self._available, np.zeros(extra, dtype=bool)])
+        self._codes = np.concatenate([self._codes, np.full(extra, _NO_CELL, dtype=np.int64)])
+
+    def _alloc(self, tanker_id: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+        else:
+            self._grow(self._size + 1)
+            slot = self._size
+            self._size += 1
+            self._order = None
+        self._slots[tanker_id] = slot
+        self._ids[slot] = tanker_id
+        return slot
+
+
+# Process-wide index shared by every request handled in this worker
+tanker_index = TankerIndex()
+
+
+def get_tanker_index(db: Session) -> TankerIndex:
+    """Return the shared index, loading it from the database on first use."""
+    if not tanker_index.loaded:
+        with tanker_index._lock:
+            if not tanker_index.loaded:
+                tanker_index.load(db.query(
+                    models.Tanker.id,
+                    models.Tanker.current_latitude,
+                    models.Tanker.current_longitude,
+                    models.Tanker.is_available,
+                ).all())
+                # GPS pings this worker has not written back yet are newer than the table
+                from backend import positions
+                if positions.store.loaded:
+                    ids = tanker_index._ids[:tanker_index._size]
+                    tanker_index.move(ids.tolist(), *positions.store.overlay(
+                        ids, tanker_index._lat[:tanker_index._size], tanker_index._lon[:tanker_index._size]))
+    return tanker_index
+
+
+# --- Keep the index in sync with committed ORM changes ---
+
+_PENDING_KEY = "tanker_index_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_tanker_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, models.Tanker):
+            pending[obj.id] = (obj.current_latitude, obj.current_longitude, obj.is_available)
+    for obj in session.deleted:
+        if isinstance(obj, models.Tanker):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_tanker_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not tanker_index.loaded:
+        return
+    for tanker_id, state in pending.items():
+        if state is None:
+            tanker_index.remove(tanker_id)
+        else:
+            tanker_index.upsert(tanker_id, *state)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_tanker_changes(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
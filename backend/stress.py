@@ -0,0 +1,289 @@
+"""The stress model, bulk recomputation of history, and what-if scenarios.
+
+Every stress_index and priority_score is computed by a versioned StressModel
+(MODELS, selected by settings.stress_model_version). Switching versions
+leaves history stale until the recompute job rewrites it:
+
+    python -m backend.stress recompute    # or POST /stress/recompute
+
+The job streams water_data in id order, recomputes each chunk with NumPy and
+writes it back in one executemany per chunk, committing as it goes so an
+interrupted run resumes from its watermark. Rollups, village_status and the
+forecasts derived from stress are then rebuilt.
+
+what_if() evaluates alternative weights and thresholds against every
+village's latest reading in memory (arrays cached per data version) and
+reports how the critical/warning counts and the triage order would change.
+"""
+import argparse
+import datetime
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from backend import cache, live, models
+from backend.config import settings
+
+RECOMPUTE_CHUNK = 50000
+
+
+class StressModel(BaseModel):
+    """Stress index (0 to max_stress, higher is worse) from a reading, and the triage score built on it."""
+    version: int
+    # Rainfall deficit (mm below normal) and depth to groundwater (m), each capped if set
+    rain_factor: float
+    rain_cap: Optional[float] = None
+    groundwater_factor: float
+    groundwater_cap: Optional[float] = None
+    max_stress: float = 10.0
+    # Priority = stress * (1 + population / population_scale), capped at max_priority
+    population_scale: float = 100000
+    max_priority: float = 100.0
+
+    class Config:
+        frozen = True
+
+    def stress(self, rainfall_deviation: float, groundwater_level: float) -> float:
+        rain_stress = max(0, -rainfall_deviation * self.rain_factor)
+        groundwater_stress = max(0, groundwater_level * self.groundwater_factor)
+        if self.rain_cap is not None:
+            rain_stress = min(self.rain_cap, rain_stress)
+        if self.groundwater_cap is not None:
+            groundwater_stress = min(self.groundwater_cap, groundwater_stress)
+        return min(self.max_stress, round(rain_stress + groundwater_stress, 2))
+
+    def stress_array(self, rainfall_deviation: np.ndarray, groundwater_level: np.ndarray) -> np.ndarray:
+        rain_stress = np.maximum(0, -rainfall_deviation * self.rain_factor)
+        groundwater_stress = np.maximum(0, groundwater_level * self.groundwater_factor)
+        if self.rain_cap is not None:
+            rain_stress = np.minimum(self.rain_cap, rain_stress)
+        if self.groundwater_cap is not None:
+            groundwater_stress = np.minimum(self.groundwater_cap, groundwater_stress)
+        return np.minimum(self.max_stress, np.round(rain_stress + groundwater_stress, 2))
+
+    def priority(self, stress_index: float, population: int) -> float:
+        return min(self.max_priority, round(stress_index * (1 + ((population or 0) / self.population_scale)), 2))
+
+    def priority_array(self, stress_index: np.ndarray, population: np.ndarray) -> np.ndarray:
+        return np.minimum(self.max_priority, np.round(stress_index * (1 + population / self.population_scale), 2))
+
+
+MODELS = {
+    # Per-reading heuristic the API and bulk ingest used before v2; saturates past ~170 mm of deficit
+    1: StressModel(version=1, rain_factor=0.05, groundwater_factor=0.1),
+    # Calibrated for annual deviations from India's ~800 mm average, as the seed computes them; the default
+    2: StressModel(version=2, rain_factor=0.008, rain_cap=8.0, groundwater_factor=0.1, groundwater_cap=2.0),
+}
+
+
+def current_model() -> StressModel:
+    return MODELS[settings.stress_model_version]
+
+
+# --- Recompute ---
+
+def history_version(db: Session) -> Optional[int]:
+    """Model version the stored history was last fully computed with, if known."""
+    return db.query(models.StressModelRun.model_version).filter(
+        models.StressModelRun.finished_at.isnot(None)
+    ).order_by(models.StressModelRun.id.desc()).limit(1).scalar()
+
+
+def record_history(db: Session, model: StressModel = None):
+    """Note that every stored reading was just written with model (caller commits), e.g. after a seed."""
+    now = datetime.datetime.utcnow()
+    db.add(models.StressModelRun(model_version=(model or current_model()).version, started_at=now,
+                                 finished_at=now, last_water_data_id=0, readings_updated=0))
+
+
+def ensure_history(db: Session):
+    """Record a model for databases with no run yet (caller commits), so a switch away from it shows as stale.
+
+    Readings stored before runs were recorded were scored by the API and bulk
+    ingest with v1; a database without readings starts on the current model.
+    """
+    if db.query(models.StressModelRun.id).first() is None:
+        has_readings = db.query(models.WaterData.id).first() is not None
+        record_history(db, MODELS[1] if has_readings else None)
+
+
+def recompute(db: Session, model: StressModel = None, chunk_size: int = RECOMPUTE_CHUNK):
+    """Rewrite stress_index across all history with model, then rebuild what derives from it.
+
+    Resumes an unfinished run for the same model version. Returns a summary dict.
+    """
+    # crud computes every new reading through this module
+    from backend import crud, forecast, rollups
+
+    started = time.perf_counter()
+    model = model or current_model()
+    run = db.query(models.StressModelRun).filter(
+        models.StressModelRun.model_version == model.version, models.StressModelRun.finished_at.is_(None)
+    ).order_by(models.StressModelRun.id.desc()).first()
+    if run is None:
+        run = models.StressModelRun(model_version=model.version, started_at=datetime.datetime.utcnow(),
+                                    last_water_data_id=0, readings_updated=0)
+        db.add(run)
+        db.commit()
+
+    water_data = models.WaterData.__table__
+    statement = update(water_data).where(water_data.c.id == bindparam("b_id")).values(stress_index=bindparam("b_stress"))
+    while True:
+        rows = db.query(models.WaterData.id, models.WaterData.rainfall_deviation_mm, models.WaterData.groundwater_level_m).filter(
+            models.WaterData.id > run.last_water_data_id
+        ).order_by(models.WaterData.id).limit(chunk_size).all()
+        if not rows:
+            break
+        ids, rainfall, groundwater = (np.array(column, dtype=float) for column in zip(*rows))
+        stress = model.stress_array(rainfall, groundwater)
+        db.execute(statement, [{"b_id": i, "b_stress": s} for i, s in zip(ids.astype(int).tolist(), stress.tolist())])
+        run.last_water_data_id = int(ids[-1])
+        run.readings_updated += len(rows)
+        db.commit()
+
+    rollups.backfill(db)
+    villages = crud.rebuild_village_status(db)
+    refit = forecast.run_forecast(db, full=True)["villages_refit"]
+    run.finished_at = datetime.datetime.utcnow()
+    db.commit()
+    return {"model_version": model.version, "readings_updated": run.readings_updated, "villages": villages,
+            "villages_refit": refit, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+def describe(db: Session):
+    """The current model, and whether stored history was computed with it.
+
+    History with no recorded run (a database never migrated since runs were
+    recorded) counts as computed with the current model.
+    """
+    model = current_model()
+    applied = history_version(db)
+    pending = db.query(models.StressModelRun).filter(models.StressModelRun.finished_at.is_(None)).order_by(
+        models.StressModelRun.id.desc()).first()
+    has_readings = db.query(models.WaterData.id).first() is not None
+    return {
+        "model": model.model_dump(),
+        "history_version": applied,
+        "stale": has_readings and applied is not None and applied != model.version,
+        "pending_run": None if pending is None else {
+            "model_version": pending.model_version, "started_at": pending.started_at,
+            "readings_updated": pending.readings_updated,
+        },
+    }
+
+
+# --- What-if ---
+
+_snapshot_lock = threading.Lock()
+_snapshot = None  # (data version, arrays)
+
+
+def _village_arrays(db: Session):
+    """Latest reading per village as arrays, reloaded only when the data version moves."""
+    global _snapshot
+    version = cache.current_version(db)
+    with _snapshot_lock:
+        if _snapshot is not None and _snapshot[0] == version:
+            return _snapshot[1]
+        status = models.VillageStatus
+        rows = db.query(
+            status.village_id, models.Village.population, status.rainfall_deviation_mm, status.groundwater_level_m,
+            status.stress_index, status.priority_score,
+        ).join(models.Village, models.Village.id == status.village_id).all()
+        columns = list(zip(*rows)) or [()] * 6
+        arrays = {
+            "village_id": np.array(columns[0], dtype=np.int64),
+            "population": np.array(columns[1], dtype=float),
+            "rainfall": np.array(columns[2], dtype=float),
+            "groundwater": np.array(columns[3], dtype=float),
+            "stress": np.array(columns[4], dtype=float),
+            "priority": np.array(columns[5], dtype=float),
+        }
+        _snapshot = (version, arrays)
+        return arrays
+
+
+def _bands(stress: np.ndarray, critical: float, warning: float) -> np.ndarray:
+    """0 normal, 1 warning, 2 critical (NaN stress counts as normal)."""
+    return (stress >= warning).astype(np.int8) + (stress >= critical)
+
+
+def _ranks(priority: np.ndarray, village_ids: np.ndarray):
+    """Triage order (as the crisis dashboard sorts: priority, then village id, descending) and each village's rank."""
+    order = np.lexsort((-village_ids, -np.nan_to_num(priority, nan=-np.inf)))
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return order, ranks
+
+
+def what_if(db: Session, model: StressModel, critical: float, warning: float, limit: int = 20):
+    """Evaluate model and band thresholds against every village's latest reading, without writing anything."""
+    started = time.perf_counter()
+    arrays = _village_arrays(db)
+    ids = arrays["village_id"]
+    stress = model.stress_array(arrays["rainfall"], arrays["groundwater"])
+    priority = model.priority_array(stress, arrays["population"])
+
+    current_critical, current_warning = live.STRESS_BANDS[0][0], live.STRESS_BANDS[1][0]
+    before = _bands(arrays["stress"], current_critical, current_warning)
+    after = _bands(stress, critical, warning)
+    names = ("normal", "warning", "critical")
+    transitions = np.bincount(before * 3 + after, minlength=9).reshape(3, 3)
+
+    current_order, current_ranks = _ranks(arrays["priority"], ids)
+    order, ranks = _ranks(priority, ids)
+    top = order[:limit]
+    entered = np.setdiff1d(ids[top], ids[current_order[:limit]])
+    left = np.setdiff1d(ids[current_order[:limit]], ids[top])
+    # Spearman correlation of the two triage orders (ranks have no ties)
+    n = len(ids)
+    correlation = 1 - 6 * float(np.sum((ranks - current_ranks).astype(float) ** 2)) / (n * (n * n - 1)) if n > 1 else 1.0
+
+    top_ids = ids[top].tolist()
+    village_names = dict(db.query(models.Village.id, models.Village.name).filter(models.Village.id.in_(top_ids)))
+    return {
+        "villages": n,
+        "counts": {
+            name: {"current": int(transitions[i].sum()), "scenario": int(transitions[:, i].sum()),
+                   "change": int(transitions[:, i].sum() - transitions[i].sum())}
+            for i, name in enumerate(names) if name != "normal"
+        },
+        "band_changes": {
+            f"{names[i]}->{names[j]}": int(transitions[i, j])
+            for i in range(3) for j in range(3) if i != j and transitions[i, j]
+        },
+        "triage": {
+            "rank_correlation": round(correlation, 4),
+            "entered_top": entered.tolist(),
+            "left_top": left.tolist(),
+            "top": [
+                {"village_id": v, "name": village_names.get(v), "stress_index": float(stress[i]),
+                 "priority_score": float(priority[i]), "rank": rank + 1, "current_rank": int(current_ranks[i]) + 1}
+                for rank, (v, i) in enumerate(zip(top_ids, top.tolist()))
+            ],
+        },
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def main():
+    from backend.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Stress model maintenance.")
+    parser.add_argument("command", choices=["recompute", "status"])
+    parser.add_argument("--chunk-size", type=int, default=RECOMPUTE_CHUNK)
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        if args.command == "recompute":
+            print(recompute(db, chunk_size=args.chunk_size))
+        else:
+            print(describe(db))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, CircleMarker, Popup, useMap } from 'react-leaflet';
+import { MapContainer, TileLayer, CircleMarker, Popup, Tooltip as MapTooltip, useMap, useMapEvents } from 'react-leaflet';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Droplet, AlertTriangle, Truck, MapPin, Activity, CheckCircle2, ChevronRight, X } from 'lucide-react';
 import 'leaflet/dist/leaflet.css';
-import { api } from './api';
+import { api, openLiveStream } from './api';
 import { LineChart, Line, XAxis, YAxis, Tooltip, ResponsiveContainer, ReferenceLine, Area, AreaChart } from 'recharts';
 
 // Leaflet icon fix for React
@@ -37,6 +37,71 @@ function MapController({ center, zoom }) {
   return null;
 }
 
+const stressColor = (stress) => {
+  if (stress >= 8.0) return '#ef4444'; // Red - Critical
+  if (stress >= 5.0) return '#f59e0b'; // Amber - Warning
+  return '#10b981'; // Emerald - Safe
+};
+
+// Villages in the current viewport, clustered server-side for the map's zoom level
+function VillageClusters({ version, onSelect }) {
+  const [clusters, setClusters] = useState([]);
+  const map = useMap();
+
+  const load = async () => {
+    try {
+      const params = { layer: 'villages', zoom: map.getZoom(), bbox: map.getBounds().toBBoxString() };
+      const res = await api.get('/map/clusters', { params });
+      setClusters(res.data.clusters);
+    } catch (error) {
+      console.error("Error fetching map clusters:", error);
+    }
+  };
+
+  useMapEvents({ moveend: load });
+  useEffect(() => { load(); }, [version]);
+
+  return clusters.map((c) => {
+    const stress = c.max_stress ?? 0;
+    if (c.count === 1) {
+      return (
+        <CircleMarker
+          key={`v${c.village_id}`}
+          center={[c.lat, c.lng]}
+          radius={stress >= 8.0 ? 16 : stress >= 5.0 ? 10 : 6}
+          fillColor={stressColor(stress)}
+          fillOpacity={stress >= 8.0 ? 0.4 : 0.6}
+          color={stressColor(stress)}
+          weight={stress >= 8.0 ? 2 : 1}
+          className={`${stress >= 8.0 ? 'animate-pulse' : ''} cursor-pointer`}
+          eventHandlers={{ click: () => onSelect(c.village_id) }}
+        >
+          {stress >= 8.0 && (
+            <CircleMarker center={[c.lat, c.lng]} radius={4} fillColor="#ef4444" fillOpacity={1} color="#ffffff" weight={2} />
+          )}
+        </CircleMarker>
+      );
+    }
+    return (
+      <CircleMarker
+        key={`c${c.lat},${c.lng}`}
+        center={[c.lat, c.lng]}
+        radius={Math.min(40, 10 + 4 * Math.log2(c.count))}
+        fillColor={stressColor(stress)}
+        fillOpacity={0.35}
+        color={stressColor(stress)}
+        weight={2}
+        className="cursor-pointer"
+        eventHandlers={{ click: () => map.setView([c.lat, c.lng], Math.min(map.getZoom() + 2, map.getMaxZoom())) }}
+      >
+        <MapTooltip>
+          {c.count} villages · {c.critical} critical · {c.warning} warning · pop. {c.population.toLocaleString()}
+        </MapTooltip>
+      </CircleMarker>
+    );
+  });
+}
+
 function App() {
   const [dashboardData, setDashboardData] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -49,6 +114,7 @@ function App() {
   const [splashDone, setSplashDone] = useState(false);
   const [rainfallData, setRainfallData] = useState([]);
   const [rainfallLoading, setRainfallLoading] = useState(false);
+  const [mapVersion, setMapVersion] = useState(0);
 
   // Default India Center
   const defaultCenter = [22.5937, 78.9629];
@@ -69,6 +135,7 @@ function App() {
         ]);
         setDashboardData(dashRes.data);
         setAvailableTankers(tankerRes.data.available);
+        setMapVersion(v => v + 1);
       } catch (error) {
         console.error("Error fetching dashboard data:", error);
       } finally {
@@ -77,8 +144,29 @@ function App() {
     };
 
     fetchData();
-    const interval = setInterval(fetchData, 30000);
-    return () => clearInterval(interval);
+
+    // Live deltas from the server; anything we can't apply locally triggers a refetch
+    const stream = openLiveStream();
+    stream.addEventListener('readings', (e) => {
+      const { villages, bands } = JSON.parse(e.data);
+      // A village's first reading adds it to the dashboard; fetch its full row
+      if (bands.some(b => b.from === null)) return fetchData();
+      const updates = new Map(villages.map(v => [v.village_id, v]));
+      setDashboardData(prev => prev.map(v => {
+        const u = updates.get(v.village_id);
+        return u ? { ...v, stress_index: u.stress_index, priority_score: u.priority_score, last_recorded: u.record_date } : v;
+      }));
+      setMapVersion(v => v + 1);
+    });
+    stream.addEventListener('tankers', (e) => setAvailableTankers(JSON.parse(e.data).available));
+    ['villages', 'forecast', 'reset'].forEach(type => stream.addEventListener(type, fetchData));
+
+    // Safety net for missed events; unchanged polls are answered with 304
+    const interval = setInterval(fetchData, 120000);
+    return () => {
+      stream.close();
+      clearInterval(interval);
+    };
   }, []);
 
   const showToast = (msg, type = 'success') => {
@@ -115,12 +203,6 @@ function App() {
     return acc;
   }, {});
 
-  const getMarkerColor = (stress) => {
-    if (stress >= 8.0) return '#ef4444'; // Red - Critical
-    if (stress >= 5.0) return '#f59e0b'; // Amber - Warning
-    return '#10b981'; // Emerald - Safe
-  };
-
   const getFilteredData = () => {
     let sorted = [...dashboardData].sort((a, b) => b.stress_index - a.stress_index);
     if (activeTab === 'critical') return sorted.filter(v => v.stress_index >= 8.0);
@@ -229,30 +311,13 @@ function App() {
             className="map-tiles"
           />
 
-          {dashboardData.map((village) => (
-            <CircleMarker
-              key={village.village_id}
-              center={[village.location.lat, village.location.lng]}
-              radius={village.stress_index >= 8.0 ? 16 : village.stress_index >= 5.0 ? 10 : 6}
-              fillColor={getMarkerColor(village.stress_index)}
-              fillOpacity={village.stress_index >= 8.0 ? 0.4 : 0.6}
-              color={getMarkerColor(village.stress_index)}
-              weight={village.stress_index >= 8.0 ? 2 : 1}
-              className={`${village.stress_index >= 8.0 ? 'animate-pulse' : ''} cursor-pointer`}
-              eventHandlers={{ click: () => setSelectedVillage(village) }}
-            >
-              {village.stress_index >= 8.0 && (
-                <CircleMarker
-                  center={[village.location.lat, village.location.lng]}
-                  radius={4}
-                  fillColor="#ef4444"
-                  fillOpacity={1}
-                  color="#ffffff"
-                  weight={2}
-                />
-              )}
-            </CircleMarker>
-          ))}
+          <VillageClusters
+            version={mapVersion}
+            onSelect={(id) => {
+              const village = dashboardData.find(v => v.village_id === id);
+              if (village) setSelectedVillage(village);
+            }}
+          />
         </MapContainer>
       </div>
 
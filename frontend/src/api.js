@@ -5,6 +5,43 @@ const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || '/api';
 export const api = axios.create({
   baseURL: API_BASE_URL,
   timeout: 15000,
+  // 304 Not Modified is answered from the local copy below
+  validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
 });
 
+// Last response per GET URL, revalidated with If-None-Match on every poll
+const validated = new Map();
+
+const cacheKey = (config) => api.getUri(config);
+
+api.interceptors.request.use((config) => {
+  if ((config.method || 'get').toLowerCase() === 'get') {
+    const cached = validated.get(cacheKey(config));
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag;
+    }
+  }
+  return config;
+});
+
+api.interceptors.response.use((response) => {
+  const key = cacheKey(response.config);
+  if (response.status === 304) {
+    const cached = validated.get(key);
+    if (cached) {
+      // Same data object, so React state setters see no change
+      return { ...response, status: 200, data: cached.data, headers: { ...cached.headers, ...response.headers } };
+    }
+    return response;
+  }
+  const etag = response.headers.etag;
+  if (etag && (response.config.method || 'get').toLowerCase() === 'get') {
+    validated.set(key, { etag, data: response.data, headers: response.headers });
+  }
+  return response;
+});
+
+// Server-Sent Events stream of live changes; reconnects resume from the last event id
+export const openLiveStream = () => new EventSource(`${API_BASE_URL}/live`);
+
 export { API_BASE_URL };